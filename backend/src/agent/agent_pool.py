@@ -0,0 +1,129 @@
+"""
+Pools of reusable specialist agents
+
+The ticketing, scheduler and daily digest assistants used to build a BedrockModel
+and an Agent (tool specs, system prompt) on every call. Each now leases a pre-built
+agent from its AgentPool, as does the web search assistant, whose single shared
+agent used to mix the searches of concurrent chats. The agent's history is cleared when it is returned, so
+every call still starts from a blank conversation.
+
+The pool size is also the specialist's concurrency limit. Once every agent is
+leased, further calls wait up to AGENT_POOL_ACQUIRE_TIMEOUT_SECONDS for one to
+come back, or until the current request's deadline (see request_budget.py).
+"""
+
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List
+
+from strands import Agent
+
+from ..config.settings import settings
+from ..services.request_budget import current_budget
+from ..services.slot_gate import SlotGate
+
+logger = logging.getLogger(__name__)
+
+_pools: List["AgentPool"] = []
+
+
+class AgentPool:
+    """Up to max_size agents of one type, created on demand or ahead of time by warm()."""
+
+    def __init__(self, name: str, factory: Callable[[], Agent], max_size: int):
+        self.name = name
+        self._factory = factory
+        self._max_size = max(1, max_size)
+        self._slots = SlotGate(self._max_size)
+        self._lock = threading.Lock()
+        self._idle: List[Agent] = []
+        self._created = 0
+        _pools.append(self)
+
+    def warm(self):
+        """Build every agent of the pool now instead of on first use."""
+        while True:
+            with self._lock:
+                if self._created >= self._max_size:
+                    return
+                self._created += 1
+            agent = self._factory()
+            with self._lock:
+                self._idle.append(agent)
+
+    def _take(self) -> Agent:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _give_back(self, agent: Agent):
+        # Next caller starts with an empty conversation
+        agent.messages.clear()
+        agent.event_loop_metrics = type(agent.event_loop_metrics)()
+        with self._lock:
+            self._idle.append(agent)
+
+    @staticmethod
+    def _acquire_timeout() -> float:
+        budget = current_budget.get()
+        timeout = settings.AGENT_POOL_ACQUIRE_TIMEOUT_SECONDS
+        return budget.bound(timeout) if budget is not None else timeout
+
+    def _timeout_error(self, timeout: float) -> TimeoutError:
+        return TimeoutError(f"No {self.name} agent became available within {timeout:.1f}s")
+
+    @contextmanager
+    def lease(self) -> Iterator[Agent]:
+        """Borrow an agent for one call (blocking; for sync tools)."""
+        timeout = self._acquire_timeout()
+        if not self._slots.acquire(timeout):
+            raise self._timeout_error(timeout)
+        try:
+            agent = self._take()
+            try:
+                yield agent
+            finally:
+                self._give_back(agent)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def lease_async(self) -> AsyncIterator[Agent]:
+        """Borrow an agent for one call without blocking the event loop."""
+        timeout = self._acquire_timeout()
+        if not await self._slots.acquire_async(timeout):
+            raise self._timeout_error(timeout)
+        try:
+            agent = self._take()
+            try:
+                yield agent
+            finally:
+                self._give_back(agent)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"max_size": self._max_size, "created": self._created, "idle": len(self._idle)}
+
+
+def warm_agent_pools():
+    """Pre-build the agents of every pool (called at startup)."""
+    for pool in list(_pools):
+        try:
+            pool.warm()
+            logger.info(f"Warmed {pool.name} agent pool: {pool.stats()}")
+        except Exception as e:
+            logger.error(f"Failed to warm {pool.name} agent pool: {e}")
+
+
+def agent_pool_stats() -> Dict[str, Dict[str, int]]:
+    return {pool.name: pool.stats() for pool in _pools}
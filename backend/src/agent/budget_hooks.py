@@ -0,0 +1,69 @@
+"""
+Request budget enforcement inside the strands event loop
+
+Every agent is built with hooks=[BudgetHooks()]. For the request being processed
+(see services/request_budget.py) the hooks:
+
+- count each model call against REQUEST_MAX_CYCLES;
+- record every tool call in the budget's trace;
+- once the budget is exhausted, cancel further tool calls with a message asking
+  the model to answer with what it has. send_message is still allowed, so the
+  customer gets that answer. If the model keeps calling tools regardless, the
+  event loop is stopped after the current tool round.
+
+Agents called outside a request (e.g. the daily digest job) have no budget, and
+the hooks do nothing.
+"""
+
+from strands.hooks import AfterToolCallEvent, BeforeModelCallEvent, BeforeToolCallEvent, HookProvider, HookRegistry
+
+from ..services.request_budget import current_budget
+
+# Tools that still run after the budget is exhausted
+ALWAYS_ALLOWED = {"send_message"}
+
+# Model calls allowed past REQUEST_MAX_CYCLES for the model to wrap up
+_WRAP_UP_CYCLES = 2
+
+BUDGET_EXHAUSTED_MESSAGE = (
+    "Request budget exhausted: this tool was not run. Do not call any more tools; "
+    "answer now with the information you already have, and say what could not be completed."
+)
+
+
+class BudgetHooks(HookProvider):
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+
+    def register_hooks(self, registry: HookRegistry, **kwargs) -> None:
+        registry.add_callback(BeforeModelCallEvent, self._before_model_call)
+        registry.add_callback(BeforeToolCallEvent, self._before_tool_call)
+        registry.add_callback(AfterToolCallEvent, self._after_tool_call)
+
+    def _before_model_call(self, event: BeforeModelCallEvent) -> None:
+        budget = current_budget.get()
+        if budget is not None:
+            budget.cycles += 1
+
+    def _before_tool_call(self, event: BeforeToolCallEvent) -> None:
+        budget = current_budget.get()
+        if budget is None:
+            return
+        name = f"{self.agent_name}:{event.tool_use.get('name')}"
+        if budget.exhausted and event.tool_use.get("name") not in ALWAYS_ALLOWED:
+            event.cancel_tool = BUDGET_EXHAUSTED_MESSAGE
+            budget.tool_cancelled(name)
+            if budget.cycles >= budget.max_cycles + _WRAP_UP_CYCLES:
+                event.invocation_state.setdefault("request_state", {})["stop_event_loop"] = True
+            return
+        budget.tool_started(event.tool_use.get("toolUseId"), name)
+
+    def _after_tool_call(self, event: AfterToolCallEvent) -> None:
+        budget = current_budget.get()
+        if budget is None or getattr(event, "cancel_message", None):
+            return
+        status = event.result.get("status", "?") if event.result else "?"
+        exception = getattr(event, "exception", None)
+        if exception is not None:
+            status = f"error({type(exception).__name__})"
+        budget.tool_finished(event.tool_use.get("toolUseId"), status)
@@ -1,11 +1,26 @@
 from strands import Agent, tool
 
-from strands.models import BedrockModel
-
 from ...config.settings import settings
+from ..agent_pool import AgentPool
+from ..budget_hooks import BudgetHooks
+from ..date_context import date_context
+from ..model_policy import model_for, tiered_call
 from ..daily_digest_agent.daily_digest_system_prompt import DAILY_DIGEST_SYSTEM_PROMPT
 from .tools.daily_digest_tools import get_open_tickets_summary, get_upcoming_events
 
+
+def _create_daily_digest_agent() -> Agent:
+    return Agent(
+        model=model_for("daily_digest"),
+        system_prompt=DAILY_DIGEST_SYSTEM_PROMPT,
+        tools=[get_open_tickets_summary, get_upcoming_events],
+        hooks=[BudgetHooks("daily_digest")],
+    )
+
+
+daily_digest_agents = AgentPool("daily_digest", _create_daily_digest_agent, settings.AGENT_POOL_DIGEST_SIZE)
+
+
 @tool
 async def daily_digest_assistant(query: str) -> str:
     """
@@ -17,18 +32,8 @@ async def daily_digest_assistant(query: str) -> str:
     Returns:
         str: The agent's response.
     """
-    model = BedrockModel(
-        model_id=settings.BEDROCK_MODEL_ID,
-        boto_session=settings.SESSION,
-    )
-
-    daily_digest_agent = Agent(
-        model=model,
-        system_prompt=DAILY_DIGEST_SYSTEM_PROMPT,
-        tools=[get_open_tickets_summary, get_upcoming_events
-],
-    )
-
-    response = await daily_digest_agent.invoke_async(query) # Changed to await invoke_async
+    async with daily_digest_agents.lease_async() as daily_digest_agent:
+        with tiered_call("daily_digest", daily_digest_agent):
+            response = await daily_digest_agent.invoke_async(f"{date_context()}\nREQUEST:\n{query}")
     print(f"Daily Digest Agent Response: {response}") # Added for debugging
-    return str(response)
\ No newline at end of file
+    return str(response)
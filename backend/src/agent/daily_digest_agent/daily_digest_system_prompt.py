@@ -1,17 +1,7 @@
-from datetime import datetime, timedelta, timezone
-
-# Define Singapore timezone (UTC+8)
-singapore_tz = timezone(timedelta(hours=8))
-
-# Get today's date in Singapore local time
-today_sg = datetime.now(singapore_tz).date()
-
-DAILY_DIGEST_SYSTEM_PROMPT = f"""
+DAILY_DIGEST_SYSTEM_PROMPT = """
 You are a daily digest agent. Your role is to provide a concise summary of the day's important events and information.
 
-CURRENT DATE CONTEXT (hidden from user-facing replies):
-- Today: {today_sg.isoformat()} ({today_sg.strftime('%A')})
-- Current Time : {datetime.now(singapore_tz).strftime('%Y-%m-%d %H:%M:%S')} (Singapore Time, UTC+8)
+The CURRENT DATE CONTEXT is given at the top of each request; do not repeat it in user-facing replies.
 
 **Your Responsibilities:**
 - Gather information from various sources to create a daily digest.
@@ -5,12 +5,14 @@ from datetime import datetime, timedelta
 import logging
 import json
 
+from ....services.blocking_io import blocking_io, run_blocking
 from ....services.calendar_client import get_calendar_client
 from ....database.models import Ticket, get_db
 
 logger = logging.getLogger(__name__)
 
 @tool
+@blocking_io
 def get_open_tickets_summary() -> str:
     """
     Retrieves a summary of open support tickets from the database.
@@ -19,19 +21,21 @@ def get_open_tickets_summary() -> str:
         str: A summary of open tickets.
     """
     db: Session = next(get_db())
-    open_tickets = db.query(Ticket).filter(Ticket.status == 'open').all()
+    try:
+        total_open = db.query(func.count(Ticket.id)).filter(Ticket.status == 'open').scalar()
 
-    if not open_tickets:
-        return "No open tickets found."
+        if not total_open:
+            return "No open tickets found."
 
-    priority_counts = db.query(
-        Ticket.priority, func.count(Ticket.id)
-    ).filter(
-        Ticket.status == 'open'
-    ).group_by(Ticket.priority).all()
+        priority_counts = db.query(
+            Ticket.priority, func.count(Ticket.id)
+        ).filter(
+            Ticket.status == 'open'
+        ).group_by(Ticket.priority).all()
+    finally:
+        db.close()
 
     summary_parts = []
-    total_open = len(open_tickets)
     summary_parts.append(f"Total open tickets: {total_open}.")
 
     for priority, count in priority_counts:
@@ -55,7 +59,7 @@ async def get_upcoming_events():
         start_date_str = today.strftime("%Y-%m-%d")
         end_date_str = one_week_from_now.strftime("%Y-%m-%d")
 
-        events_str = calendar_client.list_events(start_date_str, end_date_str)
+        events_str = await run_blocking(calendar_client.list_events, start_date_str, end_date_str)
         
         # The list_events method returns a string representation of the events.
         # We need to parse it back into a Python object if it's a valid JSON string.
@@ -0,0 +1,24 @@
+"""
+Current date context for agent requests
+
+System prompts are identical for every call so Bedrock can cache them (see
+model_factory.py). The current date and time therefore go at the top of each
+request instead of into the system prompt.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+# Define Singapore timezone (UTC+8)
+SINGAPORE_TZ = timezone(timedelta(hours=8))
+
+
+def date_context() -> str:
+    # Get today's date in Singapore local time
+    now_sg = datetime.now(SINGAPORE_TZ)
+    today_sg = now_sg.date()
+    return f"""CURRENT DATE CONTEXT (hidden from user-facing replies):
+- Today: {today_sg.isoformat()} ({today_sg.strftime('%A')})
+- Current Time : {now_sg.strftime('%Y-%m-%d %H:%M:%S')} (Singapore Time, UTC+8)
+- The system should assume that all times provided by users are in Singapore local time (GMT+8 / UTC+8), unless explicitly stated otherwise. For example, when a user says “8 PM”, it must be interpreted as 8:00 PM Singapore Time (UTC+8), which corresponds to 12:00 PM UTC.
+- Use this for interpreting relative dates (today / tomorrow / yesterday).
+"""
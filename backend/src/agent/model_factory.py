@@ -0,0 +1,106 @@
+"""
+Shared Bedrock models
+
+A BedrockModel holds a bedrock-runtime client and its configuration but no
+conversation state, so every agent using the same model id can share one instance
+instead of building a new boto client per call.
+
+With BEDROCK_PROMPT_CACHING (off by default), requests to a Claude model that
+supports Bedrock prompt caching (see _CACHING_MODELS) carry cache checkpoints
+after the system prompt and after the tool specs. Other models reject
+checkpoints, so they never get them. Those are identical for all calls of an
+agent: the current date goes into each request instead (see date_context.py). Bedrock
+then bills them as cache reads, at a fraction of the input price, and starts
+generating sooner. Prefixes shorter than the model's minimum cacheable length
+(about 1024 tokens for most models) are simply not cached. token_usage.py measures
+the effect per agent.
+
+Every model call holds a slot of the process-wide Bedrock limiter
+(services/bedrock_limiter.py) for as long as its response streams. The boto client
+makes a single retry, so a throttle reaches the limiter, and the strands
+event loop's retry, right away.
+
+With MODEL_HEDGING_ENABLED or a BEDROCK_FALLBACK_MODEL_ID, models are wrapped in a
+HedgedModel (model_hedging.py). Model ids starting with "stub" build the local
+stub model (stub_model.py).
+"""
+
+import threading
+from typing import Any, AsyncGenerator, Dict, Optional
+
+import boto3
+from botocore.config import Config as BotocoreConfig
+from strands.models import BedrockModel, Model
+
+from ..config.settings import settings
+from ..services.bedrock_limiter import bedrock_limiter
+from .model_hedging import HedgedModel
+from .stub_model import StubModel, is_stub_model_id
+
+# Model id fragments of the Claude models with Bedrock prompt caching (system and tools)
+_CACHING_MODELS = (
+    "claude-3-5-haiku",
+    "claude-3-7-sonnet",
+    "claude-sonnet-4",
+    "claude-opus-4",
+    "claude-haiku-4",
+)
+
+_models: Dict[str, Model] = {}
+_fallback: Dict[str, Model] = {}
+_lock = threading.Lock()
+
+
+class LimitedBedrockModel(BedrockModel):
+    """BedrockModel whose requests go through the Bedrock limiter."""
+
+    async def stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        async with bedrock_limiter.slot_async("model"):
+            async for event in super().stream(*args, **kwargs):
+                yield event
+
+
+def supports_prompt_caching(model_id: str) -> bool:
+    return any(fragment in model_id for fragment in _CACHING_MODELS)
+
+
+def _build_model(model_id: str, boto_session: Any) -> Model:
+    if is_stub_model_id(model_id):
+        return StubModel.from_model_id(model_id)
+    options: Dict[str, Any] = {}
+    if settings.BEDROCK_PROMPT_CACHING and supports_prompt_caching(model_id):
+        options.update(cache_prompt="default", cache_tools="default")
+    model_class = BedrockModel
+    if settings.BEDROCK_LIMITER_ENABLED:
+        model_class = LimitedBedrockModel
+        options["boto_client_config"] = BotocoreConfig(retries={"max_attempts": 2, "mode": "standard"})
+    return model_class(model_id=model_id, boto_session=boto_session, **options)
+
+
+def _fallback_model() -> Model:
+    # Caller holds the lock
+    model = _fallback.get("model")
+    if model is None:
+        session = settings.SESSION
+        if settings.BEDROCK_FALLBACK_REGION:
+            session = boto3.Session(
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.BEDROCK_FALLBACK_REGION,
+            )
+        model = _fallback["model"] = _build_model(settings.BEDROCK_FALLBACK_MODEL_ID, session)
+    return model
+
+
+def get_bedrock_model(model_id: Optional[str] = None) -> Model:
+    """Return the shared model for model_id (default BEDROCK_MODEL_ID)."""
+    model_id = model_id or settings.BEDROCK_MODEL_ID
+    with _lock:
+        model = _models.get(model_id)
+        if model is None:
+            model = _build_model(model_id, settings.SESSION)
+            has_fallback = bool(settings.BEDROCK_FALLBACK_MODEL_ID) and settings.BEDROCK_FALLBACK_MODEL_ID != model_id
+            if settings.MODEL_HEDGING_ENABLED or has_fallback:
+                model = HedgedModel(model, _fallback_model() if has_fallback else None)
+            _models[model_id] = model
+    return model
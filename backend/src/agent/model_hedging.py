@@ -0,0 +1,245 @@
+"""
+Hedged model requests and fallback model
+
+When Bedrock is slow or throttled, a model call waits out the whole boto retry
+chain, and the p99 of a turn explodes. HedgedModel wraps the model of an agent
+(see model_factory.py) with three behaviours:
+
+Hedging (MODEL_HEDGING_ENABLED)
+    The time to the first event of every call is recorded per model. If a call
+    has not produced its first event after the MODEL_HEDGE_PERCENTILE of those
+    times (clamped to [MODEL_HEDGE_MIN_DELAY_SECONDS,
+    MODEL_HEDGE_MAX_DELAY_SECONDS]), a second identical request is sent. It goes
+    to the fallback model, or to the same model when MODEL_HEDGE_TARGET is
+    "same" or there is no fallback. The first to respond is used and the other is
+    cancelled. Until 20 times are recorded, the maximum delay applies. No hedge is
+    sent when the Bedrock limiter has no spare capacity, since it would only queue.
+
+Fallback on throttling
+    If the primary model throttles a call before responding, the call is retried
+    once on the fallback model (BEDROCK_FALLBACK_MODEL_ID, optionally in
+    BEDROCK_FALLBACK_REGION) right away. It does not wait for the strands event
+    loop's backoff.
+
+Failover
+    After MODEL_FAILOVER_THROTTLES throttles of the primary within
+    MODEL_FAILOVER_WINDOW_SECONDS, every call goes to the fallback model for
+    MODEL_FAILOVER_SECONDS.
+
+The fallback can be the local stub model (stub_model.py). That makes hedging and
+failover reproducible without AWS. hedging_stats() is reported by GET /agent/metrics.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional
+
+from strands.models import Model
+
+from ..config.settings import settings
+from ..services.bedrock_limiter import bedrock_limiter, is_throttling_error
+
+logger = logging.getLogger(__name__)
+
+# First-event times recorded before the percentile is trusted
+_MIN_SAMPLES = 20
+
+_lock = threading.Lock()
+_first_event_seconds: Dict[str, Deque[float]] = {}
+_counters: Dict[str, int] = {"calls": 0, "hedges": 0, "hedge_wins": 0, "throttle_fallbacks": 0, "failed_over_calls": 0}
+
+
+def _model_id(model: Model) -> str:
+    config = model.get_config()
+    return str(config.get("model_id") if isinstance(config, dict) else getattr(config, "model_id", model))
+
+
+def _record_first_event(model_id: str, seconds: float):
+    with _lock:
+        _first_event_seconds.setdefault(model_id, deque(maxlen=500)).append(seconds)
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
+
+
+def hedge_delay(model_id: str) -> float:
+    """Seconds to wait for a first event from model_id before sending a hedge."""
+    with _lock:
+        samples = list(_first_event_seconds.get(model_id, ()))
+    if len(samples) < _MIN_SAMPLES:
+        return settings.MODEL_HEDGE_MAX_DELAY_SECONDS
+    delay = _percentile(samples, settings.MODEL_HEDGE_PERCENTILE)
+    return min(settings.MODEL_HEDGE_MAX_DELAY_SECONDS, max(settings.MODEL_HEDGE_MIN_DELAY_SECONDS, delay))
+
+
+def _count(name: str):
+    with _lock:
+        _counters[name] += 1
+
+
+class _Attempt:
+    """One request of a hedged call: the model's stream and the pending read of its next event."""
+
+    def __init__(self, model: Model, role: str, args: tuple, kwargs: dict):
+        self.model = model
+        self.role = role
+        self.started = time.monotonic()
+        self.events = model.stream(*args, **kwargs)
+        self.next_event = asyncio.ensure_future(self.events.__anext__())
+        self.handled = False  # its first event (or error) has been looked at
+
+    async def close(self):
+        self.next_event.cancel()
+        await asyncio.gather(self.next_event, return_exceptions=True)
+        try:
+            await self.events.aclose()
+        except BaseException:
+            pass
+
+
+class HedgedModel(Model):
+    def __init__(self, primary: Model, fallback: Optional[Model] = None):
+        self.primary = primary
+        self.fallback = fallback
+        self._primary_id = _model_id(primary)
+        self._throttles: Deque[float] = deque()
+        self._failover_until = 0.0
+        self._state_lock = threading.Lock()
+
+    # Configuration is the primary model's
+    @property
+    def config(self) -> Any:
+        return self.primary.get_config()
+
+    def update_config(self, **model_config: Any) -> None:
+        self.primary.update_config(**model_config)
+
+    def get_config(self) -> Any:
+        return self.primary.get_config()
+
+    def failed_over(self) -> bool:
+        return self.fallback is not None and time.monotonic() < self._failover_until
+
+    def _record_throttle(self):
+        if self.fallback is None or settings.MODEL_FAILOVER_THROTTLES <= 0:
+            return
+        now = time.monotonic()
+        with self._state_lock:
+            self._throttles.append(now)
+            while self._throttles and now - self._throttles[0] > settings.MODEL_FAILOVER_WINDOW_SECONDS:
+                self._throttles.popleft()
+            if len(self._throttles) >= settings.MODEL_FAILOVER_THROTTLES and now >= self._failover_until:
+                self._failover_until = now + settings.MODEL_FAILOVER_SECONDS
+                self._throttles.clear()
+                logger.warning(
+                    f"Model {self._primary_id} throttled {settings.MODEL_FAILOVER_THROTTLES} times within "
+                    f"{settings.MODEL_FAILOVER_WINDOW_SECONDS:.0f}s; failing over to "
+                    f"{_model_id(self.fallback)} for {settings.MODEL_FAILOVER_SECONDS:.0f}s"
+                )
+
+    def _hedge_model(self) -> Model:
+        if self.fallback is not None and settings.MODEL_HEDGE_TARGET == "fallback":
+            return self.fallback
+        return self.primary
+
+    def structured_output(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        model = self.fallback if self.failed_over() else self.primary
+        return model.structured_output(*args, **kwargs)
+
+    async def stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        _count("calls")
+        if self.failed_over():
+            _count("failed_over_calls")
+            async for event in self.fallback.stream(*args, **kwargs):
+                yield event
+            return
+
+        attempts = [_Attempt(self.primary, "primary", args, kwargs)]
+        delay: Optional[float] = hedge_delay(self._primary_id) if settings.MODEL_HEDGING_ENABLED else None
+        winner: Optional[_Attempt] = None
+        first_event: Any = None
+        errors: List[BaseException] = []
+        try:
+            while winner is None:
+                pending = [attempt.next_event for attempt in attempts if not attempt.handled]
+                if not pending:
+                    raise errors[0]
+                timeout = None
+                if delay is not None:
+                    timeout = max(0.0, attempts[0].started + delay - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # No first event within the hedge delay
+                    delay = None
+                    if bedrock_limiter.has_spare_capacity():
+                        _count("hedges")
+                        hedge = self._hedge_model()
+                        logger.info(
+                            f"Hedging model call after {time.monotonic() - attempts[0].started:.1f}s "
+                            f"with {_model_id(hedge)}"
+                        )
+                        attempts.append(_Attempt(hedge, "hedge", args, kwargs))
+                    continue
+
+                for attempt in list(attempts):
+                    task = attempt.next_event
+                    if task not in done:
+                        continue
+                    attempt.handled = True
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        if winner is None:
+                            winner = attempt
+                            first_event = None if error else task.result()
+                        continue
+                    errors.append(error)
+                    if attempt.model is self.primary and is_throttling_error(error):
+                        self._record_throttle()
+                        if self.fallback is not None and not any(a.model is self.fallback for a in attempts):
+                            _count("throttle_fallbacks")
+                            logger.warning(f"Model {self._primary_id} throttled; retrying on {_model_id(self.fallback)}")
+                            attempts.append(_Attempt(self.fallback, "fallback", args, kwargs))
+                            delay = None
+        finally:
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.close()
+
+        _record_first_event(_model_id(winner.model), time.monotonic() - winner.started)
+        if winner.role == "hedge":
+            _count("hedge_wins")
+        if first_event is None:
+            return
+        try:
+            yield first_event
+            async for event in winner.events:
+                yield event
+        finally:
+            await winner.events.aclose()
+
+
+def hedging_stats() -> Dict[str, Any]:
+    with _lock:
+        latencies = {model_id: list(samples) for model_id, samples in _first_event_seconds.items()}
+        counters = dict(_counters)
+    return {
+        "enabled": settings.MODEL_HEDGING_ENABLED,
+        "fallback_model_id": settings.BEDROCK_FALLBACK_MODEL_ID,
+        **counters,
+        "hedge_rate": round(counters["hedges"] / counters["calls"], 3) if counters["calls"] else 0.0,
+        "first_event_seconds": {
+            model_id: {
+                "samples": len(samples),
+                "p50": round(_percentile(samples, 50), 2),
+                "p95": round(_percentile(samples, 95), 2),
+                "p99": round(_percentile(samples, 99), 2),
+                "hedge_delay": round(hedge_delay(model_id), 2),
+            }
+            for model_id, samples in latencies.items() if samples
+        },
+    }
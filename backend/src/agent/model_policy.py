@@ -0,0 +1,106 @@
+"""
+Model tiers per agent and per task
+
+Every agent used to run on BEDROCK_MODEL_ID. Much of the work does not need it:
+
+- the ticketing and scheduler specialists turn the orchestrator's request into tool
+  calls and report back;
+- the daily digest summarises two tool results;
+- Mem0 extracts facts from a message.
+
+Two tiers are configured:
+
+- "large": BEDROCK_MODEL_ID, for what the customer reads;
+- "small": BEDROCK_SMALL_MODEL_ID, a faster model for routing and extraction work.
+  Until it is set, both tiers use BEDROCK_MODEL_ID.
+
+Each agent has a MODEL_TIER_<AGENT> setting. It names a tier, or a Bedrock model
+id for that agent alone. The policy below picks the model for every call:
+
+1. A task set with model_task() overrides the agent's setting. "direct_reply"
+   (MODEL_TIER_DIRECT_REPLY) is set when a specialist's answer goes straight to the
+   customer (intent router dispatch).
+2. Otherwise the agent's MODEL_TIER_<AGENT> applies.
+
+tiered_call() applies the choice to the agent. It also records latency and tokens
+per tier (token_usage.py), which GET /agent/metrics reports under "model_tiers".
+Mem0's fact extraction runs on MODEL_TIER_MEMORY_EXTRACTION (see
+Settings.get_mem0_config).
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from strands import Agent
+from strands.models import Model
+
+from ..config.settings import settings
+from .model_factory import get_bedrock_model
+from .token_usage import record_tier_call, track_usage
+
+AGENT_TIER_SETTINGS = {
+    "orchestrator": "MODEL_TIER_ORCHESTRATOR",
+    "ticketing": "MODEL_TIER_TICKETING",
+    "scheduler": "MODEL_TIER_SCHEDULER",
+    "daily_digest": "MODEL_TIER_DAILY_DIGEST",
+    "web_search": "MODEL_TIER_WEB_SEARCH",
+}
+
+TASK_TIER_SETTINGS = {
+    "direct_reply": "MODEL_TIER_DIRECT_REPLY",
+}
+
+# Task of the agent calls made in this context (see model_task)
+current_task: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_task", default=None)
+
+
+def tier_for(agent_name: str) -> str:
+    """The tier (or model id) for a call of agent_name in the current context."""
+    task = current_task.get()
+    if task in TASK_TIER_SETTINGS:
+        return getattr(settings, TASK_TIER_SETTINGS[task])
+    return getattr(settings, AGENT_TIER_SETTINGS[agent_name])
+
+
+def model_for(agent_name: str) -> Model:
+    return get_bedrock_model(settings.get_model_id(tier_for(agent_name)))
+
+
+@contextmanager
+def model_task(task: str) -> Iterator[None]:
+    """Run the agent calls inside the block as task (see TASK_TIER_SETTINGS)."""
+    token = current_task.set(task)
+    try:
+        yield
+    finally:
+        current_task.reset(token)
+
+
+@contextmanager
+def tiered_call(agent_name: str, agent: Agent, usage_name: Optional[str] = None) -> Iterator[str]:
+    """Put the agent on the model the policy picks for this call, and record its usage.
+
+    The agent must not be used concurrently with a different tier (pooled agents and
+    chat sessions are leased per call). Yields the tier.
+    """
+    tier = tier_for(agent_name)
+    agent.model = get_bedrock_model(settings.get_model_id(tier))
+    with track_usage(usage_name or agent_name, agent, tier=tier):
+        yield tier
+
+
+def track_memory_extraction(memory_client: Any):
+    """Record the latency of Mem0's LLM calls under MODEL_TIER_MEMORY_EXTRACTION."""
+    llm = memory_client.llm
+    generate_response = llm.generate_response
+
+    def timed_generate_response(*args, **kwargs):
+        started = time.monotonic()
+        try:
+            return generate_response(*args, **kwargs)
+        finally:
+            record_tier_call(settings.MODEL_TIER_MEMORY_EXTRACTION, time.monotonic() - started)
+
+    llm.generate_response = timed_generate_response
@@ -0,0 +1,104 @@
+"""
+Per-chat orchestrator sessions
+
+Every chat gets its own strands Agent, so one customer's turns never end up in
+another customer's conversation. Sessions live in an LRU:
+
+- At most max_sessions are kept; the least recently used idle session goes first.
+- A session unused for idle_ttl seconds is dropped.
+- The agent itself keeps a bounded history (see the conversation manager passed in
+  by the factory), so long conversations do not grow the prompt forever.
+
+Long-term context is stored in Mem0, so an evicted session only loses its recent
+turns.
+
+session() serialises the turns of one chat with a per-session lock while different
+chats run concurrently. A session with a turn running or waiting is never evicted.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChatSession:
+    chat_id: str
+    agent: Any
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+    users: int = 0  # turns running or waiting for the lock
+
+    @property
+    def busy(self) -> bool:
+        return self.users > 0
+
+
+class ChatSessionStore:
+    """LRU of ChatSessions with a size cap and an idle TTL."""
+
+    def __init__(self, factory: Callable[[str], Any], max_sessions: int, idle_ttl: float):
+        self._factory = factory
+        self._max_sessions = max(1, max_sessions)
+        self._idle_ttl = max(0.0, idle_ttl)
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _get(self, chat_id: str) -> ChatSession:
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = ChatSession(chat_id=chat_id, agent=self._factory(chat_id))
+            self._sessions[chat_id] = session
+        else:
+            self._sessions.move_to_end(chat_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def _evict(self):
+        now = time.monotonic()
+        for chat_id, session in list(self._sessions.items()):
+            over_cap = len(self._sessions) > self._max_sessions
+            expired = bool(self._idle_ttl) and now - session.last_used >= self._idle_ttl
+            if not over_cap and not expired:
+                # Oldest first: every remaining session is more recent
+                break
+            if session.busy:
+                continue
+            del self._sessions[chat_id]
+            self.evictions += 1
+            logger.debug(f"Evicted orchestrator session for chat {chat_id} ({'cap' if over_cap else 'idle'})")
+
+    @asynccontextmanager
+    async def session(self, chat_id: str) -> AsyncIterator[ChatSession]:
+        """Hold the chat's session for one turn; waits for a turn of the same chat in progress."""
+        session = self._get(chat_id)
+        session.users += 1
+        try:
+            self._evict()
+            async with session.lock:
+                yield session
+        finally:
+            session.users -= 1
+            session.last_used = time.monotonic()
+
+    def busy(self, chat_id: str) -> bool:
+        """Whether a turn of chat_id is running or waiting (never creates a session)."""
+        session = self._sessions.get(chat_id)
+        return session is not None and session.busy
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "busy": sum(1 for session in self._sessions.values() if session.busy),
+            "max_sessions": self._max_sessions,
+            "evictions": self.evictions,
+        }
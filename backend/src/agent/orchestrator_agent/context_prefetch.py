@@ -0,0 +1,126 @@
+"""
+Context prefetch for the orchestrator (CONTEXT_PREFETCH_ENABLED)
+
+The orchestrator used to begin every turn with a model call that only decided to
+call get_user_memories, and often knowledge_base_search next. Before the first
+orchestrator prompt, three lookups for the incoming message now run concurrently:
+
+- a Mem0 search for the customer, scoped to the message;
+- a knowledge base retrieval for the message;
+- the customer's profile from the database (name, customer since, open tickets).
+
+Their results are put into the prompt, so the model can answer (or delegate) on its
+first turn. Each lookup is bounded by CONTEXT_PREFETCH_TIMEOUT_SECONDS. A lookup that
+fails or times out is left out, and the model can still call the tools itself.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, List, Optional, Tuple
+
+from ...config.settings import settings
+from ...database.models import Customer, SessionLocal, Ticket
+from ...services.blocking_io import run_blocking
+from .tools.knowledge_base_tools import knowledge_base_search
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PrefetchedContext:
+    memories: Optional[List[str]] = None  # None when the memory search did not run or failed
+    knowledge: Optional[str] = None
+    profile: Optional[str] = None
+    open_tickets: int = 0
+    memory_search_failed: bool = False
+
+    @property
+    def personal(self) -> bool:
+        """Whether the context holds (or may hold) anything specific to this customer's history."""
+        return self.memory_search_failed or bool(self.memories) or self.open_tickets > 0
+
+    def to_prompt(self) -> str:
+        sections = []
+        if self.memories:
+            sections.append("### Customer memories\n" + "\n".join(f"- {memory}" for memory in self.memories))
+        elif self.memories is not None:
+            sections.append("### Customer memories\nNo memories found for this user.")
+        if self.knowledge:
+            sections.append(f"### Knowledge base results\n{self.knowledge}")
+        if self.profile:
+            sections.append(f"### Customer profile\n{self.profile}")
+        return "\n\n".join(sections)
+
+
+def _search_memories(memory_client: Any, query: str, chat_id: str) -> List[str]:
+    result = memory_client.search(query=query, user_id=chat_id)
+    memories = result.get('results', []) if isinstance(result, dict) else result
+    texts = []
+    for memory_item in (memories or [])[:settings.CONTEXT_PREFETCH_MEMORY_LIMIT]:
+        if isinstance(memory_item, dict):
+            texts.append(memory_item.get('memory', memory_item.get('text', str(memory_item))))
+        else:
+            texts.append(str(memory_item))
+    return texts
+
+
+def _load_profile(chat_id: str) -> Tuple[Optional[str], int]:
+    db = SessionLocal()
+    try:
+        customer = db.query(Customer).filter(Customer.telegram_chat_id == str(chat_id)).first()
+        tickets = (
+            db.query(Ticket)
+            .filter(Ticket.chat_id == str(chat_id), Ticket.status != 'closed')
+            .order_by(Ticket.created_at.desc())
+            .limit(5)
+            .all()
+        )
+        lines = []
+        if customer:
+            lines.append(f"- Name: {customer.name or 'unknown'}")
+            if customer.created_at:
+                lines.append(f"- Customer since: {customer.created_at.date().isoformat()}")
+        if tickets:
+            lines.append("- Open tickets: " + "; ".join(f"#{t.id} [{t.status}, {t.priority}] {t.issue[:80]}" for t in tickets))
+        return ("\n".join(lines) or None), len(tickets)
+    finally:
+        db.close()
+
+
+async def _bounded(what: str, awaitable: Awaitable) -> Any:
+    try:
+        return await asyncio.wait_for(awaitable, timeout=settings.CONTEXT_PREFETCH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Context prefetch: {what} timed out after {settings.CONTEXT_PREFETCH_TIMEOUT_SECONDS}s")
+    except Exception as e:
+        logger.warning(f"Context prefetch: {what} failed: {e}")
+    return None
+
+
+async def _skipped() -> None:
+    return None
+
+
+async def prefetch_context(memory_client: Any, text: str, chat_id: str) -> PrefetchedContext:
+    """Run the memory, knowledge base and profile lookups for a message concurrently."""
+    started = time.monotonic()
+    memories, knowledge, profile = await asyncio.gather(
+        _bounded("memory search", run_blocking(_search_memories, memory_client, text, chat_id))
+        if memory_client is not None else _skipped(),
+        _bounded("knowledge base search", knowledge_base_search(query=text)),
+        _bounded("customer profile", run_blocking(_load_profile, chat_id)),
+    )
+
+    context = PrefetchedContext(memories=memories, memory_search_failed=memory_client is not None and memories is None)
+    if knowledge and not knowledge.startswith(("No relevant documents", "Error searching")):
+        context.knowledge = knowledge
+    if profile:
+        context.profile, context.open_tickets = profile
+    logger.info(
+        f"Prefetched context for chat_id {chat_id} in {time.monotonic() - started:.2f}s "
+        f"(memories={len(context.memories or [])}, knowledge={context.knowledge is not None}, "
+        f"profile={context.profile is not None})"
+    )
+    return context
@@ -0,0 +1,219 @@
+"""
+Deterministic intent router in front of the orchestrator
+
+Many customer messages are plainly a support issue ("my order arrived broken") or a
+booking ("book a consultation tomorrow at 3pm"). For those, the orchestrator LLM only
+picks a specialist and forwards its answer. The router recognises such messages and
+the orchestrator hands them to the specialist directly, skipping one or two model
+calls.
+
+- Keyword and regex rules score every intent. A message's score for an intent
+  combines the weights of its matching rules (noisy-or). The best intent then loses
+  confidence in proportion to the score of the runner-up.
+- When the rules are not confident, an optional local embedding classifier
+  (INTENT_ROUTER_EMBEDDINGS_ENABLED) compares the message with example utterances.
+  It uses the ONNX MiniLM model bundled with chromadb, so no Bedrock call is made.
+
+Only "ticketing" and "scheduling" are dispatched. "knowledge" exists so that
+questions about e.g. the refund policy are not mistaken for a refund request.
+Every decision is logged as one `intent_route ...` line for tuning the thresholds.
+"""
+
+import logging
+import math
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ...config.settings import settings
+from ...services.blocking_io import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Intents that can be answered by a specialist without the orchestrator
+DISPATCHABLE_INTENTS = ("ticketing", "scheduling")
+
+_TIME = r"(today|tonight|tomorrow|next (week|month|mon|tue|wed|thu|fri|sat|sun)\w*|\d{1,2}(:\d{2})?\s?(am|pm)|\d{1,2}:\d{2})"
+
+# (intent, pattern, weight)
+_RULES: List[Tuple[str, str, float]] = [
+    # Support issues
+    ("ticketing", r"\b(open|raise|create|file|submit|log)\b.{0,20}\b(ticket|complaint|case)\b", 0.95),
+    ("ticketing", r"\b(status|update|progress)\b.{0,20}\b(ticket|complaint|case)\b", 0.85),
+    ("ticketing", r"\b(ticket|case)\s*(#|id|number|no\.?)?\s*:?\s*\d+\b", 0.85),
+    ("ticketing", r"\b(not working|doesn'?t work|isn'?t working|stopped working|broken|crash(es|ed|ing)?|keeps? (failing|crashing))\b", 0.7),
+    ("ticketing", r"\b(can'?t|cannot|unable to)\b.{0,15}\b(log ?in|sign ?in|access|pay|checkout|reset)\b", 0.7),
+    ("ticketing", r"\b(complain|complaint|refund|replacement)\b", 0.75),
+    ("ticketing", r"\b(charged twice|double charged|overcharged|damaged|defective|never (arrived|received))\b", 0.75),
+    ("ticketing", r"\b(wrong|missing)\b.{0,15}\b(item|order|charge|parcel|package|delivery)\b", 0.7),
+    ("ticketing", r"\b(error|bug|issue|problem|faulty)\b", 0.4),
+    ("ticketing", r"\b(urgent|asap|escalate)\b", 0.3),
+    # Bookings and calendar
+    ("scheduling", r"\b(book|schedule|set up|arrange|make)\b.{0,40}\b(meeting|appointment|call|session|consultation|demo|slot|booking)\b", 0.9),
+    ("scheduling", r"\b(reschedule|postpone|move|change)\b.{0,40}\b(meeting|appointment|booking|call|session|consultation)\b", 0.9),
+    ("scheduling", r"\bcancel\b.{0,30}\b(meeting|appointment|booking|call|session|consultation)\b", 0.85),
+    ("scheduling", r"\b(my|our|the)\s+(schedule|calendar|appointments?|bookings?)\b", 0.6),
+    ("scheduling", r"\b(are you|is (anyone|someone|the team)|any)\b.{0,20}\b(free|available|availability|slots?)\b", 0.4),
+    ("scheduling", r"\b(meeting|appointment|consultation)\b", 0.4),
+    ("scheduling", rf"\b{_TIME}\b", 0.3),
+    # Questions about the business (left to the orchestrator and knowledge base)
+    ("knowledge", r"\b(policy|policies|terms|warranty|guarantee)\b", 0.8),
+    ("knowledge", r"\b(how much|price|pricing|cost|fees?|opening hours|open on|located|address|do you (offer|sell|have|provide))\b", 0.8),
+]
+
+_COMPILED_RULES = [(intent, re.compile(pattern, re.IGNORECASE), weight) for intent, pattern, weight in _RULES]
+
+# Example utterances for the embedding classifier
+_EXAMPLES: Dict[str, List[str]] = {
+    "ticketing": [
+        "My order arrived damaged",
+        "The app keeps crashing when I open it",
+        "I was charged twice for my purchase",
+        "I can't log in to my account",
+        "I want to make a complaint about your service",
+        "What's the status of my ticket?",
+        "My package never arrived",
+        "Something is wrong with my bill",
+    ],
+    "scheduling": [
+        "Can I book an appointment for tomorrow afternoon?",
+        "I'd like to schedule a meeting next Monday at 10am",
+        "Please reschedule my consultation to Friday",
+        "Cancel my booking on Thursday",
+        "Are you available for a call this week?",
+        "What appointments do I have today?",
+    ],
+    "knowledge": [
+        "What are your opening hours?",
+        "How much does the premium plan cost?",
+        "What is your refund policy?",
+        "Do you deliver overseas?",
+        "Where is your shop located?",
+        "What services do you offer?",
+    ],
+    "other": [
+        "Hello there",
+        "Thanks so much!",
+        "Who won the football match yesterday?",
+        "Tell me a joke",
+        "Remember that I prefer emails in the morning",
+    ],
+}
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    intent: Optional[str]  # None when nothing matched
+    confidence: float
+    source: str  # "rules", "embedding" or "skipped"
+    dispatch: bool  # hand the message straight to the intent's specialist
+    detail: str = ""
+
+
+def _rule_scores(text: str) -> Dict[str, float]:
+    misses: Dict[str, float] = {}
+    for intent, pattern, weight in _COMPILED_RULES:
+        if pattern.search(text):
+            misses[intent] = misses.get(intent, 1.0) * (1.0 - weight)
+    return {intent: 1.0 - miss for intent, miss in misses.items()}
+
+
+def route_by_rules(text: str) -> RouteDecision:
+    """Classify text with the keyword/regex rules."""
+    scores = _rule_scores(text)
+    if not scores:
+        return RouteDecision(None, 0.0, "rules", False)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    intent, best = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+    confidence = best * (1.0 - runner_up)
+    detail = " ".join(f"{name}:{score:.2f}" for name, score in ranked)
+    return RouteDecision(
+        intent,
+        confidence,
+        "rules",
+        intent in DISPATCHABLE_INTENTS and confidence >= settings.INTENT_ROUTER_MIN_CONFIDENCE,
+        detail,
+    )
+
+
+class EmbeddingClassifier:
+    """Nearest-example classifier over a local sentence embedding model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._embed = None
+        self._examples: List[Tuple[str, List[float]]] = []
+        self._failed = False
+
+    def _load(self) -> bool:
+        with self._lock:
+            if self._embed is not None or self._failed:
+                return not self._failed
+            try:
+                from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+                embed = DefaultEmbeddingFunction()
+                labels = [intent for intent, texts in _EXAMPLES.items() for _ in texts]
+                vectors = embed([text for texts in _EXAMPLES.values() for text in texts])
+                self._examples = [(label, _normalise(vector)) for label, vector in zip(labels, vectors)]
+                self._embed = embed
+                logger.info(f"Intent router embedding classifier loaded with {len(labels)} examples")
+            except Exception as e:
+                logger.warning(f"Intent router embedding classifier unavailable, using rules only: {e}")
+                self._failed = True
+            return not self._failed
+
+    def classify(self, text: str) -> Optional[RouteDecision]:
+        """Blocking; returns None when the model cannot be loaded."""
+        if not self._load():
+            return None
+        query = _normalise(self._embed([text])[0])
+        best: Dict[str, float] = {}
+        for label, vector in self._examples:
+            similarity = sum(a * b for a, b in zip(query, vector))
+            best[label] = max(best.get(label, -1.0), similarity)
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        intent, similarity = ranked[0]
+        margin = similarity - ranked[1][1]
+        return RouteDecision(
+            intent,
+            similarity,
+            "embedding",
+            intent in DISPATCHABLE_INTENTS
+            and similarity >= settings.INTENT_ROUTER_EMBEDDING_MIN_SIMILARITY
+            and margin >= settings.INTENT_ROUTER_EMBEDDING_MIN_MARGIN,
+            f"margin:{margin:.2f}",
+        )
+
+
+def _normalise(vector) -> List[float]:
+    values = [float(value) for value in vector]
+    norm = math.sqrt(sum(value * value for value in values)) or 1.0
+    return [value / norm for value in values]
+
+
+_classifier = EmbeddingClassifier()
+
+
+async def route_message(text: str, chat_id: str = "") -> RouteDecision:
+    """Decide whether a customer message can skip the orchestrator, and log the decision."""
+    words = len(text.split())
+    if not text.strip() or words > settings.INTENT_ROUTER_MAX_WORDS:
+        decision = RouteDecision(None, 0.0, "skipped", False, f"words:{words}")
+    else:
+        decision = route_by_rules(text)
+        if not decision.dispatch and settings.INTENT_ROUTER_EMBEDDINGS_ENABLED:
+            try:
+                embedded = await run_blocking(_classifier.classify, text)
+            except Exception as e:
+                logger.warning(f"Intent router embedding classification failed: {e}")
+                embedded = None
+            if embedded is not None and (embedded.dispatch or decision.intent is None):
+                decision = embedded
+    logger.info(
+        f"intent_route chat_id={chat_id} intent={decision.intent} confidence={decision.confidence:.2f} "
+        f"source={decision.source} dispatch={decision.dispatch} {decision.detail}".rstrip()
+    )
+    return decision
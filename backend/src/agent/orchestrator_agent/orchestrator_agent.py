@@ -1,9 +1,20 @@
 from strands import Agent, tool
-from strands.models import BedrockModel
+from strands.agent.conversation_manager import SlidingWindowConversationManager
+import asyncio
 import logging
 import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from ...config.settings import settings
+from ..budget_hooks import BudgetHooks
+from ..date_context import date_context
+from ..model_policy import model_for, model_task, tiered_call, track_memory_extraction
+from ..streaming import agent_stream_events
+from ...services.answer_cache import answer_cache, cacheable_answer
+from ...services.bedrock_limiter import limit_mem0_calls
+from ...services.blocking_io import blocking_io
+from ...services.request_budget import RequestBudget, request_budget
 from ..orchestrator_agent.orchestrator_system_prompt import ORCHESTRATOR_SYSTEM_PROMPT
 from ..scheduler_agent.scheduler_agent import scheduler_assistant
 from ..ticketing_agent.ticketing_agent import ticketing_assistant
@@ -11,17 +22,25 @@ from ..web_search_agent.web_search_agent import web_search_assistant
 
 from .tools.knowledge_base_tools import knowledge_base_search
 from .tools.message_tools import send_message
+from .chat_sessions import ChatSession, ChatSessionStore
+from .context_prefetch import PrefetchedContext, prefetch_context
+from .intent_router import route_message
+from .tool_selection import limited_tools, previous_turn_tools, select_tools
 
 logger = logging.getLogger(__name__)
 
+# Sent when a turn runs out of its request budget before answering the customer
+OVER_BUDGET_REPLY = (
+    "Sorry, I couldn't finish looking into this in time. "
+    "Please send your request again in a moment, or tell me which part matters most and I'll start there."
+)
+
+
 class MemoryAwareOrchestratorAgent:
     """Orchestrator agent with Mem0 memory capabilities using Strands."""
     
     def __init__(self):
-        model = BedrockModel(
-            model_id=settings.BEDROCK_MODEL_ID,
-            boto_session=settings.SESSION,
-        )
+        model = model_for("orchestrator")
         
         # Initialize Mem0 client
         self.memory_client = None
@@ -39,6 +58,8 @@ class MemoryAwareOrchestratorAgent:
             config_dict = settings.get_mem0_config()
             config = MemoryConfig(**config_dict)
             self.memory_client = Memory(config=config)
+            limit_mem0_calls(self.memory_client)
+            track_memory_extraction(self.memory_client)
             logger.info("Successfully initialized Mem0 local client with AWS Bedrock configuration")
                 
         except Exception as e:
@@ -49,6 +70,7 @@ class MemoryAwareOrchestratorAgent:
         
         # Create custom memory tools that use the Mem0 client
         @tool
+        @blocking_io
         def get_user_memories(user_id: str, query: str = "") -> str:
             """Retrieve relevant memories for a user. Use empty query to get all memories."""
             if self.memory_client is None:
@@ -81,7 +103,8 @@ class MemoryAwareOrchestratorAgent:
                 logger.error(f"Error retrieving memories: {e}")
                 return f"Error retrieving memories: {str(e)}"
 
-        @tool  
+        @tool
+        @blocking_io
         def store_user_memory(user_id: str, content: str) -> str:
             """Store important information about a user."""
             if self.memory_client is None:
@@ -108,25 +131,56 @@ class MemoryAwareOrchestratorAgent:
                 return f"Memory stored (with warning) for user {user_id}: {str(e)[:50]}..."
             
 
-        self.agent = Agent(
-            model=model,
+        self._model = model
+        self._tools = [
+            get_user_memories,
+            store_user_memory,
+            send_message,
+            knowledge_base_search,
+            web_search_assistant,
+            scheduler_assistant,
+            ticketing_assistant
+        ]
+        # One Agent per chat: strands agents keep a single message history and do not
+        # support concurrent invocations, so chats processed in parallel by the worker
+        # must not share one.
+        self.sessions = ChatSessionStore(
+            self._create_agent,
+            max_sessions=settings.ORCHESTRATOR_MAX_SESSIONS,
+            idle_ttl=settings.ORCHESTRATOR_SESSION_IDLE_TTL_SECONDS,
+        )
+
+    def _create_agent(self, chat_id: str) -> Agent:
+        """Create the agent holding the conversation for chat_id."""
+        return Agent(
+            model=self._model,
             system_prompt=ORCHESTRATOR_SYSTEM_PROMPT,
-            tools=[
-                get_user_memories,
-                store_user_memory,
-                send_message,
-                knowledge_base_search,
-                web_search_assistant,
-                scheduler_assistant,
-                ticketing_assistant
-            ]
+            tools=self._tools,
+            # Keep only the latest turns of the chat; older context comes from Mem0
+            conversation_manager=SlidingWindowConversationManager(
+                window_size=settings.ORCHESTRATOR_HISTORY_WINDOW_MESSAGES,
+            ),
+            hooks=[BudgetHooks("orchestrator")],
         )
     
-    async def process_message(self, message: str, chat_id: str) -> str:
-        """Process message with automatic memory integration."""
-        
+    @staticmethod
+    def _memory_prompt(message: str, chat_id: str, context: Optional[PrefetchedContext] = None) -> str:
         # Enhanced message with user_id for memory operations
-        enhanced_message = f"""
+        if context is not None:
+            return f"""{date_context()}
+USER_ID: {chat_id}
+MESSAGE: {message}
+
+## Context already retrieved for this message
+{context.to_prompt()}
+
+Instructions:
+1. Use the context above; call get_user_memories or knowledge_base_search only for something it does not cover
+2. Route to specialist agents if needed, passing memory context
+3. Store important new information using store_user_memory(user_id="{chat_id}", content="...")
+4. Provide personalized response based on memory context
+"""
+        return f"""{date_context()}
 USER_ID: {chat_id}
 MESSAGE: {message}
 
@@ -137,16 +191,270 @@ Instructions:
 4. Store important new information using store_user_memory(user_id="{chat_id}", content="...")
 5. Provide personalized response based on memory context
 """
-        
+
+    async def _orchestrator_prompt(
+        self, message: str, chat_id: str, customer_text: Optional[str]
+    ) -> Tuple[str, Optional[PrefetchedContext]]:
+        """The first prompt of an orchestrator turn, with prefetched context if enabled."""
+        if not settings.CONTEXT_PREFETCH_ENABLED:
+            return self._memory_prompt(message, chat_id), None
+        context = await prefetch_context(self.memory_client, customer_text or message, chat_id)
+        return self._memory_prompt(message, chat_id, context), context
+
+    async def _dispatch_directly(self, session: ChatSession, customer_text: str, chat_id: str) -> Optional[str]:
+        """Answer with a specialist chosen by the intent router, without the orchestrator LLM.
+
+        Returns the reply sent to the customer, or None when the router is not confident
+        (or the specialist failed) and the orchestrator should handle the message.
+        """
+        if not settings.INTENT_ROUTER_ENABLED or not customer_text:
+            return None
+        decision = await route_message(customer_text, chat_id)
+        if not decision.dispatch:
+            return None
+
+        try:
+            # The specialist's answer is sent to the customer as is
+            with model_task("direct_reply"):
+                if decision.intent == "ticketing":
+                    reply = await ticketing_assistant(
+                        query=f"Customer chat_id: {chat_id}\nCustomer message: {customer_text}\n"
+                              "Handle this request and write the reply to send to the customer."
+                    )
+                else:
+                    reply = await scheduler_assistant(
+                        query=f"Customer message: {customer_text}\n"
+                              "Handle this request and write the reply to send to the customer.",
+                        user_id=chat_id,
+                    )
+        except Exception as e:
+            logger.error(f"Direct {decision.intent} dispatch failed for chat_id {chat_id}, falling back to orchestrator: {e}")
+            return None
+
+        await self._reply_directly(session, customer_text, chat_id, reply)
+        logger.info(f"Dispatched message for chat_id {chat_id} directly to {decision.intent}")
+        return reply
+
+    def _record_exchange(self, session: ChatSession, customer_text: str, chat_id: str, reply: str):
+        # Keep the exchange in the chat's history so follow-ups have context
+        session.agent.messages.extend([
+            {"role": "user", "content": [{"text": self._memory_prompt(customer_text, chat_id)}]},
+            {"role": "assistant", "content": [{"text": reply}]},
+        ])
+
+    async def _reply_directly(self, session: ChatSession, customer_text: str, chat_id: str, reply: str):
+        """Send a reply produced without the orchestrator LLM and record it in the chat's history."""
+        await send_message(chat_id=chat_id, message=reply)
+        self._record_exchange(session, customer_text, chat_id, reply)
+
+    def turn_in_progress(self, chat_id: str) -> bool:
+        """Whether an orchestrator turn of chat_id is running or waiting for the chat."""
+        return self.sessions.busy(str(chat_id))
+
+    async def record_reply(self, chat_id: str, customer_text: str, reply: str):
+        """Record a reply the worker sent without the orchestrator (canned replies) in the chat's history."""
+        async with self.sessions.session(str(chat_id)) as session:
+            self._record_exchange(session, customer_text, str(chat_id), reply)
+
+    async def _answer_without_orchestrator(
+        self, session: ChatSession, customer_text: Optional[str], chat_id: str
+    ) -> Optional[str]:
+        """Reply via the intent router or the answer cache if possible; None means run the orchestrator."""
+        direct_reply = await self._dispatch_directly(session, customer_text, chat_id)
+        if direct_reply is not None:
+            return direct_reply
+        if not customer_text or session.agent.messages:
+            # A follow-up ("how much is it?") depends on the chat's earlier turns
+            return None
+        cached_reply = await answer_cache.lookup(customer_text)
+        if cached_reply is not None:
+            await self._reply_directly(session, customer_text, chat_id, cached_reply)
+            logger.info(f"Answered message for chat_id {chat_id} from the answer cache")
+        return cached_reply
+
+    @staticmethod
+    def _prompt_index(agent: Agent, prompt: str) -> Optional[int]:
+        """Index of the user message holding prompt in the agent's history (None if no longer there)."""
+        for index in range(len(agent.messages) - 1, -1, -1):
+            message = agent.messages[index]
+            if message.get("role") == "user" and any(block.get("text") == prompt for block in message.get("content", [])):
+                return index
+        return None
+
+    def _turn_messages(self, agent: Agent, prompt: str) -> List[Dict[str, Any]]:
+        """The messages an agent added while answering prompt (empty if no longer in its history)."""
+        index = self._prompt_index(agent, prompt)
+        return agent.messages[index + 1:] if index is not None else []
+
+    @staticmethod
+    def _reply_delivered(turn_messages: List[Dict[str, Any]], chat_id: str) -> bool:
+        """Whether a send_message call of the turn reached the customer."""
+        sends = set()
+        for message in turn_messages:
+            for block in message.get("content", []):
+                if "toolUse" in block and block["toolUse"].get("name") == "send_message":
+                    if str((block["toolUse"].get("input") or {}).get("chat_id")) == str(chat_id):
+                        sends.add(block["toolUse"].get("toolUseId"))
+                elif "toolResult" in block and block["toolResult"].get("toolUseId") in sends:
+                    if block["toolResult"].get("status") == "success":
+                        return True
+        return False
+
+    async def _finish_over_budget(
+        self, session: ChatSession, prompt: str, chat_id: str, budget: RequestBudget, timed_out: bool
+    ) -> str:
+        """End a turn that ran out of its request budget.
+
+        Sends OVER_BUDGET_REPLY unless the model already answered the customer, and
+        leaves the chat's history ending with an assistant message so the next turn
+        is a valid conversation. timed_out means the turn was cut off mid-way.
+        """
+        messages = session.agent.messages
+        start = self._prompt_index(session.agent, prompt)
+        turn = messages[start + 1:] if start is not None else []
+        delivered = self._reply_delivered(turn, chat_id)
+        reply = OVER_BUDGET_REPLY
+        if delivered:
+            texts = [
+                block["text"] for m in turn if m.get("role") == "assistant"
+                for block in m.get("content", []) if block.get("text")
+            ]
+            reply = texts[-1] if texts else "Replied to the customer before the request budget ran out."
+        else:
+            await send_message(chat_id=chat_id, message=OVER_BUDGET_REPLY)
+
+        if timed_out:
+            # The turn may end in a tool use without a result; keep only the prompt
+            if start is None:
+                messages.clear()
+            else:
+                del messages[start + 1:]
+        if messages and messages[-1].get("role") != "assistant":
+            messages.append({"role": "assistant", "content": [{"text": reply}]})
+        logger.warning(
+            f"Orchestrator turn for chat_id {chat_id} over budget ({budget.exceeded_reason}, "
+            f"timed_out={timed_out}); sent fallback reply: {not delivered}"
+        )
+        return reply
+
+    @staticmethod
+    def _select_tools(session: ChatSession, customer_text: Optional[str], context: Optional[PrefetchedContext]):
+        return select_tools(
+            customer_text,
+            previous_turn_tools(session.agent.messages),
+            memories_prefetched=context is not None and context.memories is not None,
+        )
+
+    async def _remember_answer(
+        self, session: ChatSession, prompt: str, context: Optional[PrefetchedContext],
+        customer_text: Optional[str], customer_name: Optional[str], chat_id: str, started: float,
+    ):
+        if not customer_text or not settings.ANSWER_CACHE_ENABLED or (context is not None and context.personal):
+            return
+        # Only the first turn of a chat stands on its own (see _answer_without_orchestrator)
+        if self._prompt_index(session.agent, prompt) != 0:
+            return
+        reply = cacheable_answer(
+            self._turn_messages(session.agent, prompt), chat_id, customer_name,
+            knowledge=context.knowledge if context is not None else None,
+        )
+        if reply is not None:
+            await answer_cache.store(customer_text, reply, time.monotonic() - started)
+
+    async def process_message(
+        self, message: str, chat_id: str, customer_text: Optional[str] = None, customer_name: Optional[str] = None
+    ) -> str:
+        """Process message with automatic memory integration.
+
+        customer_text is the customer's own words (message may wrap them in extra
+        context). When given, the intent router may send it straight to a specialist
+        and the answer cache may answer it (see services/answer_cache.py).
+        """
         try:
-            result = await self.agent.invoke_async(enhanced_message)
+            with request_budget(f"chat_id {chat_id}") as budget:
+                async with self.sessions.session(str(chat_id)) as session:
+                    direct_reply = await self._answer_without_orchestrator(session, customer_text, str(chat_id))
+                    if direct_reply is not None:
+                        return direct_reply
+                    started = time.monotonic()
+                    enhanced_message, context = await self._orchestrator_prompt(message, str(chat_id), customer_text)
+                    selection = self._select_tools(session, customer_text, context)
+                    timed_out = False
+                    with limited_tools(session.agent, selection, str(chat_id)), \
+                            tiered_call("orchestrator", session.agent, f"orchestrator:{selection.label}"):
+                        try:
+                            result = await asyncio.wait_for(
+                                session.agent.invoke_async(enhanced_message), timeout=budget.hard_remaining()
+                            )
+                        except asyncio.TimeoutError:
+                            timed_out = True
+                    if timed_out or budget.exhausted:
+                        return await self._finish_over_budget(
+                            session, enhanced_message, str(chat_id), budget, timed_out
+                        )
+                    await self._remember_answer(
+                        session, enhanced_message, context, customer_text, customer_name, str(chat_id), started
+                    )
             response = str(result)
             logger.info(f"Processed message for chat_id {chat_id}")
             return response
         except Exception as e:
             logger.error(f"Error processing message for chat_id {chat_id}: {e}")
             return "I apologize, but I encountered an error processing your request. Please try again."
-    
+
+    async def stream_message(
+        self, message: str, chat_id: str, include_tool_input: bool = False,
+        customer_text: Optional[str] = None, customer_name: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Like process_message, but yields text deltas and tool events as they happen.
+
+        See agent/streaming.py for the event types. Errors end the stream with an
+        {"type": "error"} event. A message answered by the intent router or the answer
+        cache yields only the "done" event.
+        """
+        try:
+            with request_budget(f"chat_id {chat_id}") as budget:
+                async with self.sessions.session(str(chat_id)) as session:
+                    direct_reply = await self._answer_without_orchestrator(session, customer_text, str(chat_id))
+                    if direct_reply is not None:
+                        yield {"type": "done", "response": direct_reply}
+                        return
+                    started = time.monotonic()
+                    enhanced_message, context = await self._orchestrator_prompt(message, str(chat_id), customer_text)
+                    selection = self._select_tools(session, customer_text, context)
+                    stream = session.agent.stream_async(enhanced_message)
+                    events = agent_stream_events(stream, include_tool_input=include_tool_input)
+                    timed_out = False
+                    with limited_tools(session.agent, selection, str(chat_id)), \
+                            tiered_call("orchestrator", session.agent, f"orchestrator:{selection.label}"):
+                        while True:
+                            try:
+                                event = await asyncio.wait_for(events.__anext__(), timeout=budget.hard_remaining())
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                timed_out = True
+                                break
+                            if event["type"] == "done" and budget.exhausted:
+                                break
+                            yield event
+                    if timed_out or budget.exhausted:
+                        reply = await self._finish_over_budget(
+                            session, enhanced_message, str(chat_id), budget, timed_out
+                        )
+                        yield {"type": "done", "response": reply}
+                        return
+                    await self._remember_answer(
+                        session, enhanced_message, context, customer_text, customer_name, str(chat_id), started
+                    )
+            logger.info(f"Streamed message for chat_id {chat_id}")
+        except Exception as e:
+            logger.error(f"Error streaming message for chat_id {chat_id}: {e}")
+            yield {
+                "type": "error",
+                "message": "I apologize, but I encountered an error processing your request. Please try again.",
+            }
+
 
 # Create global instance
 memory_orchestrator = MemoryAwareOrchestratorAgent()
@@ -0,0 +1,108 @@
+"""
+Per-turn tool selection for the orchestrator (TOOL_SELECTION_ENABLED)
+
+Every orchestrator model call carries the specs of all seven tools. A turn about
+a booking does not need the ticketing or web search specs, and a FAQ does not
+need the specialists at all. Before each turn, the message is classified with
+the intent router's keyword rules. When an intent reaches
+TOOL_SELECTION_MIN_CONFIDENCE, the agent only sees the tools below:
+
+- always: send_message and store_user_memory;
+- get_user_memories, unless memories were prefetched (see context_prefetch.py);
+- the tools for the intent (INTENT_TOOLS);
+- any tool the orchestrator used in the chat's previous turn. A follow-up such as
+  "3pm works" to a scheduler question then still reaches the scheduler.
+
+Messages with no confident intent keep the full tool set. Token usage is recorded
+separately for "orchestrator:all_tools" and "orchestrator:tool_subset" turns (see
+token_usage.py). GET /agent/metrics therefore shows the input tokens per model
+cycle with and without the narrower set.
+
+Each distinct tool set has its own prompt cache prefix, because tool specs come
+before the system prompt.
+"""
+
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set
+
+from strands import Agent
+
+from ...config.settings import settings
+from .intent_router import route_by_rules
+
+logger = logging.getLogger(__name__)
+
+ALWAYS_AVAILABLE = ("send_message", "store_user_memory")
+
+INTENT_TOOLS: Dict[str, tuple] = {
+    "ticketing": ("ticketing_assistant",),
+    "scheduling": ("scheduler_assistant",),
+    "knowledge": ("knowledge_base_search", "web_search_assistant"),
+}
+
+
+@dataclass(frozen=True)
+class ToolSelection:
+    tools: Optional[FrozenSet[str]]  # None means every tool
+    reason: str
+
+    @property
+    def label(self) -> str:
+        return "all_tools" if self.tools is None else "tool_subset"
+
+
+def previous_turn_tools(messages: List[Dict[str, Any]]) -> Set[str]:
+    """Names of the tools the agent called since the last prompt in its history."""
+    names: Set[str] = set()
+    for message in reversed(messages):
+        content = message.get("content", [])
+        if message.get("role") == "user" and any("text" in block for block in content):
+            break
+        names.update(block["toolUse"].get("name") for block in content if "toolUse" in block)
+    return names
+
+
+def select_tools(text: Optional[str], recent_tools: Set[str], memories_prefetched: bool) -> ToolSelection:
+    """Choose the orchestrator tools for a turn about text."""
+    if not settings.TOOL_SELECTION_ENABLED or not text:
+        return ToolSelection(None, "disabled" if not settings.TOOL_SELECTION_ENABLED else "no customer text")
+    decision = route_by_rules(text)
+    if decision.intent is None or decision.confidence < settings.TOOL_SELECTION_MIN_CONFIDENCE:
+        return ToolSelection(None, f"low confidence ({decision.intent}, {decision.confidence:.2f})")
+    tools = set(ALWAYS_AVAILABLE) | set(INTENT_TOOLS.get(decision.intent, ())) | recent_tools
+    if not memories_prefetched:
+        tools.add("get_user_memories")
+    return ToolSelection(frozenset(tools), f"{decision.intent} ({decision.confidence:.2f})")
+
+
+def _spec_chars(agent: Agent) -> int:
+    return sum(len(str(spec)) for spec in agent.tool_registry.get_all_tool_specs())
+
+
+@contextmanager
+def limited_tools(agent: Agent, selection: ToolSelection, chat_id: str) -> Iterator[None]:
+    """Expose only the selected tools to the agent until the block ends.
+
+    The agent must not be used concurrently (chat sessions are locked per turn).
+    """
+    if selection.tools is None:
+        logger.info(f"tool_selection chat_id={chat_id} tools=all reason={selection.reason}")
+        yield
+        return
+    registry = agent.tool_registry.registry
+    full = dict(registry)
+    full_chars = _spec_chars(agent)
+    for name in list(registry):
+        if name not in selection.tools:
+            del registry[name]
+    logger.info(
+        f"tool_selection chat_id={chat_id} tools={len(registry)}/{len(full)} reason={selection.reason} "
+        f"spec_chars={_spec_chars(agent)}/{full_chars} names={','.join(sorted(registry))}"
+    )
+    try:
+        yield
+    finally:
+        registry.clear()
+        registry.update(full)
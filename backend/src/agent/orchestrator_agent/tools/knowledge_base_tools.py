@@ -1,15 +1,14 @@
 from strands import tool
 from langchain_chroma import Chroma
-from langchain_aws import BedrockEmbeddings
 import os
 import sys
 from ....config.settings import settings
+from ....services.bedrock_embeddings import get_bedrock_embeddings
+from ....services.blocking_io import blocking_io
 
 def _get_embedding_function():
     """Get the embedding function using settings configuration."""
-    model_id = settings.EMBED_MODEL_ID or "amazon.titan-embed-text-v2:0"
-    region = settings.AWS_REGION or "us-east-1"
-    return BedrockEmbeddings(model_id=model_id, region_name=region)
+    return get_bedrock_embeddings()
 
 def _get_vectorstore():
     """Get the vector store with proper path configuration."""
@@ -35,6 +34,7 @@ def _get_vectorstore():
     )
 
 @tool
+@blocking_io
 def knowledge_base_search(query: str) -> str:
     """
     Searches the knowledge base for relevant information.
@@ -10,6 +10,9 @@ from datetime import datetime
 from ....config.settings import settings
 
 from ....database.models import Customer, get_db
+from ....services.blocking_io import run_blocking
+from ....services.progressive_reply import current_progressive_reply
+from ....services.telegram_client import log_agent_message
 
 import os
 import asyncio
@@ -53,33 +56,10 @@ async def _log_agent_message_to_history(db: Session, customer_id: int, message_t
             db.commit()
     await to_thread(_sync_log)
 
-def _sync_get_or_create_customer(db: Session, chat_id: int, name: Optional[str] = None) -> Customer:
-    """Synchronous version for non-async tools"""
-    customer = db.query(Customer).filter(Customer.telegram_chat_id == str(chat_id)).first()
-    if not customer:
-        customer = Customer(telegram_chat_id=str(chat_id), name=name)
-        db.add(customer)
-        db.commit()
-        db.refresh(customer)
-    return customer
-
-def _sync_log_agent_message_to_history(db: Session, customer_id: int, message_text: str):
-    """Synchronous version for non-async tools"""
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
-    if customer:
-        message_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        history_entry = f"[Agent at {message_time}]: {message_text}\n"
-        
-        if customer.conversation_history:
-            customer.conversation_history += history_entry
-        else:
-            customer.conversation_history = history_entry
-        db.commit()
-
 @tool
-def send_message(chat_id: str, message: str) -> str:
+async def send_message(chat_id: str, message: str) -> str:
     """
-    Send a message to a specific chat using the Telegram Bot API (synchronous version).
+    Send a message to a specific chat using the Telegram Bot API.
     Args:
         chat_id: The ID of the chat (as string).
         message: The message content to send.
@@ -91,24 +71,20 @@ def send_message(chat_id: str, message: str) -> str:
     try:
         # Convert chat_id to int for Telegram API
         chat_id_int = int(chat_id)
-        
-        # Use asyncio to run the async Telegram bot in sync context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        async def send_async():
+
+        # With progressive replies the customer already sees this message being written
+        # into a placeholder; the first reply of the turn completes it
+        progressive = current_progressive_reply.get()
+        if not (progressive and progressive.chat_id == str(chat_id_int) and await progressive.finalize(message)):
             bot = telegram.Bot(token=bot_token)
-            await bot.send_message(chat_id=chat_id_int, text=message)
-            await bot.shutdown()
-        
-        loop.run_until_complete(send_async())
-        loop.close()
+            try:
+                await bot.send_message(chat_id=chat_id_int, text=message)
+            finally:
+                # Close the bot session to release connections
+                await bot.shutdown()
 
         # Log to database
-        db: Session = next(get_db())
-        customer = _sync_get_or_create_customer(db, chat_id_int)
-        _sync_log_agent_message_to_history(db, customer.id, message)
-        db.close()
+        await run_blocking(log_agent_message, chat_id_int, message)
 
         return f"✅ Message sent successfully to chat {chat_id}"
     except telegram.error.TelegramError as e:
@@ -1,7 +1,10 @@
 from strands import Agent, tool
-from strands.models import BedrockModel
 
 from ...config.settings import settings
+from ..agent_pool import AgentPool
+from ..budget_hooks import BudgetHooks
+from ..date_context import date_context
+from ..model_policy import model_for, tiered_call
 from .scheduler_system_prompt import SCHEDULER_SYSTEM_PROMPT
 from .tools.calendar_tools import (
     check_availability,
@@ -15,41 +18,23 @@ from .tools.time_handler import (
     validate_and_normalize_datetime
 )
 
-@tool
-def scheduler_assistant(query: str, user_id: str = None) -> str:
-    """Scheduler assistant with Google Calendar integration - simplified approach using Event IDs."""
-    from datetime import datetime, timedelta, timezone
-
-    # Define Singapore timezone (UTC+8)
-    singapore_tz = timezone(timedelta(hours=8))
-    
-    # Get today's date in Singapore local time
-    today_sg = datetime.now(singapore_tz).date()
-
-    system_with_context = f"""{SCHEDULER_SYSTEM_PROMPT}
-
-CURRENT DATE CONTEXT (hidden from user-facing replies):
-- Today: {today_sg.isoformat()} ({today_sg.strftime('%A')})
-- Current Time : {datetime.now(singapore_tz).strftime('%Y-%m-%d %H:%M:%S')} (Singapore Time, UTC+8)
-- The system should assume that all times provided by users are in Singapore local time (GMT+8 / UTC+8), unless explicitly stated otherwise. For example, when a user says “8 PM”, it must be interpreted as 8:00 PM Singapore Time (UTC+8), which corresponds to 12:00 PM UTC.
-- Use this for interpreting relative dates (today / tomorrow / yesterday).
+# Static part of the prompt; the current date is passed with each request so pooled
+# agents can be reused across days
+SCHEDULER_AGENT_PROMPT = f"""{SCHEDULER_SYSTEM_PROMPT}
 
 IMPORTANT WORKFLOW:
 1. When creating events, ALWAYS provide the Event ID to the user for future reference
 2. For updates/deletions, ask user to provide the Event ID from when they created the event
 3. No user access control needed - simplified approach
 
-IMPORTANT: Do NOT echo this context back to the user; respond directly. Always give the Event ID when creating events and tell user to save it for future updates/deletions and always tell the user the description and details about the meeting.
+IMPORTANT: Do NOT echo the CURRENT DATE CONTEXT given with each request back to the user; respond directly. Always give the Event ID when creating events and tell user to save it for future updates/deletions and always tell the user the description and details about the meeting.
 """
 
-    model = BedrockModel(
-        model_id=settings.BEDROCK_MODEL_ID,
-        boto_session=settings.SESSION,
-    )
 
-    agent = Agent(
-        model=model,
-        system_prompt=system_with_context,
+def _create_scheduler_agent() -> Agent:
+    return Agent(
+        model=model_for("scheduler"),
+        system_prompt=SCHEDULER_AGENT_PROMPT,
         tools=[
             # Essential time utilities (3 tools)
             get_current_time_with_timezone,
@@ -61,5 +46,20 @@ IMPORTANT: Do NOT echo this context back to the user; respond directly. Always g
             cancel_event,
             update_event
         ],
+        hooks=[BudgetHooks("scheduler")],
     )
-    return agent(query)
+
+
+scheduler_agents = AgentPool("scheduler", _create_scheduler_agent, settings.AGENT_POOL_SCHEDULER_SIZE)
+
+
+@tool
+async def scheduler_assistant(query: str, user_id: str = None) -> str:
+    """Scheduler assistant with Google Calendar integration - simplified approach using Event IDs."""
+    request = f"""{date_context()}
+REQUEST:
+{query}"""
+    async with scheduler_agents.lease_async() as agent:
+        with tiered_call("scheduler", agent):
+            response = await agent.invoke_async(request)
+    return str(response)
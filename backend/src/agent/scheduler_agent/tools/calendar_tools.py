@@ -3,10 +3,12 @@
 from strands import tool
 from .time_handler import timezone_handler
 
+from ....services.blocking_io import blocking_io
 from ....services.calendar_client import get_calendar_client
 
 
 @tool
+@blocking_io
 def check_availability(date: str, timezone_name: str = "Asia/Singapore") -> str:
     """Return events for a date so the model can reason about availability.
     
@@ -32,6 +34,7 @@ def check_availability(date: str, timezone_name: str = "Asia/Singapore") -> str:
 
 
 @tool
+@blocking_io
 def schedule_event(
     title: str, 
     start_time: str, 
@@ -73,6 +76,7 @@ def schedule_event(
 
 
 @tool
+@blocking_io
 def list_events(date: str) -> str:
     """List all events on a given date."""
     client = get_calendar_client()
@@ -80,6 +84,7 @@ def list_events(date: str) -> str:
 
 
 @tool
+@blocking_io
 def cancel_event(event_id: str) -> str:
     """Cancel/delete an event using its Event ID.
     
@@ -94,6 +99,7 @@ def cancel_event(event_id: str) -> str:
 
 
 @tool
+@blocking_io
 def update_event(
     event_id: str, 
     title: str = None, 
@@ -0,0 +1,58 @@
+"""
+Streaming agent turns
+
+Turns the raw events of strands' Agent.stream_async() into the small set of events
+sent to streaming API clients:
+
+- {"type": "text", "delta": "..."}: model text as it is generated
+- {"type": "tool_start", "tool_use_id": "...", "name": "..."}: the model called a tool
+- {"type": "tool_end", "tool_use_id": "...", "name": "...", "status": "success" | "error"}
+- {"type": "done", "response": "..."}: the final answer of the turn
+
+With include_tool_input, every update of a tool call's (partial JSON) input is also
+reported as {"type": "tool_input", "tool_use_id": "...", "name": "...", "input": "..."}.
+
+Specialist agents run inside their tool call, so they show up as one
+tool_start/tool_end pair.
+"""
+
+from typing import Any, AsyncIterator, Dict
+
+
+async def agent_stream_events(
+    events: AsyncIterator[Dict[str, Any]],
+    include_tool_input: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Map strands stream_async() events to client events."""
+    tool_names: Dict[str, str] = {}
+    async for event in events:
+        if isinstance(event.get("data"), str):
+            if event["data"]:
+                yield {"type": "text", "delta": event["data"]}
+        elif "current_tool_use" in event:
+            # Emitted repeatedly while the tool input streams in; report the call once
+            tool_use = event["current_tool_use"] or {}
+            tool_use_id = tool_use.get("toolUseId")
+            if tool_use_id and tool_use_id not in tool_names:
+                tool_names[tool_use_id] = tool_use.get("name")
+                yield {"type": "tool_start", "tool_use_id": tool_use_id, "name": tool_use.get("name")}
+            if include_tool_input and tool_use_id:
+                yield {
+                    "type": "tool_input",
+                    "tool_use_id": tool_use_id,
+                    "name": tool_names[tool_use_id],
+                    "input": tool_use.get("input") or "",
+                }
+        elif "message" in event:
+            for block in event["message"].get("content", []):
+                tool_result = block.get("toolResult") if isinstance(block, dict) else None
+                if tool_result:
+                    tool_use_id = tool_result.get("toolUseId")
+                    yield {
+                        "type": "tool_end",
+                        "tool_use_id": tool_use_id,
+                        "name": tool_names.get(tool_use_id),
+                        "status": tool_result.get("status"),
+                    }
+        elif "result" in event:
+            yield {"type": "done", "response": str(event["result"])}
@@ -0,0 +1,112 @@
+"""
+Local stub model
+
+A strands model that answers without calling Bedrock, with a fixed behaviour:
+
+- first_token_delay: seconds before the first event;
+- throttle_every: every Nth call raises ModelThrottledException (0 = never);
+- reply: the text of every answer. Without it, the stub echoes the last user text;
+- structured_reply: the field values of every structured output (constructor only).
+
+Any model id of the form "stub" or "stub:key=value,..." builds one (see
+model_factory.py). For example,
+BEDROCK_FALLBACK_MODEL_ID=stub:reply=Sorry, we are busy right now gives a canned
+fallback. BEDROCK_MODEL_ID=stub:first_token_delay=5 reproduces a slow primary
+model, for trying out hedging (model_hedging.py) without AWS.
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from strands.models import Model
+from strands.types.exceptions import ModelThrottledException
+
+
+def is_stub_model_id(model_id: Optional[str]) -> bool:
+    return bool(model_id) and (model_id == "stub" or model_id.startswith("stub:"))
+
+
+class StubModel(Model):
+    def __init__(self, first_token_delay: float = 0.0, throttle_every: int = 0, reply: Optional[str] = None,
+                 structured_reply: Optional[Dict[str, Any]] = None):
+        self.config: Dict[str, Any] = {
+            "model_id": "stub",
+            "first_token_delay": first_token_delay,
+            "throttle_every": throttle_every,
+            "reply": reply,
+            "structured_reply": structured_reply,
+        }
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_model_id(cls, model_id: str) -> "StubModel":
+        """Build a stub from "stub:first_token_delay=2,throttle_every=3" style ids."""
+        options: Dict[str, Any] = {}
+        _, _, spec = model_id.partition(":")
+        # reply may contain commas, so it must come last
+        spec, _, reply = spec.partition("reply=")
+        for part in filter(None, (item.strip() for item in spec.split(","))):
+            key, _, value = part.partition("=")
+            if key == "first_token_delay":
+                options[key] = float(value)
+            elif key == "throttle_every":
+                options[key] = int(value)
+            else:
+                raise ValueError(f"Unknown stub model option {key!r} in {model_id!r}")
+        if reply:
+            options["reply"] = reply
+        model = cls(**options)
+        model.config["model_id"] = model_id
+        return model
+
+    def update_config(self, **model_config: Any) -> None:
+        self.config.update(model_config)
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.config
+
+    @staticmethod
+    def _last_user_text(messages: Any) -> str:
+        for message in reversed(messages or []):
+            if message.get("role") == "user":
+                texts = [block["text"] for block in message.get("content", []) if "text" in block]
+                if texts:
+                    return texts[-1]
+        return ""
+
+    async def _start_call(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        throttle_every = self.config["throttle_every"]
+        if throttle_every and call % throttle_every == 0:
+            raise ModelThrottledException(f"Stub model throttled call {call}")
+        if self.config["first_token_delay"]:
+            await asyncio.sleep(self.config["first_token_delay"])
+
+    async def stream(self, messages: Any, tool_specs: Any = None, system_prompt: Optional[str] = None,
+                     **kwargs: Any) -> AsyncGenerator[Dict[str, Any], None]:
+        await self._start_call()
+
+        reply = self.config["reply"] or f"(stub) {self._last_user_text(messages)[:500]}"
+        input_tokens = sum(len(str(message).split()) for message in messages or [])
+        output_tokens = len(reply.split())
+        yield {"messageStart": {"role": "assistant"}}
+        yield {"contentBlockDelta": {"delta": {"text": reply}}}
+        yield {"contentBlockStop": {}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {
+            "metadata": {
+                "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens,
+                          "totalTokens": input_tokens + output_tokens},
+                "metrics": {"latencyMs": int(1000 * self.config["first_token_delay"])},
+            }
+        }
+
+    async def structured_output(self, output_model: Any, prompt: Any, system_prompt: Optional[str] = None,
+                                **kwargs: Any) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yield output_model built from structured_reply (validated, so required fields must be given)."""
+        await self._start_call()
+        yield {"output": output_model.model_validate(self.config["structured_reply"] or {})}
@@ -1,14 +1,28 @@
 from strands import Agent, tool
 
-from strands.models import BedrockModel
-
 from ...config.settings import settings
+from ..agent_pool import AgentPool
+from ..budget_hooks import BudgetHooks
+from ..date_context import date_context
+from ..model_policy import model_for, tiered_call
 from ..ticketing_agent.ticketing_system_prompt import TICKETING_SYSTEM_PROMPT
 from .tools.ticketing_tools import create_ticket, check_ticket_status, update_ticket, close_ticket, list_open_tickets, assign_ticket, escalate_ticket, get_ticket_details, check_for_existing_ticket
 
 
+def _create_ticketing_agent() -> Agent:
+    return Agent(
+        model=model_for("ticketing"),
+        system_prompt=TICKETING_SYSTEM_PROMPT,
+        tools = [create_ticket, check_ticket_status, update_ticket, close_ticket, list_open_tickets, assign_ticket, escalate_ticket, get_ticket_details, check_for_existing_ticket],
+        hooks=[BudgetHooks("ticketing")],
+    )
+
+
+ticketing_agents = AgentPool("ticketing", _create_ticketing_agent, settings.AGENT_POOL_TICKETING_SIZE)
+
+
 @tool
-def ticketing_assistant(query: str) -> str:
+async def ticketing_assistant(query: str) -> str:
     """
     A ticketing assistant that can manage support tickets.
 
@@ -18,17 +32,7 @@ def ticketing_assistant(query: str) -> str:
     Returns:
         str: The agent's response.
     """
-
-    model = BedrockModel(
-        model_id=settings.BEDROCK_MODEL_ID,
-        boto_session=settings.SESSION,
-    )
-    ticketing_agent = Agent(
-        model=model,
-        system_prompt=TICKETING_SYSTEM_PROMPT,
-        tools = [create_ticket, check_ticket_status, update_ticket, close_ticket, list_open_tickets, assign_ticket, escalate_ticket, get_ticket_details, check_for_existing_ticket]
-    )
-
-
-    response = ticketing_agent(query)
-    return response
+    async with ticketing_agents.lease_async() as ticketing_agent:
+        with tiered_call("ticketing", ticketing_agent):
+            response = await ticketing_agent.invoke_async(f"{date_context()}\nREQUEST:\n{query}")
+    return str(response)
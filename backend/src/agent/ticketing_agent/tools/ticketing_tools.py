@@ -1,15 +1,18 @@
 from strands import tool
 from sqlalchemy.orm import Session
 from ....database.models import Ticket, get_db
+from ....services.blocking_io import blocking_io
 
 @tool
-def create_ticket(issue: str, priority: str) -> str:
+@blocking_io
+def create_ticket(issue: str, priority: str, chat_id: str = "") -> str:
     """
     Create a support ticket with the given issue and priority.
+    Pass the customer's Telegram chat_id when it is known so their follow-up messages can be prioritised.
     """
     db: Session = next(get_db())
     try:
-        new_ticket = Ticket(issue=issue, priority=priority)
+        new_ticket = Ticket(issue=issue, priority=priority, chat_id=chat_id or None)
         db.add(new_ticket)
         db.commit()
         db.refresh(new_ticket)
@@ -21,6 +24,7 @@ def create_ticket(issue: str, priority: str) -> str:
         db.close()
 
 @tool
+@blocking_io
 def check_ticket_status(ticket_id: int) -> str:
     """
     Check the status of a support ticket by its ID.
@@ -35,6 +39,7 @@ def check_ticket_status(ticket_id: int) -> str:
         db.close()
 
 @tool
+@blocking_io
 def update_ticket(ticket_id: int, update_info: str) -> str:
     """
     Update a support ticket with new information.
@@ -54,6 +59,7 @@ def update_ticket(ticket_id: int, update_info: str) -> str:
         db.close()
 
 @tool
+@blocking_io
 def close_ticket(ticket_id: int) -> str:
     """
     Close a support ticket by its ID.
@@ -73,6 +79,7 @@ def close_ticket(ticket_id: int) -> str:
         db.close()
 
 @tool
+@blocking_io
 def list_open_tickets() -> str:
     """
     List all open support tickets.
@@ -88,6 +95,7 @@ def list_open_tickets() -> str:
         db.close()
 
 @tool
+@blocking_io
 def assign_ticket(ticket_id: int, agent_name: str) -> str:
     """
     Assign a support ticket to a specific agent.
@@ -107,6 +115,7 @@ def assign_ticket(ticket_id: int, agent_name: str) -> str:
         db.close()
 
 @tool
+@blocking_io
 def escalate_ticket(ticket_id: int, reason: str) -> str:
     """
     Escalate a support ticket for further attention by setting its priority to high.
@@ -127,6 +136,7 @@ def escalate_ticket(ticket_id: int, reason: str) -> str:
         db.close()
 
 @tool
+@blocking_io
 def get_ticket_details(ticket_id: int) -> str:
     """
     Retrieve detailed information about a support ticket by its ID.
@@ -151,6 +161,7 @@ def get_ticket_details(ticket_id: int) -> str:
         db.close()
 
 @tool
+@blocking_io
 def check_for_existing_ticket(issue_description: str) -> str:
     """
     Checks if a ticket with a similar issue description already exists.
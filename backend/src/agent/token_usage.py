@@ -0,0 +1,113 @@
+"""
+Bedrock token usage per agent
+
+track_usage() wraps one agent call and adds the tokens Bedrock reported for it to
+that agent's totals. Input tokens are split into three kinds:
+
+- input_tokens: uncached input.
+- cache_read_input_tokens: input served from the prompt cache.
+- cache_write_input_tokens: input written to the prompt cache.
+
+input_tokens_per_cycle covers all three kinds, averaged over the model calls
+(event loop cycles) of the agent.
+
+See BEDROCK_PROMPT_CACHING in model_factory.py. token_usage_stats() is reported
+by GET /agent/metrics.
+
+Calls made with a model tier (see model_policy.py) are also added to that tier's
+totals, with their latency. tier_usage_stats() reports them. Mem0 calls report
+only their latency (record_tier_call).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from strands import Agent
+
+from ..config.settings import settings
+
+_USAGE_KEYS = {
+    "inputTokens": "input_tokens",
+    "outputTokens": "output_tokens",
+    "cacheReadInputTokens": "cache_read_input_tokens",
+    "cacheWriteInputTokens": "cache_write_input_tokens",
+}
+
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, int]] = {}
+_tier_totals: Dict[str, Dict[str, float]] = {}
+
+
+def _usage_snapshot(agent: Agent) -> Dict[str, int]:
+    metrics = agent.event_loop_metrics
+    usage = metrics.accumulated_usage
+    snapshot = {key: int(usage.get(key, 0) or 0) for key in _USAGE_KEYS}
+    snapshot["cycles"] = metrics.cycle_count
+    return snapshot
+
+
+def _new_totals() -> Dict[str, Any]:
+    return {"calls": 0, "cycles": 0, **{name: 0 for name in _USAGE_KEYS.values()}}
+
+
+def record_tier_call(tier: str, seconds: float, usage: Optional[Dict[str, int]] = None):
+    """Add one call of the given latency (and token usage, if known) to a model tier."""
+    with _lock:
+        totals = _tier_totals.setdefault(tier, {**_new_totals(), "seconds": 0.0})
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        for name, value in (usage or {}).items():
+            totals[name] += value
+
+
+@contextmanager
+def track_usage(agent_name: str, agent: Agent, tier: Optional[str] = None) -> Iterator[None]:
+    """Attribute the tokens the agent uses inside the block to agent_name (and tier, if given)."""
+    before = _usage_snapshot(agent)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        after = _usage_snapshot(agent)
+        usage = {"cycles": max(0, after["cycles"] - before["cycles"])}
+        usage.update({name: max(0, after[key] - before[key]) for key, name in _USAGE_KEYS.items()})
+        with _lock:
+            totals = _totals.setdefault(agent_name, _new_totals())
+            totals["calls"] += 1
+            for name, value in usage.items():
+                totals[name] += value
+        if tier is not None:
+            record_tier_call(tier, time.monotonic() - started, usage)
+
+
+def token_usage_stats() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        stats = {}
+        for agent_name, totals in _totals.items():
+            prompt_tokens = totals["input_tokens"] + totals["cache_read_input_tokens"] + totals["cache_write_input_tokens"]
+            stats[agent_name] = {
+                **totals,
+                "cached_input_ratio": round(totals["cache_read_input_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+                "input_tokens_per_cycle": round(prompt_tokens / totals["cycles"]) if totals["cycles"] else 0,
+            }
+        return stats
+
+
+def tier_usage_stats() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        stats = {}
+        for tier, totals in _tier_totals.items():
+            calls = totals["calls"]
+            stats[tier] = {
+                "model_id": settings.get_model_id(tier),
+                "calls": calls,
+                "avg_latency_seconds": round(totals["seconds"] / calls, 2) if calls else 0.0,
+                "cycles": totals["cycles"],
+                **{name: totals[name] for name in _USAGE_KEYS.values()},
+                "tokens_per_call": round(
+                    sum(totals[name] for name in _USAGE_KEYS.values()) / calls
+                ) if calls else 0,
+            }
+        return stats
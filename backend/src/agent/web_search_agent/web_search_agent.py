@@ -1,10 +1,14 @@
 import logging
 import asyncio
 from strands import Agent, tool
-from strands.models import BedrockModel
 from strands_tools import current_time
 from strands_tools.tavily import tavily_search, tavily_extract
 from ...config.settings import settings
+from ..agent_pool import AgentPool
+from ..budget_hooks import BudgetHooks
+from ..date_context import date_context
+from ..model_policy import model_for, tiered_call
+from ...services.request_budget import within_deadline
 from .web_search_system_prompt import WEB_SEARCH_SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
@@ -13,11 +17,6 @@ class WebSearchAgent:
     """Web Search Agent for retrieving real-time information when knowledge base is insufficient."""
     
     def __init__(self):
-        model = BedrockModel(
-            model_id=settings.BEDROCK_MODEL_ID,
-            boto_session=settings.SESSION,
-        )
-        
         # Import tavily tools with better error handling
         self.tavily_search = None
         self.tavily_extract = None
@@ -55,14 +54,14 @@ class WebSearchAgent:
                 # Configure search parameters
                 topic = "news" if search_type == "news" else "general"
                 
-                result = await self.tavily_search(
+                result = await within_deadline(self.tavily_search(
                     query=query,
                     search_depth="advanced",
                     topic=topic,
                     max_results=max_results,
                     include_raw_content=True,
                     include_answer=True
-                )
+                ), "web search")
                 
                 if result.get("status") == "success":
                     content_text = result.get("content", [{}])[0].get("text", "")
@@ -122,11 +121,11 @@ class WebSearchAgent:
                 # Parse URLs
                 url_list = [url.strip() for url in urls.split(",")]
                 
-                result = await self.tavily_extract(
+                result = await within_deadline(self.tavily_extract(
                     urls=url_list,
                     extract_depth="advanced",
                     format="markdown"
-                )
+                ), "content extraction")
                 
                 if result.get("status") == "success":
                     content_text = result.get("content", [{}])[0].get("text", "")
@@ -160,15 +159,20 @@ class WebSearchAgent:
                 logger.error(f"Error in content extraction: {e}")
                 return f"❌ Error extracting content: {str(e)}"
 
-        # Initialize the agent with simplified tools
-        self.agent = Agent(
-            model=model,
+        self.tools = [
+            current_time,
+            search_web_for_current_info,
+            extract_content_from_urls
+        ]
+        # Chats are served concurrently, so each search leases an agent of its own
+        self.agents = AgentPool("web_search", self._create_agent, settings.AGENT_POOL_WEB_SEARCH_SIZE)
+
+    def _create_agent(self) -> Agent:
+        return Agent(
+            model=model_for("web_search"),
             system_prompt=WEB_SEARCH_SYSTEM_PROMPT,
-            tools=[
-                current_time,
-                search_web_for_current_info,
-                extract_content_from_urls
-            ]
+            tools=self.tools,
+            hooks=[BudgetHooks("web_search")],
         )
     
     async def search_and_analyze(self, query: str, context: str = "") -> str:
@@ -184,7 +188,7 @@ class WebSearchAgent:
         """
         try:
             # Enhanced query with context
-            enhanced_query = f"""
+            enhanced_query = f"""{date_context()}
 SEARCH REQUEST: {query}
 
 CONTEXT: {context if context else "No additional context provided"}
@@ -198,7 +202,9 @@ INSTRUCTIONS:
 6. Be clear if information might be outdated or uncertain
 """
             
-            result = await self.agent.invoke_async(enhanced_query)
+            async with self.agents.lease_async() as agent:
+                with tiered_call("web_search", agent):
+                    result = await agent.invoke_async(enhanced_query)
             response = str(result)
             logger.info(f"Web search completed for query: {query[:50]}...")
             return response
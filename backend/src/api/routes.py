@@ -9,9 +9,10 @@ import json
 import httpx
 import os
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, Callable, List, AsyncIterator, Tuple
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
@@ -102,26 +103,83 @@ async def chat_endpoint(request: MemoryChatRequest, db: Session = Depends(get_db
 
 @router.post("/daily_digest")
 async def handle_daily_digest(request: AgentQueryRequest):
-    response = daily_digest_assistant(query=request.query)
+    response = await daily_digest_assistant(query=request.query)
     return {"response": response}
 
+def _orchestrator_input(request: OrchestratorRequest) -> Tuple[str, str]:
+    """Return the (message, chat_id) to run for an orchestrator request."""
+    if request.chat_id:
+        # Use memory-aware orchestrator
+        return request.message, request.chat_id
+    # Fallback to legacy orchestrator
+    tone = request.tone_and_manner or settings.get_tone_and_manner()
+    enriched_query = f"Company: {request.host_company}\nTone: {tone}\nInstruction: {request.message}"
+    return enriched_query, "legacy_api"
+
 @router.post("/orchestrator_agent")
 async def handle_orchestrator_agent(request: OrchestratorRequest):
     try:
-        if request.chat_id:
-            # Use memory-aware orchestrator
-            response = await memory_orchestrator.process_message(request.message, request.chat_id)
-        else:
-            # Fallback to legacy orchestrator
-            tone = request.tone_and_manner or settings.get_tone_and_manner()
-            enriched_query = f"Company: {request.host_company}\nTone: {tone}\nInstruction: {request.message}"
-            response = await memory_orchestrator.process_message(enriched_query, "legacy_api")
+        message, chat_id = _orchestrator_input(request)
+        response = await memory_orchestrator.process_message(message, chat_id)
         
         return {"response": response}
     except Exception as e:
         logger.error(f"Orchestrator agent error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process orchestrator request")
 
+
+# Streaming variants: text deltas and tool events are sent as they happen, so clients
+# see the first bytes long before the whole turn (and its sub-agents) has finished.
+def _encode_stream_event(event: Dict[str, Any], format: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if format == "ndjson":
+        return data + "\n"
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+def _stream_response(events: AsyncIterator[Dict[str, Any]], format: str) -> StreamingResponse:
+    """Send agent events as Server-Sent Events (format=sse) or newline-delimited JSON (format=ndjson)."""
+    async def body():
+        # Sent before the model is called so clients get their first byte immediately
+        yield _encode_stream_event({"type": "start"}, format)
+        async for event in events:
+            yield _encode_stream_event(event, format)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: MemoryChatRequest,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    """Streaming variant of /chat (Server-Sent Events by default, or NDJSON)."""
+    chat_id = request.chat_id
+    try:
+        customer = db.query(Customer).filter(Customer.telegram_chat_id == chat_id).first()
+        if not customer:
+            db.add(Customer(name=f"User_{chat_id}", telegram_chat_id=chat_id))
+            db.commit()
+            logger.info(f"Created new customer for chat_id {chat_id}")
+    except Exception as e:
+        logger.error(f"Chat stream endpoint error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process chat message")
+    return _stream_response(memory_orchestrator.stream_message(request.message, chat_id), format)
+
+@router.post("/orchestrator_agent/stream")
+async def handle_orchestrator_agent_stream(
+    request: OrchestratorRequest,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+):
+    """Streaming variant of /orchestrator_agent (Server-Sent Events by default, or NDJSON)."""
+    message, chat_id = _orchestrator_input(request)
+    return _stream_response(memory_orchestrator.stream_message(message, chat_id), format)
+
 # Memory management endpoints
 @router.get("/memory/{chat_id}")
 async def get_customer_memories(chat_id: str):
@@ -169,7 +227,7 @@ class SchedulerAgentRequest(BaseModel):
 @router.post("/scheduler_agent")
 async def handle_scheduler_agent(request: SchedulerAgentRequest):
     try:
-        result = scheduler_assistant(query=request.query)
+        result = await scheduler_assistant(query=request.query)
         return {"response": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -177,31 +235,67 @@ async def handle_scheduler_agent(request: SchedulerAgentRequest):
 
 @router.post("/ticketing_agent")
 async def handle_ticketing_agent(request: AgentQueryRequest):
-    result = ticketing_assistant(query=request.query)
+    result = await ticketing_assistant(query=request.query)
     return {"response": result}
 
 
 from ..database.models import get_db, Ticket, Customer, IncomingMessage
+from ..database.message_queue import extract_chat_id
+from ..database.queue_backend import get_queue_backend
+from ..services.ingest_buffer import ingestion_buffer
+from ..services.backpressure import backlog_monitor
+from ..services.answer_cache import answer_cache
+from ..services.bedrock_limiter import bedrock_limiter
+from ..agent.agent_pool import agent_pool_stats
+from ..agent.token_usage import tier_usage_stats, token_usage_stats
+from ..agent.model_hedging import hedging_stats
 
 
 @router.post("/telegram_webhook")
-async def telegram_webhook(update: Dict[str, Any], db: Session = Depends(get_db)):
+async def telegram_webhook(update: Dict[str, Any], background_tasks: BackgroundTasks):
     """
-    Receives updates from Telegram webhook and stores them in the database queue.
+    Receives updates from Telegram webhook and stores them in the message queue
+    (the database table, or Redis with QUEUE_BACKEND=redis).
+
+    Inserts from concurrent calls are group-committed by the ingestion buffer; the
+    call returns once the update is durable (or recognised as a redelivery). While
+    the backlog is large the sender is told that replies are delayed.
     """
-    print("Received Telegram update:", update)
-    
-    # Convert payload to string to store in DB
-    payload_str = json.dumps(update)
-    
-    # Create a new message queue entry
-    new_message = IncomingMessage(payload=payload_str, status='new')
-    db.add(new_message)
-    db.commit()
-    
+    chat_id = extract_chat_id(update)
+    try:
+        queued = await ingestion_buffer.submit(update)
+    except Exception as e:
+        logger.error("telegram_update_failed update_id=%s chat_id=%s error=%s", update.get("update_id"), chat_id, e)
+        raise HTTPException(status_code=500, detail="Failed to queue update")
+
+    logger.debug("telegram_update update_id=%s chat_id=%s duplicate=%s", update.get("update_id"), chat_id, not queued)
+    if not queued:
+        return {"status": "ok", "duplicate": True}
+    background_tasks.add_task(backlog_monitor.notify_if_busy, chat_id)
     return {"status": "ok"}
 
 
+@router.get("/queue/health")
+async def queue_health():
+    """Current message backlog: pending depth, age of the oldest message and degradation mode."""
+    health = await asyncio.to_thread(backlog_monitor.health)
+    return {"backend": get_queue_backend().name, "depth": health.depth, "oldest_age_seconds": round(health.oldest_age_seconds, 1), "mode": health.mode}
+
+
+@router.get("/agent/metrics")
+async def agent_metrics():
+    """Agent pools, orchestrator chat sessions, answer cache, token usage (per agent and model tier), Bedrock limiter and model hedging statistics of this process."""
+    return {
+        "agent_pools": agent_pool_stats(),
+        "orchestrator_sessions": memory_orchestrator.sessions.stats(),
+        "answer_cache": answer_cache.stats(),
+        "token_usage": token_usage_stats(),
+        "model_tiers": tier_usage_stats(),
+        "bedrock_limiter": bedrock_limiter.stats(),
+        "model_hedging": hedging_stats(),
+    }
+
+
 
 @router.get("/dashboard/tickets/open", response_model=List[Dict])
 async def get_open_tickets(db: Session = Depends(get_db)):
@@ -565,6 +659,9 @@ async def configure_agent(
             settings.TONE_AND_MANNER = env_config.tone_and_manner
         except Exception:
             pass
+        if env_config.tone_and_manner != before:
+            # Cached answers were written in the old tone
+            answer_cache.clear("tone changed")
         return {"message": "Agent configuration updated.", "tone_and_manner": env_config.tone_and_manner}
     except Exception as e:
         logger.error(f"Error configuring agent: {e}")
@@ -19,6 +19,16 @@ class Settings(BaseSettings):
 
     # Bedrock
     BEDROCK_MODEL_ID: str | None = None
+    BEDROCK_SMALL_MODEL_ID: str | None = None  # faster model of the "small" tier; unset = BEDROCK_MODEL_ID
+
+    # Model tier per agent and task: "large" (BEDROCK_MODEL_ID), "small" or an explicit Bedrock model id
+    MODEL_TIER_ORCHESTRATOR: str = "large"
+    MODEL_TIER_TICKETING: str = "small"
+    MODEL_TIER_SCHEDULER: str = "small"
+    MODEL_TIER_DAILY_DIGEST: str = "small"
+    MODEL_TIER_WEB_SEARCH: str = "large"
+    MODEL_TIER_DIRECT_REPLY: str = "large"  # specialists whose reply goes straight to the customer
+    MODEL_TIER_MEMORY_EXTRACTION: str = "small"  # Mem0 fact extraction
 
     # Google Calendar (MCP) integration (re-added for .env fallback)
     GOOGLE_CALENDAR_CREDENTIALS_PATH: str | None = None
@@ -48,9 +58,120 @@ class Settings(BaseSettings):
     COMPANY_NAME: str | None = "Your Company Name"
     BUSINESS_DESCRIPTION: str | None = "A brief description of your business and services"
     
+    # Progressive Telegram replies: placeholder + typing indicator, edited as the reply streams
+    TELEGRAM_PROGRESSIVE_REPLIES: bool = False
+    TELEGRAM_PROGRESSIVE_PLACEHOLDER: str = "…"
+    TELEGRAM_PROGRESSIVE_EDIT_INTERVAL_SECONDS: float = 1.5  # minimum time between edits of one message
+
+    # Bedrock prompt caching of system prompts and tool specs (opt-in; only applied to Claude models that support it)
+    BEDROCK_PROMPT_CACHING: bool = False
+
+    # Context prefetch: Mem0, knowledge base and customer profile fetched in parallel before the orchestrator runs
+    CONTEXT_PREFETCH_ENABLED: bool = True
+    CONTEXT_PREFETCH_TIMEOUT_SECONDS: float = 3.0  # per lookup; a slow lookup is left out of the prompt
+    CONTEXT_PREFETCH_MEMORY_LIMIT: int = 5  # memories put into the prompt
+
+    # Per-turn orchestrator tool selection (only the tools relevant to a confident intent)
+    TOOL_SELECTION_ENABLED: bool = True
+    TOOL_SELECTION_MIN_CONFIDENCE: float = 0.6  # below this the orchestrator gets every tool
+
+    # Per-request budget: deadline and model-call limit for one customer message across all agents
+    REQUEST_DEADLINE_SECONDS: float = 45.0  # then tools are cancelled and the model is asked to answer
+    REQUEST_MAX_CYCLES: int = 12  # model calls (orchestrator and specialists) before the same happens
+    REQUEST_BUDGET_GRACE_SECONDS: float = 10.0  # after the deadline, the turn is cut off with a fallback reply
+
+    # Bedrock limiter: token bucket plus adaptive (AIMD) concurrency limit for every Bedrock call
+    BEDROCK_LIMITER_ENABLED: bool = True
+    BEDROCK_RATE_LIMIT_PER_SECOND: float = 5.0  # average calls started per second (0 = no rate limit)
+    BEDROCK_RATE_LIMIT_BURST: int = 10  # calls that may start at once after an idle period
+    BEDROCK_RATE_LIMIT_BACKEND: str = "local"  # "local" (per process) or "redis" (shared by all processes via REDIS_URL)
+    BEDROCK_CONCURRENCY_INITIAL: int = 8  # in-flight calls allowed at startup
+    BEDROCK_CONCURRENCY_MIN: int = 1
+    BEDROCK_CONCURRENCY_MAX: int = 32
+    BEDROCK_CONCURRENCY_BACKOFF: float = 0.5  # limit multiplier when a call is throttled
+    BEDROCK_THROTTLE_COOLDOWN_SECONDS: float = 2.0  # throttles within this window shrink the limit once
+    BEDROCK_LIMITER_MAX_WAIT_SECONDS: float = 30.0  # longest queue wait before a call fails
+
+    # Hedged model requests and fallback model
+    MODEL_HEDGING_ENABLED: bool = False  # send a second request when the first event is late
+    MODEL_HEDGE_PERCENTILE: float = 95.0  # hedge after this percentile of recent time-to-first-event
+    MODEL_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    MODEL_HEDGE_MAX_DELAY_SECONDS: float = 8.0  # also the delay until enough latencies are recorded
+    MODEL_HEDGE_TARGET: str = "fallback"  # "fallback" (BEDROCK_FALLBACK_MODEL_ID) or "same" model
+    BEDROCK_FALLBACK_MODEL_ID: str | None = None  # model for hedges, throttled calls and failover ("stub:..." = local stub)
+    BEDROCK_FALLBACK_REGION: str | None = None  # region of the fallback model; unset = AWS_REGION
+    MODEL_FAILOVER_THROTTLES: int = 5  # throttles within the window that switch every call to the fallback (0 = never)
+    MODEL_FAILOVER_WINDOW_SECONDS: float = 60.0
+    MODEL_FAILOVER_SECONDS: float = 120.0  # how long calls stay on the fallback model
+
+    # Orchestrator chat sessions
+    ORCHESTRATOR_MAX_SESSIONS: int = 500  # chats whose conversation is kept in memory (LRU)
+    ORCHESTRATOR_SESSION_IDLE_TTL_SECONDS: float = 1800.0  # drop a chat's session after this long without messages
+    ORCHESTRATOR_HISTORY_WINDOW_MESSAGES: int = 20  # messages of recent history kept per chat
+
+    # Specialist agent pools (pool size = concurrent calls per specialist)
+    AGENT_POOL_TICKETING_SIZE: int = 4
+    AGENT_POOL_SCHEDULER_SIZE: int = 4
+    AGENT_POOL_DIGEST_SIZE: int = 1
+    AGENT_POOL_WEB_SEARCH_SIZE: int = 4
+    AGENT_POOL_ACQUIRE_TIMEOUT_SECONDS: float = 60.0  # how long a call waits for a free agent
+    AGENT_POOL_WARM_ON_STARTUP: bool = True  # build every pooled agent when the API starts
+
+    # Threads for blocking tool I/O (database, Google Calendar, Mem0, knowledge base)
+    BLOCKING_IO_MAX_WORKERS: int = 16
+
+    # Intent router: confident ticketing/scheduling requests skip the orchestrator LLM
+    INTENT_ROUTER_ENABLED: bool = True
+    INTENT_ROUTER_MIN_CONFIDENCE: float = 0.85  # keyword/regex score needed to dispatch directly
+    INTENT_ROUTER_MAX_WORDS: int = 40  # longer messages always go to the orchestrator
+    INTENT_ROUTER_EMBEDDINGS_ENABLED: bool = False  # local MiniLM classifier for messages the rules miss
+    INTENT_ROUTER_EMBEDDING_MIN_SIMILARITY: float = 0.75  # cosine similarity to the closest example utterance
+    INTENT_ROUTER_EMBEDDING_MIN_MARGIN: float = 0.1  # lead over the closest example of another intent
+
+    # Canned replies to greetings, thanks and "ok" (no orchestrator run)
+    CANNED_RESPONSES_ENABLED: bool = True
+    CANNED_RESPONSES_REPLY_TO_ACKNOWLEDGEMENTS: bool = True  # answer a bare "ok"/"👍" (otherwise just log it)
+
+    # Semantic answer cache for knowledge base answers (per company, tone and knowledge base state)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MIN_SIMILARITY: float = 0.92  # cosine similarity between customer messages to reuse an answer
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: float = 86400.0
+
     # Exposed Backend API (for Telegram Webhook)
     EXPOSED_BACKEND_API: str | None = "https://f60e3f05cf14.ngrok-free.app"
 
+    # Message worker
+    QUEUE_BACKEND: str = "sqlite"  # "sqlite" (incoming_messages table) or "redis" (Redis Streams, shared by several nodes)
+    REDIS_URL: str | None = None  # e.g. redis://localhost:6379/0, required for QUEUE_BACKEND=redis
+    REDIS_QUEUE_PREFIX: str = "kakak:queue"  # key prefix of the Redis queue
+    WORKER_CONCURRENCY: int = 4  # concurrent consumers; messages of one chat are still handled in order
+    WORKER_CLAIM_BATCH_SIZE: int = 10  # max messages leased per claim statement
+    WORKER_MAX_BUFFERED_MESSAGES: int = 200  # max claimed messages waiting in the worker's chat lanes
+    WORKER_LEASE_SECONDS: float = 120.0  # claimed messages return to the queue if not renewed within this
+    WORKER_HEARTBEAT_SECONDS: float = 30.0  # how often a live worker renews its leases
+    WORKER_REAPER_INTERVAL_SECONDS: float = 30.0  # how often expired leases are reclaimed
+    WORKER_MAX_ATTEMPTS: int = 3  # claims before an expired message is marked failed
+    WORKER_COALESCE_WINDOW_SECONDS: float = 0.0  # merge a chat's messages arriving within this quiet window (0 = off)
+    WORKER_COALESCE_MAX_WAIT_SECONDS: float = 8.0  # never hold a chat's oldest message longer than this
+    WORKER_IDLE_POLL_SECONDS: float = 30.0  # fallback poll interval when no wake-up arrives
+    WORKER_IN_PROCESS: bool = False  # run the worker inside the API process
+    QUEUE_PRIORITY_KEYWORDS: str = "urgent,emergency,asap,immediately,complaint,refund,broken,not working,escalate,manager"  # comma-separated, case-insensitive
+    QUEUE_DEDUP_RETENTION_HOURS: float = 24.0  # processed updates are remembered this long to reject Telegram redeliveries
+    INGEST_FLUSH_INTERVAL_MS: float = 5.0  # webhook inserts arriving within this window share one commit
+    INGEST_MAX_BATCH: int = 500  # max updates per ingestion commit
+    QUEUE_NOTIFY_HOST: str = "127.0.0.1"  # UDP address workers listen on for wake-ups
+    QUEUE_NOTIFY_PORT: int | None = 8766  # set to 0 to disable cross-process wake-ups
+
+    # Backlog degradation thresholds (0 disables a threshold)
+    BACKLOG_BUSY_DEPTH: int = 200  # pending messages before senders get a busy notice
+    BACKLOG_BUSY_AGE_SECONDS: float = 120.0  # age of the oldest pending message before busy mode
+    BACKLOG_SHED_DEPTH: int = 1000  # pending messages before workers merge each chat's backlog
+    BACKLOG_SHED_AGE_SECONDS: float = 900.0  # age of the oldest pending message before shed mode
+    BACKLOG_MERGE_MAX_MESSAGES: int = 5  # latest messages of a chat kept in the prompt when shedding
+    BACKLOG_BUSY_MESSAGE: str = "Thanks for your message! We're experiencing high demand right now, so our reply may take a little longer than usual."
+    BACKLOG_BUSY_REPLY_COOLDOWN_SECONDS: float = 1800.0  # at most one busy notice per chat in this window
+    BACKLOG_CHECK_INTERVAL_SECONDS: float = 2.0  # how long a queue health reading is reused
 
     @cached_property
     def SESSION(self):
@@ -135,6 +256,14 @@ class Settings(BaseSettings):
                 return None
         return None
 
+    def get_model_id(self, tier: str) -> str | None:
+        """Return the Bedrock model id of a tier ("large", "small") or of an explicit model id."""
+        if tier == "large":
+            return self.BEDROCK_MODEL_ID
+        if tier == "small":
+            return self.BEDROCK_SMALL_MODEL_ID or self.BEDROCK_MODEL_ID
+        return tier
+
     def get_tone_and_manner(self) -> str:
         """Return tone & manner from DB or default/env value."""
         try:
@@ -177,7 +306,7 @@ class Settings(BaseSettings):
             "llm": {
                 "provider": self.MEM0_LLM_PROVIDER or "aws_bedrock",
                 "config": {
-                    "model": self.BEDROCK_MODEL_ID,
+                    "model": self.get_model_id(self.MODEL_TIER_MEMORY_EXTRACTION),
                 }
             },
             "embedder": {
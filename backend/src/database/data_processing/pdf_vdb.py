@@ -5,7 +5,6 @@ import tempfile
 from botocore.config import Config
 from typing import List, Optional
 
-from langchain_aws import BedrockEmbeddings
 from docling.chunking import HybridChunker
 from docling.document_converter import DocumentConverter
 from transformers import AutoTokenizer
@@ -13,7 +12,9 @@ from langchain_chroma import Chroma
 from langchain.schema import Document
 
 from ...config.settings import settings
-from ..models import SessionLocalConfig, KnowledgeBase
+from ..models import SessionLocalConfig, KnowledgeBase, init_databases
+from ...services.answer_cache import answer_cache
+from ...services.bedrock_embeddings import LimitedBedrockEmbeddings
 
 # --------------------------------------------------------------
 # Configuration
@@ -48,7 +49,7 @@ MAX_TOKENS = 4095
 # Embedding Function (Bedrock Best Practice)
 # --------------------------------------------------------------
 
-def get_bedrock_embedding_function() -> BedrockEmbeddings:
+def get_bedrock_embedding_function() -> LimitedBedrockEmbeddings:
     """
     Creates and returns a BedrockEmbeddings client configured with a
     robust retry strategy, following AWS best practices.
@@ -63,7 +64,7 @@ def get_bedrock_embedding_function() -> BedrockEmbeddings:
         region_name=settings.AWS_REGION,
         config=retry_config
     )
-    return BedrockEmbeddings(
+    return LimitedBedrockEmbeddings(
         client=bedrock_runtime_client,
         model_id=EMBED_MODEL_ID
     )
@@ -216,6 +217,8 @@ def vectorise_knowledge_base_from_db(recreate: bool = True) -> List[str]:
         
         print("Committing study status updates to the database...")
         db.commit()
+        # Answers cached before may be outdated now
+        answer_cache.clear("knowledge base re-vectorised")
 
     except Exception as e:
         print(f"An error occurred during the main vectorization loop: {e}")
@@ -228,4 +231,5 @@ def vectorise_knowledge_base_from_db(recreate: bool = True) -> List[str]:
 
 
 if __name__ == "__main__":
+    init_databases()
     vectorise_knowledge_base_from_db(recreate=True)
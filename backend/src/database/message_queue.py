@@ -0,0 +1,434 @@
+"""
+Queue operations on the incoming_messages table.
+
+The Telegram webhook enqueues raw updates; workers lease batches of them with a
+single UPDATE ... RETURNING statement, so several worker processes can share the
+database without processing a message twice.
+
+Claims serve chats round-robin within priority bands: the chat whose pending
+messages carry the highest priority goes first, and each chat contributes its
+oldest pending message before any chat contributes a second one.
+
+Telegram redelivers an update when the webhook answers slowly. Each row stores
+the update's update_id under a unique index, so a redelivery is rejected by the
+insert itself. The webhook batches concurrent inserts (see
+services/ingest_buffer.py) so a burst of updates shares one transaction. Processed rows are kept as 'done' (rather than deleted) for
+QUEUE_DEDUP_RETENTION_HOURS so late redeliveries are still recognised.
+
+A lease lasts until lease_expires_at. Live workers renew the leases of messages they
+are still working on; reclaim_expired_leases() returns messages whose worker died to
+the queue, or fails them once they have been attempted too often.
+"""
+
+import json
+import os
+import re
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import String, and_, cast, delete, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config.settings import settings
+from .models import IncomingMessage, QueueCounter, Ticket
+
+# Queue priorities; a message's priority is the sum of the boosts that apply to it
+PRIORITY_NORMAL = 0
+PRIORITY_ESCALATION_KEYWORD = 1
+PRIORITY_OPEN_HIGH_TICKET = 1
+
+
+def make_claimant_id() -> str:
+    """Return an identifier unique to this worker process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def extract_chat_id(update: Dict[str, Any]) -> Optional[str]:
+    """Return the Telegram chat id of an update, or None for updates without a chat."""
+    tg_message = update.get("message") or update.get("edited_message")
+    try:
+        return str(tg_message["chat"]["id"])
+    except (TypeError, KeyError):
+        return None
+
+
+def _escalation_pattern() -> Optional[re.Pattern]:
+    keywords = [k.strip() for k in (settings.QUEUE_PRIORITY_KEYWORDS or "").split(",") if k.strip()]
+    if not keywords:
+        return None
+    return re.compile(r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b", re.IGNORECASE)
+
+
+def _chats_with_open_high_tickets(db: Session, chat_ids: List[str]) -> set:
+    if not chat_ids:
+        return set()
+    rows = db.query(Ticket.chat_id).filter(
+        Ticket.chat_id.in_(chat_ids),
+        Ticket.status == 'open',
+        Ticket.priority.in_(('high', 'urgent', 'critical')),
+    ).distinct().all()
+    return {row.chat_id for row in rows}
+
+
+def message_priority(update: Dict[str, Any], has_open_high_ticket: bool = False) -> int:
+    """Derive the queue priority of a Telegram update.
+
+    Messages containing an escalation keyword (QUEUE_PRIORITY_KEYWORDS) and messages
+    from customers with an open high-priority ticket are served first.
+    """
+    priority = PRIORITY_NORMAL
+    tg_message = update.get("message") or update.get("edited_message") or {}
+    text = tg_message.get("text") or ""
+    pattern = _escalation_pattern()
+    if text and pattern and pattern.search(text):
+        priority += PRIORITY_ESCALATION_KEYWORD
+    if has_open_high_ticket:
+        priority += PRIORITY_OPEN_HIGH_TICKET
+    return priority
+
+
+def update_priorities(db: Session, updates: List[Dict[str, Any]]) -> List[int]:
+    """message_priority() of each update, looking up open high-priority tickets in one query."""
+    chat_ids = [extract_chat_id(update) for update in updates]
+    escalated_chats = _chats_with_open_high_tickets(db, sorted({c for c in chat_ids if c}))
+    return [message_priority(update, chat_id in escalated_chats) for update, chat_id in zip(updates, chat_ids)]
+
+
+def enqueue_updates(db: Session, updates: List[Dict[str, Any]]) -> List[bool]:
+    """Store a batch of Telegram updates as new queue entries in one transaction.
+
+    Returns, per update, True if it was queued or False if an update with the same
+    update_id was already queued (including earlier in the same batch).
+    """
+    if not updates:
+        return []
+
+    chat_ids = [extract_chat_id(update) for update in updates]
+    priorities = update_priorities(db, updates)
+
+    rows = []
+    queued = []
+    seen_update_ids = set()
+    for update, chat_id, priority in zip(updates, chat_ids, priorities):
+        update_id = update.get("update_id")
+        if update_id is not None and update_id in seen_update_ids:
+            queued.append(False)
+            continue
+        if update_id is not None:
+            seen_update_ids.add(update_id)
+        queued.append(True)
+        rows.append({
+            "payload": json.dumps(update),
+            "status": 'new',
+            "chat_id": chat_id,
+            "priority": priority,
+            "update_id": update_id,
+        })
+
+    # INSERT ... ON CONFLICT DO NOTHING: a redelivered update is rejected by the unique
+    # update_id index without failing the rest of the batch
+    dialect = db.get_bind().dialect.name
+    insert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+    stmt = (
+        insert(IncomingMessage)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[IncomingMessage.update_id])
+        .returning(IncomingMessage.update_id)
+    )
+    try:
+        inserted_update_ids = set(db.execute(stmt).scalars().all())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for i, update in enumerate(updates):
+        update_id = update.get("update_id")
+        if queued[i] and update_id is not None and update_id not in inserted_update_ids:
+            queued[i] = False
+    return queued
+
+
+def enqueue_update(db: Session, update: Dict[str, Any]) -> bool:
+    """Store a single Telegram update. Returns False if it was already queued."""
+    return enqueue_updates(db, [update])[0]
+
+
+def claim_messages(db: Session, claimant_id: str, limit: int, lease_seconds: float) -> List[Any]:
+    """Atomically lease up to `limit` new messages for claimant_id for lease_seconds.
+
+    Candidates are picked and marked as processing in one statement, so two workers
+    can never claim the same row (the status re-check in the outer WHERE covers
+    concurrent claimants on server databases). Chats that already have a message in
+    progress at another claimant are skipped to keep each chat's messages in order
+    across processes. Returns rows with id, chat_id, payload, attempts and priority
+    in the order they should be served.
+    """
+    if limit <= 0:
+        return []
+
+    now = datetime.utcnow()
+    busy_chats = (
+        select(IncomingMessage.chat_id)
+        .where(
+            IncomingMessage.status == 'processing',
+            IncomingMessage.chat_id.is_not(None),
+            IncomingMessage.claimed_by != claimant_id,
+            IncomingMessage.lease_expires_at > now,
+        )
+    )
+    # Messages without a chat form a lane of their own
+    lane = func.coalesce(IncomingMessage.chat_id, literal('message:') + cast(IncomingMessage.id, String))
+    ranked = (
+        select(
+            IncomingMessage.id.label('id'),
+            IncomingMessage.created_at.label('created_at'),
+            # A chat is served at the priority of its most important pending message, so an
+            # urgent follow-up never overtakes the earlier messages of the same chat
+            func.max(IncomingMessage.priority).over(partition_by=lane).label('lane_priority'),
+            func.row_number().over(
+                partition_by=lane,
+                order_by=(IncomingMessage.created_at, IncomingMessage.id),
+            ).label('lane_position'),
+        )
+        .where(
+            IncomingMessage.status == 'new',
+            or_(IncomingMessage.chat_id.is_(None), IncomingMessage.chat_id.not_in(busy_chats)),
+        )
+        .subquery()
+    )
+    candidates = (
+        select(ranked.c.id)
+        .order_by(
+            ranked.c.lane_priority.desc(),
+            ranked.c.lane_position,
+            ranked.c.created_at,
+            ranked.c.id,
+        )
+        .limit(limit)
+    )
+    stmt = (
+        update(IncomingMessage)
+        .where(IncomingMessage.id.in_(candidates), IncomingMessage.status == 'new')
+        .values(
+            status='processing',
+            claimed_by=claimant_id,
+            claimed_at=now,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=IncomingMessage.attempts + 1,
+            updated_at=now,
+        )
+        .returning(
+            IncomingMessage.id,
+            IncomingMessage.chat_id,
+            IncomingMessage.payload,
+            IncomingMessage.created_at,
+            IncomingMessage.attempts,
+            IncomingMessage.priority,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        rows = db.execute(stmt).all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    # RETURNING does not guarantee any order. Chats go by their most important message,
+    # and the messages of a chat keep their enqueue order.
+    lane_priority: Dict[Any, int] = {}
+    for row in rows:
+        lane = row.chat_id or row.id
+        lane_priority[lane] = max(lane_priority.get(lane, 0), row.priority or 0)
+    return sorted(rows, key=lambda row: (-lane_priority[row.chat_id or row.id], row.id))
+
+
+def claim_chat_backlog(db: Session, claimant_id: str, chat_id: str, lease_seconds: float) -> List[Any]:
+    """Lease every new message of one chat, e.g. to merge a chat's backlog into one turn.
+
+    Returns rows like claim_messages(), oldest first.
+    """
+    now = datetime.utcnow()
+    try:
+        rows = db.execute(
+            update(IncomingMessage)
+            .where(IncomingMessage.chat_id == chat_id, IncomingMessage.status == 'new')
+            .values(
+                status='processing',
+                claimed_by=claimant_id,
+                claimed_at=now,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=IncomingMessage.attempts + 1,
+                updated_at=now,
+            )
+            .returning(
+                IncomingMessage.id,
+                IncomingMessage.chat_id,
+                IncomingMessage.payload,
+                IncomingMessage.created_at,
+                IncomingMessage.attempts,
+                IncomingMessage.priority,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return sorted(rows, key=lambda row: (row.created_at or now, row.id))
+
+
+def queue_depth(db: Session, status: str = 'new') -> int:
+    """Number of messages with the given status, read from the trigger-maintained counter."""
+    count = db.query(QueueCounter.count).filter(QueueCounter.status == status).scalar()
+    return max(0, count or 0)
+
+
+def oldest_pending_age_seconds(db: Session) -> float:
+    """Age of the oldest new message in seconds (0 when the queue is empty).
+
+    Served by the (status, created_at) index without scanning the queue.
+    """
+    oldest = db.query(func.min(IncomingMessage.created_at)).filter(IncomingMessage.status == 'new').scalar()
+    if oldest is None:
+        return 0.0
+    return max(0.0, (datetime.utcnow() - oldest).total_seconds())
+
+
+def renew_leases(db: Session, claimant_id: str, message_ids: List[int], lease_seconds: float) -> List[int]:
+    """Extend the leases claimant_id holds on message_ids (heartbeat).
+
+    Returns the ids whose lease was renewed; any id missing from the result was
+    reclaimed by the reaper and may now be processed elsewhere.
+    """
+    if not message_ids:
+        return []
+    now = datetime.utcnow()
+    try:
+        rows = db.execute(
+            update(IncomingMessage)
+            .where(
+                IncomingMessage.id.in_(message_ids),
+                IncomingMessage.claimed_by == claimant_id,
+                IncomingMessage.status == 'processing',
+            )
+            .values(lease_expires_at=now + timedelta(seconds=lease_seconds))
+            .returning(IncomingMessage.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return list(rows)
+
+
+def reclaim_expired_leases(db: Session, max_attempts: int, default_lease_seconds: float) -> Dict[str, int]:
+    """Release messages whose lease ran out without being renewed.
+
+    Messages that still have attempts left go back to 'new' for any worker to claim;
+    the rest are marked 'failed'. Rows claimed before leases existed have no
+    lease_expires_at and are treated as expired default_lease_seconds after claiming.
+    """
+    now = datetime.utcnow()
+    expired = and_(
+        IncomingMessage.status == 'processing',
+        or_(
+            IncomingMessage.lease_expires_at < now,
+            and_(
+                IncomingMessage.lease_expires_at.is_(None),
+                IncomingMessage.updated_at < now - timedelta(seconds=default_lease_seconds),
+            ),
+        ),
+    )
+    try:
+        requeued = db.execute(
+            update(IncomingMessage)
+            .where(expired, IncomingMessage.attempts < max_attempts)
+            .values(status='new', claimed_by=None, claimed_at=None, lease_expires_at=None, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        failed = db.execute(
+            update(IncomingMessage)
+            .where(expired, IncomingMessage.attempts >= max_attempts)
+            .values(status='failed', lease_expires_at=None, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"requeued": requeued, "failed": failed}
+
+
+def ack_message(db: Session, message_id: int, claimant_id: str) -> bool:
+    """Mark a successfully processed message as done. Returns False if the lease was lost.
+
+    Only a message still in processing is settled: once the reaper has failed or
+    requeued it, claimed_by may still name this claimant, but the claim is gone.
+
+    The row is kept (until purge_processed_messages) so its update_id keeps
+    rejecting redeliveries.
+    """
+    result = db.execute(
+        update(IncomingMessage)
+        .where(
+            IncomingMessage.id == message_id,
+            IncomingMessage.claimed_by == claimant_id,
+            IncomingMessage.status == 'processing',
+        )
+        .values(status='done', lease_expires_at=None, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def purge_processed_messages(db: Session, retention_seconds: float) -> int:
+    """Delete done messages older than retention_seconds. Returns the number removed."""
+    result = db.execute(
+        delete(IncomingMessage)
+        .where(
+            IncomingMessage.status == 'done',
+            IncomingMessage.updated_at < datetime.utcnow() - timedelta(seconds=retention_seconds),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def fail_message(db: Session, message_id: int, claimant_id: str) -> bool:
+    """Mark a leased message as failed. Returns False if the lease was lost."""
+    result = db.execute(
+        update(IncomingMessage)
+        .where(
+            IncomingMessage.id == message_id,
+            IncomingMessage.claimed_by == claimant_id,
+            IncomingMessage.status == 'processing',
+        )
+        .values(status='failed', updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def nack_message(db: Session, message_id: int, claimant_id: str) -> bool:
+    """Return a leased message to the queue for another attempt. Returns False if the lease was lost."""
+    result = db.execute(
+        update(IncomingMessage)
+        .where(
+            IncomingMessage.id == message_id,
+            IncomingMessage.claimed_by == claimant_id,
+            IncomingMessage.status == 'processing',
+        )
+        .values(status='new', claimed_by=None, claimed_at=None, lease_expires_at=None, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount > 0
@@ -1,13 +1,28 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, func, ForeignKey, Text, LargeBinary
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, func, ForeignKey, Text, LargeBinary, Index
+import logging
 import os
+import sqlite3
+from contextlib import closing
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 
+logger = logging.getLogger(__name__)
+
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database", "sql_database"))
 os.makedirs(BASE_DIR, exist_ok=True)
 DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'agent.db')}"
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets the API and several worker processes read while one of them writes;
+    # busy_timeout makes competing writers wait instead of failing with "database is locked".
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -20,6 +35,7 @@ class Ticket(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     assigned_to = Column(String, nullable=True)
+    chat_id = Column(String, nullable=True, index=True)  # Telegram chat of the customer who raised it
 
     def __repr__(self):
         return f'<Ticket {self.id}>'
@@ -43,12 +59,33 @@ class IncomingMessage(Base):
     id = Column(Integer, primary_key=True, index=True)
     payload = Column(Text, nullable=False)
     status = Column(String, default='new', index=True)
+    chat_id = Column(String, nullable=True, index=True)  # Telegram chat, used to keep per-chat ordering
+    claimed_by = Column(String, nullable=True)  # worker that leased the message
+    claimed_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)  # claim is void after this unless renewed
+    attempts = Column(Integer, default=0, nullable=False)  # number of times the message was claimed
+    priority = Column(Integer, default=0, nullable=False, index=True)  # higher is served first
+    update_id = Column(Integer, nullable=True, unique=True, index=True)  # Telegram update_id, rejects redelivered updates
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        # Oldest pending message (queue age) is a single index seek
+        Index('ix_incoming_messages_status_created_at', 'status', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<IncomingMessage {self.id} ({self.status})>'
 
+class QueueCounter(Base):
+    """Number of incoming_messages per status, maintained by triggers.
+
+    Lets backlog checks read the queue depth without counting rows.
+    """
+    __tablename__ = 'queue_counters'
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
 # Configuration Database Setup
 DATABASE_URL_CONFIG = f"sqlite:///{os.path.join(BASE_DIR, 'configuration.db')}"
 engine_config = create_engine(DATABASE_URL_CONFIG, connect_args={"check_same_thread": False})
@@ -88,39 +125,113 @@ def get_config_db():
     finally:
         db.close()
 
-# Create tables if they don't exist for both databases
-Base.metadata.create_all(bind=engine)
-BaseConfig.metadata.create_all(bind=engine_config)
-
 # Lightweight adaptive schema upgrade for newly added columns (SQLite only)
-def _ensure_knowledge_base_columns():
-    import sqlite3
-    try:
-        path = os.path.join(BASE_DIR, 'configuration.db')
-        conn = sqlite3.connect(path)
+def _add_missing_columns(db_file: str, table: str, columns: dict, indexes: list | None = None):
+    """Add columns (name -> SQL type/default) missing from an existing SQLite table.
+
+    create_all() only creates missing tables, so columns added to a model after the
+    database file was created have to be added here. Extra statements in indexes are
+    run afterwards (use CREATE INDEX IF NOT EXISTS).
+    """
+    with closing(sqlite3.connect(os.path.join(BASE_DIR, db_file), timeout=5)) as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(knowledge_base)")
+        cur.execute(f"PRAGMA table_info({table})")
         existing = {row[1] for row in cur.fetchall()}
-        # Columns we may have added after initial creation
-        to_add = []
-        if 'content_type' not in existing:
-            to_add.append("ALTER TABLE knowledge_base ADD COLUMN content_type TEXT")
-        if 'size_bytes' not in existing:
-            to_add.append("ALTER TABLE knowledge_base ADD COLUMN size_bytes INTEGER")
-        if 'created_at' not in existing:
-            to_add.append("ALTER TABLE knowledge_base ADD COLUMN created_at DATETIME")
-        if 'file_hash' not in existing:
-            to_add.append("ALTER TABLE knowledge_base ADD COLUMN file_hash TEXT")
-        if 'study_status' not in existing:
-            to_add.append("ALTER TABLE knowledge_base ADD COLUMN study_status TEXT DEFAULT 'not_studied'")
-        for stmt in to_add:
+        for name, ddl in columns.items():
+            if name in existing:
+                continue
             try:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+                logger.info(f"Added column {table}.{name}")
+            except sqlite3.OperationalError as e:
+                # Another process starting at the same time may have added it first
+                if "duplicate column" not in str(e):
+                    raise
+        for stmt in indexes or []:
+            cur.execute(stmt)
+        conn.commit()
+
+def _ensure_knowledge_base_columns():
+    # Columns we may have added after initial creation
+    _add_missing_columns('configuration.db', 'knowledge_base', {
+        'content_type': "TEXT",
+        'size_bytes': "INTEGER",
+        'created_at': "DATETIME",
+        'file_hash': "TEXT",
+        'study_status': "TEXT DEFAULT 'not_studied'",
+    })
+
+def _ensure_incoming_message_columns():
+    _add_missing_columns('agent.db', 'incoming_messages', {
+        'chat_id': "VARCHAR",
+        'claimed_by': "VARCHAR",
+        'claimed_at': "DATETIME",
+        'lease_expires_at': "DATETIME",
+        'attempts': "INTEGER NOT NULL DEFAULT 0",
+        'priority': "INTEGER NOT NULL DEFAULT 0",
+        'update_id': "INTEGER",
+    }, indexes=[
+        "CREATE INDEX IF NOT EXISTS ix_incoming_messages_chat_id ON incoming_messages (chat_id)",
+        "CREATE INDEX IF NOT EXISTS ix_incoming_messages_priority ON incoming_messages (priority)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_incoming_messages_update_id ON incoming_messages (update_id)",
+        "CREATE INDEX IF NOT EXISTS ix_incoming_messages_status_created_at ON incoming_messages (status, created_at)",
+    ])
+
+_QUEUE_COUNTER_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_incoming_messages_count_insert AFTER INSERT ON incoming_messages
+    BEGIN
+        INSERT INTO queue_counters (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_incoming_messages_count_update AFTER UPDATE OF status ON incoming_messages
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE queue_counters SET count = count - 1 WHERE status = OLD.status;
+        INSERT INTO queue_counters (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_incoming_messages_count_delete AFTER DELETE ON incoming_messages
+    BEGIN
+        UPDATE queue_counters SET count = count - 1 WHERE status = OLD.status;
+    END""",
+]
+
+def _ensure_queue_counters():
+    """Install the queue_counters triggers, seeding the counts the first time."""
+    with closing(sqlite3.connect(os.path.join(BASE_DIR, 'agent.db'), timeout=5)) as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_incoming_messages_count_insert'")
+        if cur.fetchone() is None:
+            cur.execute("DELETE FROM queue_counters")
+            cur.execute("INSERT INTO queue_counters (status, count) SELECT status, COUNT(*) FROM incoming_messages WHERE status IS NOT NULL GROUP BY status")
+            for stmt in _QUEUE_COUNTER_TRIGGERS:
                 cur.execute(stmt)
-            except Exception:
-                pass
+            logger.info("Installed queue_counters triggers")
         conn.commit()
-        conn.close()
+
+def _ensure_ticket_columns():
+    _add_missing_columns('agent.db', 'tickets', {
+        'chat_id': "VARCHAR",
+    }, indexes=[
+        "CREATE INDEX IF NOT EXISTS ix_tickets_chat_id ON tickets (chat_id)",
+    ])
+
+def init_databases():
+    """Create missing tables and bring existing SQLite files up to the current schema.
+
+    Called once at startup by the API and by standalone workers, before anything
+    touches the databases. A failed migration is logged and re-raised: running on
+    a half-upgraded schema only fails later, on the first query of a missing column.
+    """
+    try:
+        Base.metadata.create_all(bind=engine)
+        BaseConfig.metadata.create_all(bind=engine_config)
+        _ensure_knowledge_base_columns()
+        _ensure_incoming_message_columns()
+        _ensure_ticket_columns()
+        _ensure_queue_counters()
     except Exception:
-        pass
+        logger.exception("Database schema upgrade failed")
+        raise
 
-_ensure_knowledge_base_columns()
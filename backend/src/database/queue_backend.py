@@ -0,0 +1,198 @@
+"""
+Message queue backends
+
+The webhook ingestion buffer, the worker and the backlog monitor talk to the queue
+through QueueBackend, so the storage behind it is chosen with QUEUE_BACKEND:
+
+- "sqlite" (default): the incoming_messages table, see database/message_queue.py.
+- "redis": a Redis Stream per chat, see database/redis_queue.py.
+  Use it when several API and worker nodes share one queue, so ingestion no longer
+  contends for the SQLite file lock.
+
+Every backend offers the same guarantees: updates are deduplicated by update_id,
+a claimed message is leased to one claimant until it is acked, nacked or its lease
+expires, and a chat's messages are never worked on by two claimants at once.
+Methods are blocking, like the SQLAlchemy calls they wrap.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config.settings import settings
+from .models import get_db
+from . import message_queue
+
+
+@dataclass
+class QueuedMessage:
+    """A claimed queue entry as handed to the worker."""
+    id: Any  # backend-specific message id
+    chat_id: Optional[str]
+    payload: str  # the Telegram update as JSON
+    created_at: Optional[datetime]  # UTC
+    attempts: int
+    priority: int
+
+
+def arrival_key(message_id: Any) -> Tuple[int, ...]:
+    """Sort key following the order messages were enqueued in.
+
+    SQLite ids are autoincrement integers and Redis ids are "<ms>-<seq>/<chat>"
+    strings; neither sorts correctly as text ("10" < "9").
+    """
+    if isinstance(message_id, int):
+        return (message_id,)
+    return tuple(int(part) for part in str(message_id).split("/", 1)[0].split("-"))
+
+
+def serve_order(messages: List[QueuedMessage]) -> List[QueuedMessage]:
+    """Sort claimed messages the way they should be handed to the worker.
+
+    Chats are ordered by their most important message, so an urgent follow-up never
+    overtakes the earlier messages of its own chat. Within a priority, messages keep
+    their enqueue order; created_at only has second resolution, so it cannot order a
+    burst of messages from one chat.
+    """
+    lane_priority: Dict[Any, int] = {}
+    for message in messages:
+        lane = message.chat_id or message.id
+        lane_priority[lane] = max(lane_priority.get(lane, 0), message.priority or 0)
+    return sorted(
+        messages,
+        key=lambda m: (-lane_priority[m.chat_id or m.id], arrival_key(m.id)),
+    )
+
+
+class QueueBackend(ABC):
+    """Storage for incoming Telegram updates waiting to be processed."""
+
+    name = "base"
+
+    @abstractmethod
+    def enqueue(self, updates: List[Dict[str, Any]]) -> List[bool]:
+        """Store a batch of updates. Returns, per update, False if it was a duplicate delivery."""
+
+    @abstractmethod
+    def claim(self, claimant_id: str, limit: int, lease_seconds: float) -> List[QueuedMessage]:
+        """Lease up to `limit` new messages for claimant_id, in the order they should be served."""
+
+    @abstractmethod
+    def claim_chat_backlog(self, claimant_id: str, chat_id: str, lease_seconds: float) -> List[QueuedMessage]:
+        """Lease the pending messages of one chat, oldest first."""
+
+    @abstractmethod
+    def renew(self, claimant_id: str, message_ids: List[Any], lease_seconds: float) -> List[Any]:
+        """Extend the leases claimant_id holds. Returns the ids that are still held."""
+
+    @abstractmethod
+    def ack(self, message_id: Any, claimant_id: str) -> bool:
+        """Mark a message as processed. Returns False if the lease was lost."""
+
+    @abstractmethod
+    def nack(self, message_id: Any, claimant_id: str, requeue: bool = False) -> bool:
+        """Give up on a message: back to the queue if requeue, otherwise mark it failed.
+
+        Returns False if the lease was lost.
+        """
+
+    @abstractmethod
+    def reclaim_expired(self, max_attempts: int, lease_seconds: float) -> Dict[str, int]:
+        """Requeue messages whose lease ran out, failing those out of attempts.
+
+        Returns {"requeued": n, "failed": n}.
+        """
+
+    @abstractmethod
+    def purge(self, retention_seconds: float) -> int:
+        """Forget processed messages older than retention_seconds. Returns the number removed."""
+
+    @abstractmethod
+    def depth(self, status: str = 'new') -> int:
+        """Number of messages with the given status ('new', 'processing', 'done' or 'failed')."""
+
+    @abstractmethod
+    def oldest_pending_age_seconds(self) -> float:
+        """Age of the oldest message waiting to be claimed (0 when there is none)."""
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """The incoming_messages table; every call runs in its own session."""
+
+    name = "sqlite"
+
+    def _run(self, operation, *args):
+        db: Session = next(get_db())
+        try:
+            return operation(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _to_message(row) -> QueuedMessage:
+        return QueuedMessage(
+            id=row.id,
+            chat_id=row.chat_id,
+            payload=row.payload,
+            created_at=row.created_at,
+            attempts=row.attempts or 0,
+            priority=row.priority or 0,
+        )
+
+    def enqueue(self, updates):
+        return self._run(message_queue.enqueue_updates, updates)
+
+    def claim(self, claimant_id, limit, lease_seconds):
+        rows = self._run(message_queue.claim_messages, claimant_id, limit, lease_seconds)
+        return serve_order([self._to_message(row) for row in rows])
+
+    def claim_chat_backlog(self, claimant_id, chat_id, lease_seconds):
+        rows = self._run(message_queue.claim_chat_backlog, claimant_id, chat_id, lease_seconds)
+        return [self._to_message(row) for row in rows]
+
+    def renew(self, claimant_id, message_ids, lease_seconds):
+        return self._run(message_queue.renew_leases, claimant_id, message_ids, lease_seconds)
+
+    def ack(self, message_id, claimant_id):
+        return self._run(message_queue.ack_message, message_id, claimant_id)
+
+    def nack(self, message_id, claimant_id, requeue=False):
+        operation = message_queue.nack_message if requeue else message_queue.fail_message
+        return self._run(operation, message_id, claimant_id)
+
+    def reclaim_expired(self, max_attempts, lease_seconds):
+        return self._run(message_queue.reclaim_expired_leases, max_attempts, lease_seconds)
+
+    def purge(self, retention_seconds):
+        return self._run(message_queue.purge_processed_messages, retention_seconds)
+
+    def depth(self, status='new'):
+        return self._run(message_queue.queue_depth, status)
+
+    def oldest_pending_age_seconds(self):
+        return self._run(message_queue.oldest_pending_age_seconds)
+
+
+_backend: Optional[QueueBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_queue_backend() -> QueueBackend:
+    """Return the process-wide queue backend selected by QUEUE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = (settings.QUEUE_BACKEND or "sqlite").strip().lower()
+                if kind == "sqlite":
+                    _backend = SQLiteQueueBackend()
+                elif kind == "redis":
+                    from .redis_queue import RedisQueueBackend
+                    _backend = RedisQueueBackend(settings.REDIS_URL, settings.REDIS_QUEUE_PREFIX)
+                else:
+                    raise ValueError(f"Unknown QUEUE_BACKEND '{settings.QUEUE_BACKEND}', expected 'sqlite' or 'redis'")
+    return _backend
@@ -0,0 +1,401 @@
+"""
+Redis queue backend (QUEUE_BACKEND=redis)
+
+Any number of API and worker nodes can share this queue without touching the
+SQLite file. Every chat has its own stream (a "lane"), and a chat is owned by at
+most one claimant at a time, so its messages are handed out strictly in arrival
+order. Keys:
+
+- {prefix}:lane:<chat>     the chat's messages, oldest first. Entries are deleted
+                           once acked. Updates without a chat share the lane "_".
+- {prefix}:ready           chats with unclaimed messages and no owner, scored by
+                           the arrival time (ms) of their oldest message.
+- {prefix}:owners          chat -> claimant that owns it.
+- {prefix}:cursors         chat -> id of the last entry handed to its owner. Entries
+                           up to the cursor are in flight, later ones are unclaimed.
+- {prefix}:leases          chat -> time (ms) its owner's lease runs out.
+- {prefix}:held:<claimant> chats a claimant owns.
+- {prefix}:attempts        "<entry>/<chat>" -> times the entry was handed out.
+- {prefix}:counts          number of entries that are "new" and "processing".
+- {prefix}:dedup:<id>      marks a seen update_id for QUEUE_DEDUP_RETENTION_HOURS,
+                           so Telegram redeliveries are rejected at enqueue time.
+- {prefix}:dead            messages that failed or ran out of attempts.
+
+Every operation is one Lua script, so it is atomic: an update is deduplicated and
+appended in the same step, and a chat changes owner only once nothing of it is in
+flight. A claimant keeps the chats it owns and receives their new messages with
+its next claims, until it has settled everything it was handed. When a claimant
+dies, reclaim_expired() returns its in-flight entries to their chats (or to the
+dead stream once delivered max_attempts times) and frees the chats.
+
+Differences from the SQLite backend:
+
+- Chats are served in the order their oldest message arrived. Priority only
+  reorders a claimed batch.
+- The lease belongs to a chat rather than to single messages; renewing any held
+  message of a chat extends it.
+- oldest_pending_age_seconds() only looks at chats without an owner.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config.settings import settings
+from .models import get_db
+from .message_queue import extract_chat_id, update_priorities
+from .queue_backend import QueueBackend, QueuedMessage, serve_order
+
+logger = logging.getLogger(__name__)
+
+# Lane of updates without a chat
+NO_CHAT_LANE = "_"
+# Most entries claim_chat_backlog() hands out at once
+_BACKLOG_LIMIT = 1000
+
+# Shared by every script; ARGV[1] is always the key prefix
+_PRELUDE = """
+local prefix = ARGV[1]
+local owners = prefix .. ':owners'
+local cursors = prefix .. ':cursors'
+local leases = prefix .. ':leases'
+local ready = prefix .. ':ready'
+local attempts = prefix .. ':attempts'
+local counts = prefix .. ':counts'
+local dead = prefix .. ':dead'
+
+local function lane_key(lane) return prefix .. ':lane:' .. lane end
+local function held_key(claimant) return prefix .. ':held:' .. claimant end
+
+local function now_ms()
+    local t = redis.call('TIME')
+    return tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+end
+
+local function entry_ms(id) return tonumber(string.match(id, '^(%d+)')) end
+
+-- The entry `entry` of a lane if it is in flight (at or before the cursor)
+local function in_flight_entry(lane, entry)
+    local cursor = redis.call('HGET', cursors, lane)
+    if not cursor then return nil end
+    local hit = redis.call('XRANGE', lane_key(lane), entry, cursor, 'COUNT', 1)[1]
+    if hit and hit[1] == entry then return hit end
+    return nil
+end
+
+local function bury(lane, entry)
+    local akey = entry[1] .. '/' .. lane
+    redis.call('XADD', dead, '*', 'lane', lane, 'entry', entry[1],
+        'attempts', redis.call('HGET', attempts, akey) or '0', unpack(entry[2]))
+    redis.call('XDEL', lane_key(lane), entry[1])
+    redis.call('HDEL', attempts, akey)
+end
+
+-- Free a lane once nothing of it is in flight; unclaimed entries make it ready again
+local function release_if_idle(lane)
+    local key = lane_key(lane)
+    local cursor = redis.call('HGET', cursors, lane)
+    if cursor and redis.call('XRANGE', key, '-', cursor, 'COUNT', 1)[1] then return end
+    local owner = redis.call('HGET', owners, lane)
+    if owner then redis.call('SREM', held_key(owner), lane) end
+    redis.call('HDEL', owners, lane)
+    redis.call('HDEL', cursors, lane)
+    redis.call('ZREM', leases, lane)
+    local first = redis.call('XRANGE', key, '-', '+', 'COUNT', 1)[1]
+    if first then
+        redis.call('ZADD', ready, entry_ms(first[1]), lane)
+    else
+        redis.call('DEL', key)
+    end
+end
+
+-- Hand up to `limit` unclaimed entries of an owned lane to its owner
+local function take(lane, limit, lease_ms, now, out)
+    local key = lane_key(lane)
+    local cursor = redis.call('HGET', cursors, lane)
+    local entries
+    if cursor then
+        entries = redis.call('XRANGE', key, cursor, '+', 'COUNT', limit + 1)
+    else
+        entries = redis.call('XRANGE', key, '-', '+', 'COUNT', limit)
+    end
+    local taken = 0
+    for _, entry in ipairs(entries) do
+        if taken >= limit then break end
+        if entry[1] ~= cursor then
+            local n = redis.call('HINCRBY', attempts, entry[1] .. '/' .. lane, 1)
+            table.insert(out, {entry[1], lane, n, entry[2]})
+            cursor = entry[1]
+            taken = taken + 1
+        end
+    end
+    if taken > 0 then
+        redis.call('HSET', cursors, lane, cursor)
+        redis.call('HINCRBY', counts, 'new', -taken)
+        redis.call('HINCRBY', counts, 'processing', taken)
+    end
+    redis.call('ZADD', leases, now + lease_ms, lane)
+    return taken
+end
+"""
+
+# ARGV: prefix, retention seconds, then per update: dedup key ("" for none), lane, payload, chat id, priority
+_ENQUEUE = _PRELUDE + """
+local retention = tonumber(ARGV[2])
+local queued = {}
+for i = 3, #ARGV, 5 do
+    local dedup, lane = ARGV[i], ARGV[i + 1]
+    local is_new = 1
+    if dedup ~= '' and redis.call('EXISTS', dedup) == 1 then
+        is_new = 0
+    end
+    if is_new == 1 then
+        -- Append first: if it fails, no dedup key is left behind to reject the redelivery
+        local id = redis.call('XADD', lane_key(lane), '*',
+            'payload', ARGV[i + 2], 'chat_id', ARGV[i + 3], 'priority', ARGV[i + 4])
+        if dedup ~= '' then
+            redis.call('SET', dedup, '1', 'EX', retention)
+        end
+        redis.call('HINCRBY', counts, 'new', 1)
+        if not redis.call('HGET', owners, lane) then
+            redis.call('ZADD', ready, 'NX', entry_ms(id), lane)
+        end
+    end
+    table.insert(queued, is_new)
+end
+return queued
+"""
+
+# ARGV: prefix, claimant, limit, lease ms
+_CLAIM = _PRELUDE + """
+local claimant, remaining, lease_ms = ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[4])
+local now = now_ms()
+local out = {}
+-- Chats nobody owns, oldest message first
+while remaining > 0 do
+    local lanes = redis.call('ZRANGE', ready, 0, remaining - 1)
+    if #lanes == 0 then break end
+    for _, lane in ipairs(lanes) do
+        if remaining <= 0 then break end
+        redis.call('ZREM', ready, lane)
+        redis.call('HSET', owners, lane, claimant)
+        redis.call('SADD', held_key(claimant), lane)
+        local taken = take(lane, remaining, lease_ms, now, out)
+        if taken == 0 then release_if_idle(lane) end
+        remaining = remaining - taken
+    end
+end
+-- New messages of the chats this claimant already owns
+if remaining > 0 then
+    for _, lane in ipairs(redis.call('SMEMBERS', held_key(claimant))) do
+        if remaining <= 0 then break end
+        remaining = remaining - take(lane, remaining, lease_ms, now, out)
+    end
+end
+return out
+"""
+
+# ARGV: prefix, claimant, lane, lease ms, limit
+_CLAIM_LANE = _PRELUDE + """
+local out = {}
+if redis.call('HGET', owners, ARGV[3]) == ARGV[2] then
+    take(ARGV[3], tonumber(ARGV[5]), tonumber(ARGV[4]), now_ms(), out)
+end
+return out
+"""
+
+# ARGV: prefix, claimant, lease ms, then message ids ("<entry>/<lane>")
+_RENEW = _PRELUDE + """
+local claimant, lease_ms = ARGV[2], tonumber(ARGV[3])
+local now = now_ms()
+local renewed = {}
+for i = 4, #ARGV do
+    local entry, lane = string.match(ARGV[i], '^([^/]+)/(.+)$')
+    if lane and redis.call('HGET', owners, lane) == claimant and in_flight_entry(lane, entry) then
+        redis.call('ZADD', leases, now + lease_ms, lane)
+        table.insert(renewed, ARGV[i])
+    end
+end
+return renewed
+"""
+
+# ARGV: prefix, claimant, message id, mode ("ack", "fail" or "requeue")
+_SETTLE = _PRELUDE + """
+local claimant, mode = ARGV[2], ARGV[4]
+local entry_id, lane = string.match(ARGV[3], '^([^/]+)/(.+)$')
+if not lane or redis.call('HGET', owners, lane) ~= claimant then return 0 end
+local entry = in_flight_entry(lane, entry_id)
+if not entry then return 0 end
+if mode == 'requeue' then
+    -- The entry and everything handed out after it become unclaimed again
+    local key = lane_key(lane)
+    local returned = #redis.call('XRANGE', key, entry_id, redis.call('HGET', cursors, lane))
+    local before = redis.call('XREVRANGE', key, entry_id, '-', 'COUNT', 2)[2]
+    if before then
+        redis.call('HSET', cursors, lane, before[1])
+    else
+        redis.call('HDEL', cursors, lane)
+    end
+    redis.call('HINCRBY', counts, 'processing', -returned)
+    redis.call('HINCRBY', counts, 'new', returned)
+else
+    if mode == 'fail' then
+        bury(lane, entry)
+    else
+        redis.call('XDEL', lane_key(lane), entry_id)
+        redis.call('HDEL', attempts, entry_id .. '/' .. lane)
+    end
+    redis.call('HINCRBY', counts, 'processing', -1)
+end
+release_if_idle(lane)
+return 1
+"""
+
+# ARGV: prefix, max attempts
+_RECLAIM = _PRELUDE + """
+local max_attempts = tonumber(ARGV[2])
+local requeued, failed = 0, 0
+for _, lane in ipairs(redis.call('ZRANGEBYSCORE', leases, '-inf', now_ms())) do
+    local cursor = redis.call('HGET', cursors, lane)
+    if cursor then
+        for _, entry in ipairs(redis.call('XRANGE', lane_key(lane), '-', cursor)) do
+            local n = tonumber(redis.call('HGET', attempts, entry[1] .. '/' .. lane)) or 0
+            redis.call('HINCRBY', counts, 'processing', -1)
+            if n >= max_attempts then
+                bury(lane, entry)
+                failed = failed + 1
+            else
+                redis.call('HINCRBY', counts, 'new', 1)
+                requeued = requeued + 1
+            end
+        end
+    end
+    redis.call('HDEL', cursors, lane)
+    release_if_idle(lane)
+end
+return {requeued, failed}
+"""
+
+
+def _message_id(entry_id: str, lane: str) -> str:
+    return f"{entry_id}/{lane}"
+
+
+class RedisQueueBackend(QueueBackend):
+    """Queue on per-chat Redis Streams (requires the redis package)."""
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str], prefix: str, client=None):
+        if client is None:
+            if not url:
+                raise ValueError("REDIS_URL must be set when QUEUE_BACKEND=redis")
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("QUEUE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self._redis = client
+        self._prefix = prefix
+        self._enqueue = client.register_script(_ENQUEUE)
+        self._claim = client.register_script(_CLAIM)
+        self._claim_lane = client.register_script(_CLAIM_LANE)
+        self._renew = client.register_script(_RENEW)
+        self._settle = client.register_script(_SETTLE)
+        self._reclaim = client.register_script(_RECLAIM)
+
+    @staticmethod
+    def _to_messages(claimed: List[Any]) -> List[QueuedMessage]:
+        messages = []
+        for entry_id, lane, attempts, flat_fields in claimed:
+            fields = dict(zip(flat_fields[::2], flat_fields[1::2]))
+            messages.append(QueuedMessage(
+                id=_message_id(entry_id, lane),
+                chat_id=fields.get("chat_id") or None,
+                payload=fields.get("payload", "{}"),
+                created_at=datetime.utcfromtimestamp(int(entry_id.split("-")[0]) / 1000),
+                attempts=int(attempts),
+                priority=int(fields.get("priority") or 0),
+            ))
+        return messages
+
+    # -- QueueBackend ---------------------------------------------------------
+
+    def enqueue(self, updates):
+        if not updates:
+            return []
+
+        db: Session = next(get_db())
+        try:
+            # Open high-priority tickets still live in the application database
+            priorities = update_priorities(db, updates)
+        finally:
+            db.close()
+
+        queued: List[Optional[bool]] = []
+        args: List[Any] = [self._prefix, max(1, int(settings.QUEUE_DEDUP_RETENTION_HOURS * 3600))]
+        seen_update_ids = set()
+        for update, priority in zip(updates, priorities):
+            update_id = update.get("update_id")
+            if update_id is not None and update_id in seen_update_ids:
+                queued.append(False)
+                continue
+            queued.append(None)  # decided by the script
+            chat_id = extract_chat_id(update) or ""
+            dedup_key = ""
+            if update_id is not None:
+                seen_update_ids.add(update_id)
+                dedup_key = f"{self._prefix}:dedup:{update_id}"
+            args += [dedup_key, chat_id or NO_CHAT_LANE, json.dumps(update), chat_id, priority]
+        results = iter(self._enqueue(keys=[], args=args))
+        return [bool(next(results)) if decided is None else decided for decided in queued]
+
+    def claim(self, claimant_id, limit, lease_seconds):
+        if limit <= 0:
+            return []
+        claimed = self._claim(keys=[], args=[self._prefix, claimant_id, limit, int(lease_seconds * 1000)])
+        return serve_order(self._to_messages(claimed))
+
+    def claim_chat_backlog(self, claimant_id, chat_id, lease_seconds):
+        claimed = self._claim_lane(
+            keys=[], args=[self._prefix, claimant_id, chat_id, int(lease_seconds * 1000), _BACKLOG_LIMIT],
+        )
+        return self._to_messages(claimed)
+
+    def renew(self, claimant_id, message_ids, lease_seconds):
+        if not message_ids:
+            return []
+        return list(self._renew(keys=[], args=[self._prefix, claimant_id, int(lease_seconds * 1000), *message_ids]))
+
+    def ack(self, message_id, claimant_id):
+        return bool(self._settle(keys=[], args=[self._prefix, claimant_id, message_id, "ack"]))
+
+    def nack(self, message_id, claimant_id, requeue=False):
+        mode = "requeue" if requeue else "fail"
+        return bool(self._settle(keys=[], args=[self._prefix, claimant_id, message_id, mode]))
+
+    def reclaim_expired(self, max_attempts, lease_seconds):
+        # Lease expiry times were recorded when the chats were claimed or renewed
+        requeued, failed = self._reclaim(keys=[], args=[self._prefix, max_attempts])
+        return {"requeued": int(requeued), "failed": int(failed)}
+
+    def purge(self, retention_seconds):
+        # Acked entries are deleted right away and dedup keys expire on their own
+        return 0
+
+    def depth(self, status='new'):
+        if status == 'failed':
+            return self._redis.xlen(f"{self._prefix}:dead")
+        if status in ('new', 'processing'):
+            return max(0, int(self._redis.hget(f"{self._prefix}:counts", status) or 0))
+        return 0
+
+    def oldest_pending_age_seconds(self):
+        oldest: List[Tuple[str, float]] = self._redis.zrange(f"{self._prefix}:ready", 0, 0, withscores=True)
+        if not oldest:
+            return 0.0
+        return max(0.0, time.time() - oldest[0][1] / 1000)
@@ -1,16 +1,15 @@
 from fastapi import FastAPI, Request
+import asyncio
 import logging
 from fastapi.middleware.cors import CORSMiddleware # Added this import
 
 from .api.routes import router as api_router
-from .database.models import Base, engine
+from .config.settings import settings
+from .database.models import init_databases
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title="SuperConfig API")
 
 # Set up CORS middleware
@@ -30,6 +29,35 @@ app.add_middleware(
 # Include all API routes 
 app.include_router(api_router)
 
+@app.on_event("startup")
+def create_database_tables():
+    """Create and upgrade the database schema before anything else starts."""
+    init_databases()
+
+@app.on_event("startup")
+async def warm_specialist_agents():
+    """Build the pooled specialist agents before the first request needs them."""
+    if settings.AGENT_POOL_WARM_ON_STARTUP:
+        from .agent.agent_pool import warm_agent_pools
+        await asyncio.to_thread(warm_agent_pools)
+
+@app.on_event("startup")
+async def start_in_process_worker():
+    """Optionally run the message worker inside the API process.
+
+    Co-located workers are woken directly by the webhook through an asyncio event.
+    """
+    if settings.WORKER_IN_PROCESS:
+        from .worker import main as run_worker
+        app.state.worker_task = asyncio.create_task(run_worker())
+        logger.info("Started in-process message worker")
+
+@app.on_event("shutdown")
+async def stop_in_process_worker():
+    task = getattr(app.state, "worker_task", None)
+    if task:
+        task.cancel()
+
 @app.get("/")
 async def root(request: Request):
     return {"message": "SuperConfig API is running"}
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Semantic answer cache (ANSWER_CACHE_ENABLED)
+
+Customers ask the same FAQ in slightly different words ("what are your opening
+hours", "when are you open?"). Without a cache, each one costs a knowledge base
+search plus an orchestrator turn. This cache keeps the replies sent for such
+questions, keyed on the embedding of the customer's message. A new message whose
+embedding is at least ANSWER_CACHE_MIN_SIMILARITY (cosine) close to a cached one
+gets that reply directly.
+
+Scope
+    Entries belong to one (company name, tone, knowledge base state) scope. The
+    knowledge base state is the set of (document id, study_status) pairs. When
+    any part changes, e.g. a document is uploaded, studied, fails or is deleted,
+    or the tone is changed via /configure_agent, the cache is emptied.
+    vectorise_knowledge_base_from_db and /configure_agent also clear it explicitly.
+
+What is cached
+    Only turns that answered from the knowledge base alone. The orchestrator must
+    have had knowledge base results (prefetched or from knowledge_base_search),
+    found no memories or open tickets for the customer, called no other tool
+    besides send_message, and not addressed the customer by name. The reply must
+    also be grounded in those results: every number in it appears in them, and
+    so do at least a third of its words. Knowledge base results that the reply
+    did not draw on do not make a turn cacheable.
+    Messages that refer to the customer's own things ("my order", "#1234") never
+    use the cache, and neither do messages of a chat whose orchestrator session
+    already has turns: "how much is it?" depends on what came before.
+
+stats() reports the hit rate and the time saved: the orchestrator time recorded
+for each reused answer, minus the lookup time.
+"""
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config.settings import settings
+from ..database.models import KnowledgeBase, SessionLocalConfig
+from .blocking_io import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Tools a cacheable orchestrator turn may use
+CACHEABLE_TOOLS = {"knowledge_base_search", "get_user_memories", "send_message"}
+
+_PERSONAL = re.compile(r"\b(my|mine|our|ours)\b|#\s*\d+|\b\d{4,}\b", re.IGNORECASE)
+
+# Knowledge base search results that carry no knowledge
+_NO_KNOWLEDGE = ("No relevant documents", "Error searching")
+
+_NUMBER = re.compile(r"\d+(?:[.:,]\d+)*")
+_WORD = re.compile(r"[^\W\d_]{4,}")
+# Share of a reply's words that must appear in the knowledge base results
+_MIN_GROUNDED_WORDS = 1 / 3
+
+Scope = Tuple[Any, ...]
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    vector: np.ndarray
+    answer: str
+    answer_seconds: float  # orchestrator time it took to produce the answer
+    created_at: float
+    hits: int = 0
+
+
+def _knowledge_base_fingerprint() -> Tuple[Tuple[int, Optional[str]], ...]:
+    db = SessionLocalConfig()
+    try:
+        rows = db.query(KnowledgeBase.id, KnowledgeBase.study_status).order_by(KnowledgeBase.id).all()
+        return tuple((row.id, row.study_status) for row in rows)
+    finally:
+        db.close()
+
+
+def _current_scope() -> Scope:
+    return (settings.COMPANY_NAME, settings.get_tone_and_manner(), _knowledge_base_fingerprint())
+
+
+def is_personal(text: str) -> bool:
+    """Whether a message refers to the customer's own things and must not share answers."""
+    return bool(_PERSONAL.search(text))
+
+
+class AnswerCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: List[CachedAnswer] = []
+        self._scope: Optional[Scope] = None
+        self._embedder = None
+        self._lookups = 0
+        self._hits = 0
+        self._bypassed = 0
+        self._stored = 0
+        self._invalidations = 0
+        self._lookup_seconds = 0.0
+        self._saved_seconds = 0.0
+
+    def _embed(self, text: str) -> np.ndarray:
+        if self._embedder is None:
+            from .bedrock_embeddings import get_bedrock_embeddings
+
+            self._embedder = get_bedrock_embeddings()
+        vector = np.asarray(self._embedder.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _enter_scope(self, scope: Scope):
+        # Caller holds the lock
+        if scope != self._scope:
+            if self._scope is not None and self._entries:
+                self._invalidations += 1
+                logger.info(f"Answer cache invalidated ({len(self._entries)} entries): company, tone or knowledge base changed")
+            self._entries = []
+            self._scope = scope
+
+    def clear(self, reason: str):
+        with self._lock:
+            if self._entries:
+                self._invalidations += 1
+                logger.info(f"Answer cache cleared ({len(self._entries)} entries): {reason}")
+            self._entries = []
+            self._scope = None
+
+    def _lookup(self, text: str) -> Optional[CachedAnswer]:
+        scope = _current_scope()
+        vector = self._embed(text)
+        with self._lock:
+            self._enter_scope(scope)
+            now = time.time()
+            self._entries = [e for e in self._entries if now - e.created_at < settings.ANSWER_CACHE_TTL_SECONDS]
+            if not self._entries:
+                return None
+            similarities = np.stack([e.vector for e in self._entries]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < settings.ANSWER_CACHE_MIN_SIMILARITY:
+                return None
+            entry = self._entries[best]
+            entry.hits += 1
+            logger.info(f"Answer cache hit (similarity {similarities[best]:.3f}): {text!r} ~ {entry.query!r}")
+            return entry
+
+    async def lookup(self, text: str) -> Optional[str]:
+        """The cached answer for a customer message, or None."""
+        if not settings.ANSWER_CACHE_ENABLED or not text:
+            return None
+        if is_personal(text):
+            with self._lock:
+                self._bypassed += 1
+            return None
+
+        started = time.monotonic()
+        try:
+            entry = await run_blocking(self._lookup, text)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._lookups += 1
+            self._lookup_seconds += elapsed
+            if entry is not None:
+                self._hits += 1
+                self._saved_seconds += max(0.0, entry.answer_seconds - elapsed)
+        return entry.answer if entry else None
+
+    def _store(self, text: str, answer: str, answer_seconds: float):
+        scope = _current_scope()
+        vector = self._embed(text)
+        with self._lock:
+            self._enter_scope(scope)
+            self._entries.append(CachedAnswer(text, vector, answer, answer_seconds, time.time()))
+            if len(self._entries) > settings.ANSWER_CACHE_MAX_ENTRIES:
+                # Drop the least used of the oldest half
+                oldest = self._entries[: max(1, len(self._entries) // 2)]
+                self._entries.remove(min(oldest, key=lambda e: e.hits))
+            self._stored += 1
+
+    async def store(self, text: str, answer: str, answer_seconds: float):
+        """Remember the answer to a customer message (see cacheable_answer)."""
+        if not settings.ANSWER_CACHE_ENABLED or not text or not answer or is_personal(text):
+            return
+        try:
+            await run_blocking(self._store, text, answer, answer_seconds)
+        except Exception as e:
+            logger.warning(f"Answer cache store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": settings.ANSWER_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._lookups, 3) if self._lookups else 0.0,
+                "bypassed_personal": self._bypassed,
+                "stored": self._stored,
+                "invalidations": self._invalidations,
+                "avg_lookup_ms": round(1000 * self._lookup_seconds / self._lookups, 1) if self._lookups else 0.0,
+                "latency_saved_seconds": round(self._saved_seconds, 1),
+            }
+
+
+def _grounded(reply: str, knowledge: str) -> bool:
+    """Whether reply restates knowledge rather than something else the turn saw."""
+    knowledge = knowledge.lower()
+    reply = reply.lower()
+    if not set(_NUMBER.findall(reply)) <= set(_NUMBER.findall(knowledge)):
+        return False
+    words = set(_WORD.findall(reply))
+    known = set(_WORD.findall(knowledge))
+    return not words or len(words & known) >= _MIN_GROUNDED_WORDS * len(words)
+
+
+def cacheable_answer(
+    turn_messages: List[Dict[str, Any]], chat_id: str, customer_name: Optional[str] = None,
+    knowledge: Optional[str] = None,
+) -> Optional[str]:
+    """The reply of an orchestrator turn if it can be shared with other customers, else None.
+
+    turn_messages are the agent messages of the turn, starting after its prompt.
+    knowledge is the knowledge base text prefetched into the prompt, if any (the
+    caller checks that the prefetched context held nothing personal).
+    """
+    tools_used = set()
+    replies = []
+    results: Dict[str, str] = {}
+    memory_calls = []
+    knowledge_calls = []
+    for message in turn_messages:
+        for block in message.get("content", []):
+            if "toolUse" in block:
+                use = block["toolUse"]
+                tools_used.add(use.get("name"))
+                tool_input = use.get("input") or {}
+                if use.get("name") == "send_message" and str(tool_input.get("chat_id")) == str(chat_id):
+                    replies.append(tool_input.get("message", ""))
+                elif use.get("name") == "get_user_memories":
+                    memory_calls.append(use.get("toolUseId"))
+                elif use.get("name") == "knowledge_base_search":
+                    knowledge_calls.append(use.get("toolUseId"))
+            elif "toolResult" in block:
+                result = block["toolResult"]
+                results[result.get("toolUseId")] = " ".join(
+                    part.get("text", "") for part in result.get("content", []) if isinstance(part, dict)
+                )
+
+    if not tools_used <= CACHEABLE_TOOLS or len(replies) != 1:
+        return None
+    # Answers built on what we know about this customer are not reusable
+    if any(results.get(call_id, "").startswith("Found") for call_id in memory_calls):
+        return None
+    found = [results.get(call_id, "") for call_id in knowledge_calls]
+    knowledge_texts = [knowledge or ""] + [text for text in found if text and not text.startswith(_NO_KNOWLEDGE)]
+    reply = replies[0]
+    if not any(knowledge_texts) or not _grounded(reply, "\n".join(knowledge_texts)):
+        return None
+    names = [part for part in (customer_name or "").lower().split() if len(part) >= 3]
+    if any(re.search(rf"\b{re.escape(name)}\b", reply.lower()) for name in names):
+        return None
+    return reply
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,109 @@
+"""
+Backlog monitoring and load shedding
+
+Classifies the message queue into three modes from its depth and the age of its
+oldest pending message:
+
+- normal: messages are processed one turn at a time as usual.
+- busy:   new senders get a one-off "we're busy" notice (BACKLOG_BUSY_MESSAGE) so
+          they know a reply will be late.
+- shed:   workers merge a chat's whole backlog into one turn and keep only its
+          latest BACKLOG_MERGE_MAX_MESSAGES messages in the prompt, so the queue
+          drains at one agent run per chat instead of one per message.
+
+Depth and age come from the queue backend (for SQLite, the trigger-maintained
+queue_counters table and the (status, created_at) index) and are cached for
+BACKLOG_CHECK_INTERVAL_SECONDS, so checking on every webhook call is cheap.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from ..config.settings import settings
+from ..database.queue_backend import get_queue_backend
+from .telegram_client import log_agent_message, send_telegram_message
+
+logger = logging.getLogger(__name__)
+
+MODE_NORMAL = "normal"
+MODE_BUSY = "busy"
+MODE_SHED = "shed"
+
+
+@dataclass
+class QueueHealth:
+    depth: int
+    oldest_age_seconds: float
+    mode: str
+
+
+def classify_backlog(depth: int, oldest_age_seconds: float) -> str:
+    """Return the backlog mode for the given queue depth and age (0 thresholds are disabled)."""
+    def exceeded(value, threshold):
+        return bool(threshold) and value >= threshold
+
+    if exceeded(depth, settings.BACKLOG_SHED_DEPTH) or exceeded(oldest_age_seconds, settings.BACKLOG_SHED_AGE_SECONDS):
+        return MODE_SHED
+    if exceeded(depth, settings.BACKLOG_BUSY_DEPTH) or exceeded(oldest_age_seconds, settings.BACKLOG_BUSY_AGE_SECONDS):
+        return MODE_BUSY
+    return MODE_NORMAL
+
+
+class BacklogMonitor:
+    """Caches the queue health and sends busy notices at most once per chat per cooldown."""
+
+    def __init__(self, check_interval: float):
+        self._check_interval = check_interval
+        self._health: Optional[QueueHealth] = None
+        self._checked_at = 0.0
+        self._last_mode = MODE_NORMAL
+        self._busy_notified: Dict[str, float] = {}
+
+    def health(self) -> QueueHealth:
+        now = time.monotonic()
+        if self._health is None or now - self._checked_at >= self._check_interval:
+            queue = get_queue_backend()
+            try:
+                depth = queue.depth()
+                age = queue.oldest_pending_age_seconds()
+            except Exception as e:
+                logger.error(f"Failed to read queue health: {e}")
+                return self._health or QueueHealth(0, 0.0, MODE_NORMAL)
+            self._health = QueueHealth(depth, age, classify_backlog(depth, age))
+            self._checked_at = now
+            if self._health.mode != self._last_mode:
+                logger.warning(
+                    "backlog_mode_changed from=%s to=%s depth=%d oldest_age_s=%.0f",
+                    self._last_mode, self._health.mode, depth, age,
+                )
+                self._last_mode = self._health.mode
+        return self._health
+
+    def should_notify_busy(self, chat_id: str) -> bool:
+        """True if chat_id has not been sent a busy notice within the cooldown."""
+        now = time.monotonic()
+        last = self._busy_notified.get(chat_id)
+        if last is not None and now - last < settings.BACKLOG_BUSY_REPLY_COOLDOWN_SECONDS:
+            return False
+        self._busy_notified[chat_id] = now
+        if len(self._busy_notified) > 10000:
+            cutoff = now - settings.BACKLOG_BUSY_REPLY_COOLDOWN_SECONDS
+            self._busy_notified = {c: t for c, t in self._busy_notified.items() if t >= cutoff}
+        return True
+
+    async def notify_if_busy(self, chat_id: Optional[str]):
+        """Send the busy notice to chat_id if the backlog is in busy or shed mode."""
+        if not chat_id or not settings.BACKLOG_BUSY_MESSAGE:
+            return
+        health = await asyncio.to_thread(self.health)
+        if health.mode == MODE_NORMAL or not self.should_notify_busy(chat_id):
+            return
+        if await send_telegram_message(chat_id, settings.BACKLOG_BUSY_MESSAGE):
+            await asyncio.to_thread(log_agent_message, chat_id, settings.BACKLOG_BUSY_MESSAGE)
+            logger.info("backlog_busy_notice chat_id=%s mode=%s depth=%d", chat_id, health.mode, health.depth)
+
+
+backlog_monitor = BacklogMonitor(settings.BACKLOG_CHECK_INTERVAL_SECONDS)
@@ -0,0 +1,36 @@
+"""
+Bedrock embeddings behind the Bedrock limiter
+
+Knowledge base search, document ingestion and the answer cache embed text with
+Titan on Bedrock. LimitedBedrockEmbeddings makes each embedding request hold a
+slot of the process-wide limiter (see bedrock_limiter.py), one per text, like the
+requests it sends.
+"""
+
+from typing import List, Optional
+
+from langchain_aws import BedrockEmbeddings
+
+from ..config.settings import settings
+from .bedrock_limiter import bedrock_limiter
+
+
+class LimitedBedrockEmbeddings(BedrockEmbeddings):
+    def embed_query(self, text: str) -> List[float]:
+        with bedrock_limiter.slot("embeddings"):
+            return super().embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            with bedrock_limiter.slot("embeddings"):
+                vectors.extend(super().embed_documents([text]))
+        return vectors
+
+
+def get_bedrock_embeddings(model_id: Optional[str] = None) -> BedrockEmbeddings:
+    """Embeddings for model_id (default EMBED_MODEL_ID) in AWS_REGION."""
+    return LimitedBedrockEmbeddings(
+        model_id=model_id or settings.EMBED_MODEL_ID or "amazon.titan-embed-text-v2:0",
+        region_name=settings.AWS_REGION or "us-east-1",
+    )
@@ -0,0 +1,346 @@
+"""
+Bedrock request limiter (BEDROCK_LIMITER_ENABLED)
+
+Every agent, the knowledge base and answer cache embeddings, and Mem0 call
+Bedrock. Nothing used to limit how many of those calls were in flight. Under
+load Bedrock answers with ThrottlingException. Each layer (botocore, the strands
+event loop) then retried on its own, which only added to the load. Every Bedrock
+call now goes through the one BedrockLimiter of the process:
+
+Token bucket
+    Calls start at most BEDROCK_RATE_LIMIT_PER_SECOND on average, with bursts of
+    up to BEDROCK_RATE_LIMIT_BURST. With BEDROCK_RATE_LIMIT_BACKEND=redis the
+    bucket is kept in Redis (REDIS_URL) and shared by every API and worker process.
+    If Redis cannot be reached, the process falls back to a local bucket.
+
+AIMD concurrency limit
+    At most `limit` calls are in flight. The limit starts at
+    BEDROCK_CONCURRENCY_INITIAL. It grows by 1/limit per successful call (about +1
+    per round of calls). It is multiplied by BEDROCK_CONCURRENCY_BACKOFF when a call
+    is throttled, at most once per BEDROCK_THROTTLE_COOLDOWN_SECONDS, so one burst of
+    throttles counts once. It stays within [BEDROCK_CONCURRENCY_MIN,
+    BEDROCK_CONCURRENCY_MAX]. Throughput therefore settles just below the
+    account's limit. Retries after a throttle queue up behind other calls instead
+    of firing immediately.
+
+A call waits at most BEDROCK_LIMITER_MAX_WAIT_SECONDS for its turn, or until the
+current request's deadline (see request_budget.py). After that it fails with
+BedrockLimiterTimeout. stats() reports queue waits and throttle rates per caller.
+GET /agent/metrics includes them.
+
+    with bedrock_limiter.slot("embeddings"):         # blocking code
+        vector = client.embed_query(text)
+
+    async with bedrock_limiter.slot_async("model"):  # coroutines
+        ...
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+from ..config.settings import settings
+from .request_budget import current_budget
+from .slot_gate import SlotGate
+
+logger = logging.getLogger(__name__)
+
+_THROTTLE_MARKERS = ("throttl", "too many requests", "toomanyrequests", "rate exceeded", "servicequotaexceeded")
+
+# Atomic token reservation. Returns the seconds the caller must wait for its token.
+_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+if tokens >= 0 then return '0' end
+return tostring(-tokens / rate)
+"""
+
+
+class BedrockLimiterTimeout(TimeoutError):
+    pass
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Whether an exception from a Bedrock client (boto, strands, langchain, Mem0) is a throttle."""
+    code = getattr(error, "response", None)
+    if isinstance(code, dict) and "throttl" in str(code.get("Error", {}).get("Code", "")).lower():
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _THROTTLE_MARKERS)
+
+
+class _LocalBucket:
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate) - 1
+            self._updated = now
+            return max(0.0, -self._tokens / self._rate)
+
+
+class _RedisBucket:
+    """Token bucket in Redis, shared by every process using the same REDIS_URL."""
+
+    def __init__(self, rate: float, burst: int, url: Optional[str], key: str, client=None):
+        if client is None:
+            if not url:
+                raise ValueError("REDIS_URL must be set when BEDROCK_RATE_LIMIT_BACKEND=redis")
+            import redis
+
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._key = key
+        self._script = client.register_script(_RESERVE_SCRIPT)
+        self._fallback = _LocalBucket(rate, burst)
+        self._failing = False
+
+    def reserve(self) -> float:
+        try:
+            wait = float(self._script(keys=[self._key], args=[self._rate, self._burst]))
+        except Exception as e:
+            if not self._failing:
+                logger.warning(f"Bedrock rate limit: Redis unavailable, using a per-process bucket: {e}")
+                self._failing = True
+            return self._fallback.reserve()
+        if self._failing:
+            logger.info("Bedrock rate limit: Redis reachable again")
+            self._failing = False
+        return wait
+
+
+class _AimdGate(SlotGate):
+    """Concurrency limit with additive increase and multiplicative decrease."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, backoff: float, cooldown: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        super().__init__(min(self.maximum, max(self.minimum, initial)))
+        self._backoff = backoff
+        self._cooldown = cooldown
+        self._last_decrease = 0.0
+
+    def release(self, outcome: str = "error"):
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == "throttled":
+                now = time.monotonic()
+                if now - self._last_decrease >= self._cooldown:
+                    previous = self.limit
+                    self.limit = max(self.minimum, self.limit * self._backoff)
+                    self._last_decrease = now
+                    logger.warning(f"Bedrock throttled: concurrency limit {previous:.1f} -> {self.limit:.1f}")
+            self._wake()
+
+
+class _CallerStats:
+    def __init__(self):
+        self.calls = 0
+        self.throttled = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.waits: Deque[float] = deque(maxlen=1000)
+
+    def to_dict(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "throttle_rate": round(self.throttled / self.calls, 3) if self.calls else 0.0,
+            "errors": self.errors,
+            "wait_timeouts": self.timeouts,
+            "avg_wait_ms": round(1000 * self.wait_seconds / self.calls, 1) if self.calls else 0.0,
+            "p95_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            "max_wait_ms": round(1000 * waits[-1], 1) if waits else 0.0,
+        }
+
+
+class BedrockLimiter:
+    def __init__(self):
+        self._gate = _AimdGate(
+            settings.BEDROCK_CONCURRENCY_INITIAL,
+            settings.BEDROCK_CONCURRENCY_MIN,
+            settings.BEDROCK_CONCURRENCY_MAX,
+            settings.BEDROCK_CONCURRENCY_BACKOFF,
+            settings.BEDROCK_THROTTLE_COOLDOWN_SECONDS,
+        )
+        self._bucket = None
+        self._bucket_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._callers: Dict[str, _CallerStats] = {}
+
+    def _get_bucket(self):
+        if settings.BEDROCK_RATE_LIMIT_PER_SECOND <= 0:
+            return None
+        with self._bucket_lock:
+            if self._bucket is None:
+                rate, burst = settings.BEDROCK_RATE_LIMIT_PER_SECOND, settings.BEDROCK_RATE_LIMIT_BURST
+                if settings.BEDROCK_RATE_LIMIT_BACKEND == "redis":
+                    try:
+                        self._bucket = _RedisBucket(
+                            rate, burst, settings.REDIS_URL, f"{settings.REDIS_QUEUE_PREFIX}:bedrock_tokens"
+                        )
+                    except Exception as e:
+                        logger.error(f"Bedrock rate limit: cannot use Redis, using a per-process bucket: {e}")
+                if self._bucket is None:
+                    self._bucket = _LocalBucket(rate, burst)
+            return self._bucket
+
+    @staticmethod
+    def _max_wait() -> float:
+        budget = current_budget.get()
+        timeout = settings.BEDROCK_LIMITER_MAX_WAIT_SECONDS
+        return budget.bound(timeout) if budget is not None else timeout
+
+    def _caller(self, caller: str) -> _CallerStats:
+        stats = self._callers.get(caller)
+        if stats is None:
+            stats = self._callers[caller] = _CallerStats()
+        return stats
+
+    def _waited(self, caller: str, seconds: float):
+        with self._stats_lock:
+            stats = self._caller(caller)
+            stats.calls += 1
+            stats.wait_seconds += seconds
+            stats.waits.append(seconds)
+
+    def _timed_out(self, caller: str, max_wait: float) -> BedrockLimiterTimeout:
+        with self._stats_lock:
+            self._caller(caller).timeouts += 1
+        return BedrockLimiterTimeout(f"No Bedrock capacity for {caller} within {max_wait:.1f}s")
+
+    def _finish(self, caller: str, error: Optional[BaseException]):
+        if error is None:
+            outcome = "success"
+        elif isinstance(error, Exception) and is_throttling_error(error):
+            outcome = "throttled"
+        else:
+            outcome = "error"  # includes cancellation; neither grows nor shrinks the limit
+        with self._stats_lock:
+            if outcome == "throttled":
+                self._caller(caller).throttled += 1
+            elif outcome == "error":
+                self._caller(caller).errors += 1
+        self._gate.release(outcome)
+
+    @contextmanager
+    def slot(self, caller: str) -> Iterator[None]:
+        """Hold a Bedrock slot for one blocking call."""
+        if not settings.BEDROCK_LIMITER_ENABLED:
+            yield
+            return
+        started = time.monotonic()
+        max_wait = self._max_wait()
+        if not self._gate.acquire(timeout=max_wait):
+            raise self._timed_out(caller, max_wait)
+        try:
+            bucket = self._get_bucket()
+            delay = bucket.reserve() if bucket is not None else 0.0
+            if delay > max_wait - (time.monotonic() - started):
+                raise self._timed_out(caller, max_wait)
+            if delay:
+                time.sleep(delay)
+        except BaseException:
+            self._gate.release("error")
+            raise
+        self._waited(caller, time.monotonic() - started)
+        try:
+            yield
+        except BaseException as e:
+            self._finish(caller, e)
+            raise
+        self._finish(caller, None)
+
+    @asynccontextmanager
+    async def slot_async(self, caller: str) -> AsyncIterator[None]:
+        """Hold a Bedrock slot for one call made from a coroutine, without blocking the event loop."""
+        if not settings.BEDROCK_LIMITER_ENABLED:
+            yield
+            return
+        started = time.monotonic()
+        max_wait = self._max_wait()
+        if not await self._gate.acquire_async(max_wait):
+            raise self._timed_out(caller, max_wait)
+        try:
+            bucket = self._get_bucket()
+            delay = bucket.reserve() if bucket is not None else 0.0
+            if delay > max_wait - (time.monotonic() - started):
+                raise self._timed_out(caller, max_wait)
+            if delay:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._gate.release("error")
+            raise
+        self._waited(caller, time.monotonic() - started)
+        try:
+            yield
+        except BaseException as e:
+            self._finish(caller, e)
+            raise
+        self._finish(caller, None)
+
+    def has_spare_capacity(self) -> bool:
+        """Whether a call started now would get a slot without queueing."""
+        return not settings.BEDROCK_LIMITER_ENABLED or self._gate.in_flight < int(self._gate.limit)
+
+    def limited(self, caller: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """func, with every call holding a Bedrock slot (for blocking clients such as Mem0's)."""
+        def call(*args, **kwargs):
+            with self.slot(caller):
+                return func(*args, **kwargs)
+
+        call.__wrapped__ = func
+        return call
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            callers = {name: stats.to_dict() for name, stats in self._callers.items()}
+        calls = sum(c["calls"] for c in callers.values())
+        throttled = sum(c["throttled"] for c in callers.values())
+        return {
+            "enabled": settings.BEDROCK_LIMITER_ENABLED,
+            "rate_limit_backend": settings.BEDROCK_RATE_LIMIT_BACKEND,
+            "rate_limit_per_second": settings.BEDROCK_RATE_LIMIT_PER_SECOND,
+            "concurrency_limit": round(self._gate.limit, 2),
+            "in_flight": self._gate.in_flight,
+            "calls": calls,
+            "throttled": throttled,
+            "throttle_rate": round(throttled / calls, 3) if calls else 0.0,
+            "callers": callers,
+        }
+
+
+def limit_mem0_calls(memory_client: Any):
+    """Route the Bedrock calls of a Mem0 Memory (LLM fact extraction, embeddings) through the limiter."""
+    if (settings.MEM0_LLM_PROVIDER or "aws_bedrock") == "aws_bedrock":
+        llm = memory_client.llm
+        llm.generate_response = bedrock_limiter.limited("mem0_llm", llm.generate_response)
+    if (settings.MEM0_EMBEDDER_PROVIDER or "aws_bedrock") == "aws_bedrock":
+        embedder = memory_client.embedding_model
+        embedder.embed = bedrock_limiter.limited("mem0_embedder", embedder.embed)
+
+
+bedrock_limiter = BedrockLimiter()
@@ -0,0 +1,54 @@
+"""
+Bounded executor for blocking I/O
+
+Agent tools run inside the orchestrator's event loop. Anything that blocks there
+(SQLAlchemy sessions, the Google Calendar client, Mem0, Chroma) stalls every other
+conversation the worker is handling. Such calls run on one shared thread pool of
+BLOCKING_IO_MAX_WORKERS threads instead. It is bounded so a burst of tool calls
+cannot exhaust database connections or API quotas.
+
+    @tool
+    @blocking_io
+    def create_ticket(...): ...   # the agent sees an async tool with the same signature
+
+Calls carry the caller's contextvars into the thread. A @blocking_io tool called
+after the current request's deadline (see request_budget.py) raises
+RequestBudgetExceeded instead of starting.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from ..config.settings import settings
+from .request_budget import check_deadline
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.BLOCKING_IO_MAX_WORKERS),
+    thread_name_prefix="blocking-io",
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run func(*args, **kwargs) on the blocking I/O executor and await its result."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+def blocking_io(func: Callable[..., T]) -> Callable[..., Any]:
+    """Turn a blocking function into a coroutine function that runs it on the executor.
+
+    functools.wraps keeps the name, docstring and signature, so @tool builds the same
+    tool spec as for the original function.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        check_deadline(func.__name__)
+        return await run_blocking(func, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,197 @@
+"""
+Canned replies for trivial messages (CANNED_RESPONSES_ENABLED)
+
+A lot of chat traffic is "hi", "thanks", "ok" or a lone emoji. The worker answers
+these from the tables below, without running the orchestrator, Mem0 or any model.
+A message qualifies only when it consists entirely of such phrases ("ok thanks!",
+"hai", "谢谢", "👍"). A burst that contains anything else goes to the orchestrator
+as usual.
+
+The reply uses the language of the customer's last message. It is casual or formal
+depending on the configured tone (settings.get_tone_and_manner()). It is sent with
+the normal Telegram client and logged to conversation_history like any agent reply.
+
+A trivial message is not always small talk: "ok" or "好的" after "Shall I book 3pm?"
+is the customer's answer. When the agent's last message asked a question, the burst
+goes to the orchestrator. The worker also skips this tier while an orchestrator turn
+of the chat is in progress, and records canned exchanges in the chat's orchestrator
+session so later turns see them.
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+from .blocking_io import run_blocking
+from .telegram_client import log_agent_message, send_telegram_message
+
+logger = logging.getLogger(__name__)
+
+# Categories in order of precedence when a burst mixes them
+CATEGORIES = ("greeting", "thanks", "acknowledgement")
+
+_PHRASES: Dict[str, Dict[str, str]] = {
+    "greeting": {
+        "en": r"hi+|he+y+|hel+o+|hiya|howdy|yo|good (morning|afternoon|evening|day)|morning|evening|gm",
+        "ms": r"hai|helo|selamat (pagi|tengah hari|petang|malam)|assalamualaikum|salam",
+        "zh": r"你好|您好|哈喽|嗨|早上好|早安|下午好|晚上好",
+        "ta": r"வணக்கம்|vanakkam",
+        "es": r"hola|buen(os|as) (d[ií]as|tardes|noches)",
+    },
+    "thanks": {
+        "en": r"(thanks?|thank u|thank you)( (so|very) much| a lot| again)?|thx|tq|ty|tysm|cheers|much appreciated|appreciate it",
+        "ms": r"terima kasih( banyak)?|trima kasih",
+        "zh": r"谢谢(你|您)?|多谢|感谢|谢啦|谢了",
+        "ta": r"நன்றி|nandri",
+        "es": r"(muchas )?gracias",
+    },
+    "acknowledgement": {
+        "en": r"o+k+a*y*|k+|okie|okey|alright|all right|sure|got it|noted|cool|great|nice|fine|understood|sounds good|perfect",
+        "ms": r"baik|boleh|faham",
+        "zh": r"好(的|啊|吧|滴)?|嗯+|知道了|明白了?|收到|行|没问题",
+        "ta": r"சரி|sari",
+        "es": r"vale|de acuerdo|entendido|perfecto",
+    },
+}
+
+# Words that may accompany the phrases above without changing their meaning
+_FILLERS = r"lah|la|leh|ah|ya|yah|yeah|bro|sis|dear|all|there|team|again|very|much|so|and|oh"
+
+_EMOJI = "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]"
+_EMOJI_CATEGORIES = {"👋": "greeting", "🙏": "thanks", "❤": "thanks", "😊": "thanks", "🥰": "thanks"}
+
+_SEPARATOR = r"[\s,.!?~。，！？～…]+"
+# Chinese phrases are not separated by spaces
+_CJK_NEXT = r"(?=[\u3400-\u9fff])"
+
+_PHRASE_PATTERNS: List[Tuple[str, Optional[str], re.Pattern]] = [
+    (category, language, re.compile(rf"^(?:{pattern})(?:{_SEPARATOR}|$|{_CJK_NEXT})", re.IGNORECASE))
+    for category, languages in _PHRASES.items()
+    for language, pattern in languages.items()
+] + [(None, None, re.compile(rf"^(?:{_FILLERS})(?:{_SEPARATOR}|$|{_CJK_NEXT})", re.IGNORECASE))]
+
+_REPLIES: Dict[str, Dict[str, Dict[str, str]]] = {
+    "greeting": {
+        "en": {"casual": "Hey there! 👋 What can I do for you today?", "formal": "Hello! How may I help you today?"},
+        "ms": {"casual": "Hai! 👋 Ada apa yang boleh saya bantu?", "formal": "Selamat datang! Bagaimana saya boleh membantu anda hari ini?"},
+        "zh": {"casual": "嗨！👋 有什么可以帮你的吗？", "formal": "您好！请问有什么可以帮您？"},
+        "ta": {"casual": "வணக்கம்! 👋 உங்களுக்கு என்ன உதவி வேண்டும்?", "formal": "வணக்கம்! இன்று நான் உங்களுக்கு எவ்வாறு உதவலாம்?"},
+        "es": {"casual": "¡Hola! 👋 ¿En qué te puedo ayudar?", "formal": "¡Hola! ¿En qué puedo ayudarle hoy?"},
+    },
+    "thanks": {
+        "en": {"casual": "Anytime! 😊 Just drop me a message if you need anything else.", "formal": "You're welcome! Please let us know if there is anything else we can help with."},
+        "ms": {"casual": "Sama-sama! 😊 Mesej saja kalau perlukan apa-apa lagi.", "formal": "Sama-sama! Sila hubungi kami jika ada apa-apa lagi yang boleh dibantu."},
+        "zh": {"casual": "不客气！😊 有需要随时找我哦。", "formal": "不客气！如有其他需要，欢迎随时联系我们。"},
+        "ta": {"casual": "பரவாயில்லை! 😊 வேறு ஏதாவது தேவைப்பட்டால் சொல்லுங்கள்.", "formal": "மிக்க மகிழ்ச்சி! வேறு ஏதேனும் உதவி தேவைப்பட்டால் தெரிவிக்கவும்."},
+        "es": {"casual": "¡De nada! 😊 Escríbeme si necesitas algo más.", "formal": "¡De nada! Quedamos a su disposición para cualquier otra consulta."},
+    },
+    "acknowledgement": {
+        "en": {"casual": "👍", "formal": "Noted, thank you. Let us know if you need anything else."},
+        "ms": {"casual": "👍", "formal": "Baik, terima kasih. Beritahu kami jika perlukan apa-apa lagi."},
+        "zh": {"casual": "👍", "formal": "好的，谢谢。如有其他需要请随时告诉我们。"},
+        "ta": {"casual": "👍", "formal": "சரி, நன்றி. வேறு ஏதேனும் தேவைப்பட்டால் தெரிவிக்கவும்."},
+        "es": {"casual": "👍", "formal": "Entendido, gracias. Avísenos si necesita algo más."},
+    },
+}
+
+_CASUAL_TONE_WORDS = ("casual", "relaxed", "playful", "fun", "approachable", "informal", "chill")
+
+
+def classify_trivial(text: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Return (category, language) if text is only greetings/thanks/acknowledgements.
+
+    language is None for emoji-only messages. Returns None for anything else.
+    """
+    remaining = text.strip().lower()
+    categories: List[str] = []
+    language: Optional[str] = None
+
+    emoji = re.findall(_EMOJI, remaining)
+    remaining = re.sub(_EMOJI, " ", remaining).strip(" \t\r\n,.!?~。，！？～…")
+    categories.extend(_EMOJI_CATEGORIES[e] for e in emoji if e in _EMOJI_CATEGORIES)
+
+    while remaining:
+        for category, phrase_language, pattern in _PHRASE_PATTERNS:
+            match = pattern.match(remaining)
+            if match and match.end() > 0:
+                if category:
+                    categories.append(category)
+                    language = phrase_language
+                remaining = remaining[match.end():].lstrip()
+                break
+        else:
+            return None
+
+    if not categories and not emoji:
+        return None
+    category = next((c for c in CATEGORIES if c in categories), "acknowledgement")
+    return category, language
+
+
+# Start of a conversation_history entry, e.g. "[Agent at 2024-05-01 10:00:00]: "
+_HISTORY_ENTRY = re.compile(r"^\[[^\]\n]* at \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\]: ", re.MULTILINE)
+_AGENT_ENTRY_PREFIX = "[Agent at "
+
+
+def last_agent_message(conversation_history: Optional[str]) -> Optional[str]:
+    """The agent's latest message in a customer's conversation_history, if any."""
+    entries = list(_HISTORY_ENTRY.finditer(conversation_history or ""))
+    for index in range(len(entries) - 1, -1, -1):
+        entry = entries[index]
+        if entry.group().startswith(_AGENT_ENTRY_PREFIX):
+            end = entries[index + 1].start() if index + 1 < len(entries) else len(conversation_history)
+            return conversation_history[entry.end():end].strip()
+    return None
+
+
+def asks_question(agent_message: Optional[str]) -> bool:
+    """Whether a reply to agent_message may be an answer to it."""
+    return bool(agent_message) and ("?" in agent_message or "？" in agent_message)
+
+
+def _register(tone: str) -> str:
+    tone = tone.lower()
+    return "casual" if any(word in tone for word in _CASUAL_TONE_WORDS) else "formal"
+
+
+def canned_reply(texts: List[str], tone: str) -> Optional[str]:
+    """The reply to a burst of messages, or None if it needs the orchestrator.
+
+    Returns "" when the burst is trivial but should not be answered (acknowledgements
+    with CANNED_RESPONSES_REPLY_TO_ACKNOWLEDGEMENTS off).
+    """
+    matches = [classify_trivial(text) for text in texts]
+    if not matches or any(match is None for match in matches):
+        return None
+    categories = {category for category, _ in matches}
+    category = next(c for c in CATEGORIES if c in categories)
+    if category == "acknowledgement" and not settings.CANNED_RESPONSES_REPLY_TO_ACKNOWLEDGEMENTS:
+        return ""
+    language = next((lang for _, lang in reversed(matches) if lang), "en")
+    return _REPLIES[category][language][_register(tone)]
+
+
+async def reply_if_trivial(chat_id: str, texts: List[str], last_agent_text: Optional[str] = None) -> Optional[str]:
+    """Answer a burst of trivial messages directly.
+
+    last_agent_text is the agent's latest message to the chat (see last_agent_message).
+    Returns the reply sent ("" if the burst was only logged), or None if the
+    orchestrator is needed.
+    """
+    if not settings.CANNED_RESPONSES_ENABLED:
+        return None
+    if canned_reply(texts, "") is None:
+        return None
+    if asks_question(last_agent_text):
+        logger.info(f"Chat {chat_id} may be answering the agent's question; no canned reply")
+        return None
+    tone = await run_blocking(settings.get_tone_and_manner)
+    reply = canned_reply(texts, tone)
+    if reply:
+        if not await send_telegram_message(chat_id, reply):
+            # Let the orchestrator try instead
+            return None
+        await run_blocking(log_agent_message, chat_id, reply)
+    logger.info(f"Canned reply for chat {chat_id}: {reply!r}")
+    return reply
@@ -0,0 +1,94 @@
+"""
+Group-commit buffer for Telegram webhook ingestion
+
+Every webhook call used to open its own session and commit its own transaction,
+so a burst of updates serialised on SQLite's fsync. Callers now hand their update
+to the buffer and await it. Updates that arrive within INGEST_FLUSH_INTERVAL_MS of
+each other are inserted in one transaction (one pipeline with QUEUE_BACKEND=redis)
+on a worker thread, off the event loop, and each caller is released once that
+write is durable.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+from ..database.queue_backend import get_queue_backend
+from .queue_notifier import queue_notifier
+
+logger = logging.getLogger(__name__)
+
+
+def _write_batch(updates: List[Dict[str, Any]]) -> List[bool]:
+    return get_queue_backend().enqueue(updates)
+
+
+class IngestionBuffer:
+    """Collects updates from concurrent callers and commits them in batches."""
+
+    def __init__(self, flush_interval_ms: float, max_batch: int):
+        self._flush_interval = max(0.0, flush_interval_ms) / 1000
+        self._max_batch = max(1, max_batch)
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._has_pending: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, update: Dict[str, Any]) -> bool:
+        """Queue an update and wait until it is durable.
+
+        Returns True if it was queued, False if it is a duplicate delivery. Raises if
+        the batch could not be written, so the webhook can answer with an error and
+        Telegram retries.
+        """
+        self._ensure_flusher()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((update, future))
+        self._has_pending.set()
+        return await future
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._has_pending = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self._max_batch and self._flush_interval:
+                # Give concurrent webhook calls a moment to join this batch
+                await asyncio.sleep(self._flush_interval)
+            batch = self._pending[:self._max_batch]
+            self._pending = self._pending[self._max_batch:]
+            if not self._pending:
+                self._has_pending.clear()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        started = time.perf_counter()
+        try:
+            results = await asyncio.to_thread(_write_batch, [update for update, _ in batch])
+        except Exception as e:
+            logger.error("ingest_batch_failed size=%d error=%s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), queued in zip(batch, results):
+            if not future.done():
+                future.set_result(queued)
+        inserted = sum(results)
+        if inserted:
+            queue_notifier.notify()
+        logger.info(
+            "ingest_batch size=%d inserted=%d duplicates=%d duration_ms=%.1f",
+            len(batch),
+            inserted,
+            len(batch) - inserted,
+            (time.perf_counter() - started) * 1000,
+        )
+
+
+ingestion_buffer = IngestionBuffer(settings.INGEST_FLUSH_INTERVAL_MS, settings.INGEST_MAX_BATCH)
@@ -0,0 +1,201 @@
+"""
+Progressive Telegram replies (TELEGRAM_PROGRESSIVE_REPLIES)
+
+Without this, a customer sees nothing until the orchestrator calls send_message at
+the end of its turn. With it, the worker does the following for each turn:
+
+1. Shows the "typing..." chat action and refreshes it until the reply is final.
+2. Sends a placeholder message right away.
+3. Edits the placeholder as the orchestrator streams the text of its send_message
+   call. At most one edit goes out every TELEGRAM_PROGRESSIVE_EDIT_INTERVAL_SECONDS,
+   and the limit is pushed back whenever Telegram answers with RetryAfter.
+4. Lets the first send_message of the turn to this chat finish the placeholder
+   instead of sending a new message. The agent logic is unchanged.
+
+If the turn ends without a reply, the placeholder is deleted.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from typing import Optional
+
+import telegram
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Telegram's maximum message length
+MAX_MESSAGE_LENGTH = 4096
+# A chat action is shown for about 5 seconds
+_TYPING_REFRESH_SECONDS = 4.0
+
+# The progressive reply of the turn running in this context, if any
+current_progressive_reply: contextvars.ContextVar[Optional["ProgressiveReply"]] = contextvars.ContextVar(
+    "current_progressive_reply", default=None
+)
+
+
+def partial_json_string_field(raw: str, field: str) -> Optional[str]:
+    """Decode the (possibly unfinished) string value of `field` in a partial JSON object.
+
+    Used on tool input while it is still streaming, e.g. '{"chat_id": "1", "message": "Hel'
+    gives "Hel". Returns None until the field has started.
+    """
+    key = f'"{field}"'
+    start = raw.find(key)
+    if start < 0:
+        return None
+    pos = start + len(key)
+    while pos < len(raw) and raw[pos] in ' \t\r\n:':
+        pos += 1
+    if pos >= len(raw) or raw[pos] != '"':
+        return None
+    pos += 1
+    end = pos
+    while end < len(raw):
+        if raw[end] == '\\':
+            end += 2
+            continue
+        if raw[end] == '"':
+            break
+        end += 1
+    body = raw[pos:min(end, len(raw))]
+    # Drop an escape sequence cut off by the stream
+    for cut in range(0, 6):
+        candidate = body[:len(body) - cut] if cut else body
+        try:
+            return json.loads(f'"{candidate}"')
+        except ValueError:
+            continue
+    return None
+
+
+def _retry_after_seconds(error: "telegram.error.RetryAfter") -> float:
+    # A timedelta in recent python-telegram-bot versions, seconds before
+    retry_after = error.retry_after
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+
+class ProgressiveReply:
+    """Placeholder message for one orchestrator turn, edited as the reply streams in."""
+
+    def __init__(self, chat_id: str):
+        self.chat_id = str(chat_id)
+        self.finalized = False
+        self._bot: Optional[telegram.Bot] = None
+        self._message_id: Optional[int] = None
+        self._latest = ""
+        self._shown = ""
+        self._next_edit_at = 0.0
+        self._edit_task: Optional[asyncio.Task] = None
+        self._typing_task: Optional[asyncio.Task] = None
+        self._token: Optional[contextvars.Token] = None
+
+    async def __aenter__(self) -> "ProgressiveReply":
+        bot_token = settings.get_telegram_bot_token()
+        if bot_token:
+            self._bot = telegram.Bot(token=bot_token)
+            self._typing_task = asyncio.create_task(self._keep_typing())
+            try:
+                placeholder = await self._bot.send_message(
+                    chat_id=int(self.chat_id), text=settings.TELEGRAM_PROGRESSIVE_PLACEHOLDER,
+                )
+                self._message_id = placeholder.message_id
+                self._next_edit_at = time.monotonic() + settings.TELEGRAM_PROGRESSIVE_EDIT_INTERVAL_SECONDS
+            except telegram.error.TelegramError as e:
+                logger.warning(f"Could not send placeholder to chat {self.chat_id}: {e}")
+        self._token = current_progressive_reply.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        current_progressive_reply.reset(self._token)
+        self._stop_typing()
+        if self._edit_task:
+            self._edit_task.cancel()
+        if self._bot is None:
+            return
+        try:
+            if self._message_id is not None and not self.finalized:
+                # The turn ended without a reply to this chat
+                await self._bot.delete_message(chat_id=int(self.chat_id), message_id=self._message_id)
+        except telegram.error.TelegramError as e:
+            logger.debug(f"Could not delete placeholder in chat {self.chat_id}: {e}")
+        finally:
+            await self._bot.shutdown()
+
+    @property
+    def active(self) -> bool:
+        return self._message_id is not None and not self.finalized
+
+    def update(self, text: str):
+        """Show text (the reply so far) in the placeholder, subject to the edit rate limit."""
+        if not self.active or not text.strip():
+            return
+        self._latest = text[:MAX_MESSAGE_LENGTH]
+        if self._edit_task is None or self._edit_task.done():
+            self._edit_task = asyncio.create_task(self._flush())
+
+    async def finalize(self, text: str) -> bool:
+        """Replace the placeholder with the final reply. Returns False if it could not be used."""
+        if not self.active or len(text) > MAX_MESSAGE_LENGTH:
+            return False
+        self.finalized = True
+        self._stop_typing()
+        if self._edit_task:
+            self._edit_task.cancel()
+        if text == self._shown:
+            return True
+        try:
+            try:
+                await self._edit(text)
+            except telegram.error.RetryAfter as e:
+                await asyncio.sleep(_retry_after_seconds(e))
+                await self._edit(text)
+            return True
+        except telegram.error.TelegramError as e:
+            logger.warning(f"Could not finalise placeholder in chat {self.chat_id}: {e}")
+            self.finalized = False
+            self._message_id = None
+            return False
+
+    async def _flush(self):
+        while self.active and self._latest != self._shown:
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self._edit(self._latest)
+            except telegram.error.RetryAfter as e:
+                self._next_edit_at = time.monotonic() + _retry_after_seconds(e)
+            except telegram.error.TelegramError as e:
+                logger.debug(f"Progressive edit failed in chat {self.chat_id}: {e}")
+                return
+
+    async def _edit(self, text: str):
+        self._next_edit_at = time.monotonic() + settings.TELEGRAM_PROGRESSIVE_EDIT_INTERVAL_SECONDS
+        try:
+            await self._bot.edit_message_text(chat_id=int(self.chat_id), message_id=self._message_id, text=text)
+        except telegram.error.BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self._shown = text
+
+    async def _keep_typing(self):
+        try:
+            while True:
+                await self._bot.send_chat_action(chat_id=int(self.chat_id), action=telegram.constants.ChatAction.TYPING)
+                await asyncio.sleep(_TYPING_REFRESH_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except telegram.error.TelegramError as e:
+            logger.debug(f"Typing indicator stopped in chat {self.chat_id}: {e}")
+
+    def _stop_typing(self):
+        if self._typing_task:
+            self._typing_task.cancel()
+            self._typing_task = None
@@ -0,0 +1,130 @@
+"""
+Queue wake-up notifications
+
+Lets the API tell message workers that new work was enqueued, so an idle worker
+claims it within milliseconds instead of waiting for its next poll.
+
+- Workers running in the same process (WORKER_IN_PROCESS) are woken through an
+  asyncio.Event.
+- Workers in other processes on the same host listen for a UDP datagram on
+  QUEUE_NOTIFY_HOST:QUEUE_NOTIFY_PORT.
+
+Notifications are best effort. A lost datagram only means the worker picks the
+message up at its next fallback poll (WORKER_IDLE_POLL_SECONDS).
+"""
+
+import asyncio
+import logging
+import socket
+import threading
+from typing import List, Optional, Tuple
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_WAKE_DATAGRAM = b"wake"
+
+
+class _WakeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, event: asyncio.Event):
+        self._event = event
+
+    def datagram_received(self, data, addr):
+        self._event.set()
+
+
+class QueueNotifier:
+    """Delivers "new messages" signals from producers to waiting workers."""
+
+    def __init__(self, host: str, port: Optional[int]):
+        self._host = host
+        self._port = port
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._socket: Optional[socket.socket] = None
+
+    def notify(self):
+        """Wake every registered worker. Safe to call from any thread, never blocks."""
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed
+                pass
+        if not self._port:
+            return
+        try:
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._socket.setblocking(False)
+            self._socket.sendto(_WAKE_DATAGRAM, (self._host, self._port))
+        except OSError as e:
+            logger.debug(f"Queue wake-up datagram not sent: {e}")
+
+    def subscribe(self) -> "QueueSubscription":
+        """Register the calling worker; must be called from within its event loop."""
+        return QueueSubscription(self)
+
+    def _register(self, waiter):
+        with self._lock:
+            self._waiters.append(waiter)
+
+    def _unregister(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+
+class QueueSubscription:
+    """A worker's view of the notifier: wait() returns early when work arrives.
+
+    Use as an async context manager so the UDP listener is bound and released with
+    the worker.
+    """
+
+    def __init__(self, notifier: QueueNotifier):
+        self._notifier = notifier
+        self._event = asyncio.Event()
+        self._waiter = (asyncio.get_running_loop(), self._event)
+        self._transport = None
+
+    async def __aenter__(self) -> "QueueSubscription":
+        self._notifier._register(self._waiter)
+        if self._notifier._port:
+            try:
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _WakeProtocol(self._event),
+                    local_addr=(self._notifier._host, self._notifier._port),
+                    # Several workers on one host can share the port; each datagram wakes one of them
+                    reuse_port=hasattr(socket, "SO_REUSEPORT"),
+                )
+            except OSError as e:
+                logger.warning(f"Could not listen for queue notifications on port {self._notifier._port}: {e}; falling back to polling")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._notifier._unregister(self._waiter)
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait until notified or timeout seconds pass. Returns True if notified.
+
+        The signal is consumed on wake-up, so a notification that arrives while the
+        worker is busy claiming makes the next wait() return immediately.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+queue_notifier = QueueNotifier(settings.QUEUE_NOTIFY_HOST, settings.QUEUE_NOTIFY_PORT)
@@ -0,0 +1,130 @@
+"""
+Per-request budget: deadline and model-cycle limit
+
+One customer message can fan out into an orchestrator turn, a specialist, and
+several tool loops inside the specialist. Nothing used to bound the total.
+process_message now opens a RequestBudget:
+
+- a deadline of REQUEST_DEADLINE_SECONDS;
+- at most REQUEST_MAX_CYCLES model calls, counted across the orchestrator and
+  every specialist it calls.
+
+The budget lives in a context variable, so specialist agents, their tools and
+blocking I/O threads all see the same one. Once it is exhausted:
+
+- tool calls are cancelled, except send_message (agent/budget_hooks.py), and the
+  model is told to answer with what it has;
+- @blocking_io tools and agent pool leases stop waiting once the deadline passes;
+- REQUEST_BUDGET_GRACE_SECONDS after the deadline, the orchestrator stops the turn
+  and sends a partial answer.
+
+Every tool call is recorded in the budget's trace. The trace is logged when the
+budget is exceeded.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RequestBudgetExceeded(TimeoutError):
+    pass
+
+
+class RequestBudget:
+    def __init__(self, label: str, deadline_seconds: float, max_cycles: int):
+        self.label = label
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_seconds
+        self.max_cycles = max_cycles
+        self.cycles = 0
+        self.exceeded_reason: Optional[str] = None
+        self.trace: List[str] = []
+        self._running_tools: Dict[str, Tuple[str, float]] = {}
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def hard_remaining(self) -> float:
+        """Time left before the turn is cut off (deadline plus grace period)."""
+        return max(0.0, self.deadline + settings.REQUEST_BUDGET_GRACE_SECONDS - time.monotonic())
+
+    @property
+    def exhausted(self) -> bool:
+        if self.exceeded_reason is None:
+            if time.monotonic() >= self.deadline:
+                self.exceeded_reason = f"deadline of {self.deadline - self.started:.0f}s"
+            elif self.cycles >= self.max_cycles:
+                self.exceeded_reason = f"{self.max_cycles} model cycles"
+        return self.exceeded_reason is not None
+
+    def bound(self, timeout: float) -> float:
+        """timeout, shortened so a wait cannot outlast the deadline."""
+        return min(timeout, self.remaining())
+
+    def tool_started(self, tool_use_id: str, name: str):
+        self._running_tools[tool_use_id] = (name, time.monotonic())
+
+    def tool_finished(self, tool_use_id: str, status: str):
+        name, started = self._running_tools.pop(tool_use_id, ("?", time.monotonic()))
+        self.trace.append(f"{name} {status} {time.monotonic() - started:.1f}s @{started - self.started:.1f}s")
+
+    def tool_cancelled(self, name: str):
+        self.trace.append(f"{name} cancelled @{time.monotonic() - self.started:.1f}s")
+
+    def log_if_exceeded(self):
+        if self.exhausted:
+            logger.warning(
+                f"Request budget exceeded for {self.label}: {self.exceeded_reason}, "
+                f"cycles={self.cycles}/{self.max_cycles}, elapsed={time.monotonic() - self.started:.1f}s, "
+                f"trace=[{'; '.join(self.trace)}]"
+            )
+
+
+# The budget of the request being processed in this context, if any
+current_budget: contextvars.ContextVar[Optional[RequestBudget]] = contextvars.ContextVar(
+    "current_budget", default=None
+)
+
+
+@contextmanager
+def request_budget(label: str) -> Iterator[RequestBudget]:
+    """Open the budget for one request, unless one is already running (nested calls share it)."""
+    budget = current_budget.get()
+    if budget is not None:
+        yield budget
+        return
+    budget = RequestBudget(label, settings.REQUEST_DEADLINE_SECONDS, settings.REQUEST_MAX_CYCLES)
+    token = current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        current_budget.reset(token)
+        budget.log_if_exceeded()
+
+
+def check_deadline(what: str):
+    """Raise RequestBudgetExceeded if the current request is past its deadline."""
+    budget = current_budget.get()
+    if budget is not None and budget.remaining() <= 0:
+        raise RequestBudgetExceeded(f"Request deadline passed before {what}")
+
+
+async def within_deadline(awaitable: Awaitable[T], what: str) -> T:
+    """Await an external call, giving up with RequestBudgetExceeded when the request's deadline passes."""
+    budget = current_budget.get()
+    if budget is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=budget.remaining())
+    except asyncio.TimeoutError:
+        raise RequestBudgetExceeded(f"Request deadline passed during {what}")
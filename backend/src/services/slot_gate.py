@@ -0,0 +1,91 @@
+"""
+Counting semaphore shared by threads and coroutines
+
+Blocking code waits on a threading.Condition. Coroutines wait on a future of
+their own event loop, and a released slot is handed straight to the oldest of
+them, so no thread is parked on a coroutine's behalf. Used by the Bedrock
+limiter and the agent pools, which are entered from both sync tools and async
+agents.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Deque, Tuple
+
+
+class SlotGate:
+    """At most int(limit) holders at a time. Subclasses may change limit under _cond."""
+
+    def __init__(self, limit: float):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[bool]"]] = deque()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self._waiters or not self._has_room():
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self, timeout: float) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(self._has_room, timeout=timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if not self._waiters and self._has_room():
+                self.in_flight += 1
+                return True
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait({future}, timeout=max(0.0, timeout))
+        except BaseException:
+            self._abandon(loop, future)
+            raise
+        if not future.done():
+            self._abandon(loop, future)
+            return False
+        return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._wake()
+
+    def _wake(self):
+        """Hand free slots to waiting coroutines, then threads; call with _cond held."""
+        while self._waiters and self._has_room():
+            loop, future = self._waiters.popleft()
+            self.in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:  # loop closed
+                self.in_flight -= 1
+        self._cond.notify_all()
+
+    def _grant(self, future: "asyncio.Future[bool]"):
+        if future.done():
+            SlotGate.release(self)  # the waiter gave up meanwhile
+        else:
+            future.set_result(True)
+
+    def _abandon(self, loop: asyncio.AbstractEventLoop, future: "asyncio.Future[bool]"):
+        if future.done():
+            SlotGate.release(self)  # granted, but the caller is gone
+            return
+        # If the slot is already on its way, _grant sees the cancelled future and releases it
+        future.cancel()
+        with self._cond:
+            if (loop, future) in self._waiters:
+                self._waiters.remove((loop, future))
@@ -0,0 +1,60 @@
+"""
+Telegram Bot API helpers
+
+Send path shared by everything that replies to customers outside the agent tools
+(busy notices, canned replies). Sent messages are logged to the customer's
+conversation_history like the agent's own replies.
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import telegram
+from sqlalchemy.orm import Session
+
+from ..config.settings import settings
+from ..database.models import Customer, get_db
+
+logger = logging.getLogger(__name__)
+
+
+def log_agent_message(chat_id: str, message_text: str, name: Optional[str] = None):
+    """Append an agent reply to the customer's conversation_history (business audit trail)."""
+    db: Session = next(get_db())
+    try:
+        customer = db.query(Customer).filter(Customer.telegram_chat_id == str(chat_id)).first()
+        if not customer:
+            customer = Customer(telegram_chat_id=str(chat_id), name=name)
+            db.add(customer)
+        message_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        history_entry = f"[Agent at {message_time}]: {message_text}\n"
+        if customer.conversation_history:
+            customer.conversation_history += history_entry
+        else:
+            customer.conversation_history = history_entry
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to log agent message for chat {chat_id}: {e}")
+    finally:
+        db.close()
+
+
+async def send_telegram_message(chat_id: str, text: str) -> bool:
+    """Send text to a Telegram chat. Returns False if the bot is not configured or sending failed."""
+    bot_token = settings.get_telegram_bot_token()
+    if not bot_token:
+        logger.warning("Telegram bot not configured; message not sent")
+        return False
+
+    bot = telegram.Bot(token=bot_token)
+    try:
+        await bot.send_message(chat_id=int(chat_id), text=text)
+        return True
+    except telegram.error.TelegramError as e:
+        logger.error(f"Failed to send Telegram message to chat {chat_id}: {e}")
+        return False
+    finally:
+        # Close the bot session to release connections
+        await bot.shutdown()
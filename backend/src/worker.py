@@ -1,27 +1,67 @@
 import asyncio
+import itertools
 import json
+import time
+from collections import deque
 from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Set, Tuple
 
 from sqlalchemy.orm import Session
 
-from .database.models import get_db, IncomingMessage, Customer
+from .config.settings import settings
+from .database.models import get_db, init_databases, Customer
+from .database.message_queue import make_claimant_id
+from .database.queue_backend import QueuedMessage, get_queue_backend
+from .services.queue_notifier import queue_notifier
+from .services.backpressure import backlog_monitor, MODE_SHED
+from .services.canned_responses import last_agent_message, reply_if_trivial
+from .services.progressive_reply import ProgressiveReply, partial_json_string_field
 from .agent.orchestrator_agent.orchestrator_agent import memory_orchestrator
 
-async def process_message(db: Session, message: IncomingMessage):
-    """The core logic to process a single message from the queue."""
-    print(f"Processing message id: {message.id}")
-    
+def parse_text_message(message: QueuedMessage) -> dict | None:
+    """Extract the fields the worker needs from a queued Telegram text message."""
     payload = json.loads(message.payload)
-    
+
     if "message" not in payload or "text" not in payload["message"]:
-        print(f"Message {message.id} is not a text message, skipping.")
-        return
+        return None
 
     tg_message = payload["message"]
-    chat_id = tg_message["chat"]["id"]
-    text = tg_message["text"]
-    first_name = tg_message["from"].get("first_name", "User")
-    message_time = datetime.fromtimestamp(tg_message["date"]).strftime('%Y-%m-%d %H:%M:%S')
+    return {
+        "chat_id": tg_message["chat"]["id"],
+        "text": tg_message["text"],
+        "first_name": tg_message["from"].get("first_name", "User"),
+        "message_time": datetime.fromtimestamp(tg_message["date"]).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+async def process_message(db: Session, message: QueuedMessage) -> bool:
+    """The core logic to process a single message from the queue."""
+    return await process_messages(db, [message])
+
+
+async def process_messages(db: Session, messages: List[QueuedMessage], max_prompt_messages: int | None = None) -> bool:
+    """Process a burst of queued messages from one chat as a single orchestrator turn.
+
+    Every message is logged to the customer's conversation_history individually; the
+    orchestrator sees them together so it answers the burst once. With
+    max_prompt_messages only the latest messages go into the prompt (older ones are
+    superseded, e.g. when shedding a backlog). Returns False if the orchestrator
+    failed, in which case the messages should be marked failed.
+    """
+    print(f"Processing message ids: {[message.id for message in messages]}")
+
+    parsed = []
+    for message in messages:
+        fields = parse_text_message(message)
+        if fields is None:
+            print(f"Message {message.id} is not a text message, skipping.")
+            continue
+        parsed.append(fields)
+    if not parsed:
+        return True
+
+    chat_id = parsed[0]["chat_id"]
+    first_name = parsed[0]["first_name"]
 
     # 1. Get or create customer
     customer = db.query(Customer).filter(Customer.telegram_chat_id == str(chat_id)).first()
@@ -31,87 +71,426 @@ async def process_message(db: Session, message: IncomingMessage):
         db.commit()
         db.refresh(customer)
 
-    # 2. Log message to conversation_history for business audit trail
-    new_history_entry = f"[{first_name} at {message_time}]: {text}\n"
+    # 2. Log messages to conversation_history for business audit trail
+    history_lines = [f"[{fields['first_name']} at {fields['message_time']}]: {fields['text']}" for fields in parsed]
+    new_history_entry = "".join(f"{line}\n" for line in history_lines)
     if customer.conversation_history:
         customer.conversation_history += new_history_entry
     else:
         customer.conversation_history = new_history_entry
     db.commit()
 
-    # 3. Process message with memory-aware orchestrator (Mem0 for AI intelligence)
+    # 3. Greetings, thanks and acknowledgements get a canned reply without the orchestrator,
+    # unless they may answer the agent's last question or a turn of the chat is running
+    if not memory_orchestrator.turn_in_progress(str(chat_id)):
+        texts = [fields["text"] for fields in parsed]
+        canned = await reply_if_trivial(str(chat_id), texts, last_agent_message(customer.conversation_history))
+        if canned is not None:
+            if canned:
+                await memory_orchestrator.record_reply(str(chat_id), "\n".join(texts), canned)
+            print(f"Answered message ids {[message.id for message in messages]} with a canned reply.")
+            return True
+
+    # 4. Process message with memory-aware orchestrator (Mem0 for AI intelligence)
     # Using chat_id as user_id for memory isolation
+    if max_prompt_messages and len(history_lines) > max_prompt_messages:
+        print(f"Dropping {len(history_lines) - max_prompt_messages} superseded messages from chat {chat_id} prompt.")
+        history_lines = history_lines[-max_prompt_messages:]
+    # The customer's own words, for the intent router
+    customer_text = "\n".join(fields["text"] for fields in parsed[-len(history_lines):])
+    if len(history_lines) == 1:
+        message_details = f"- Message: {history_lines[0]}"
+    else:
+        message_details = "- Messages (sent in quick succession, answer them together as one request):\n" + "\n".join(
+            f"  {line}" for line in history_lines
+        )
     orchestrator_query = f"""A new message has been received from a customer.
 
 ## Customer Details:
 - Name: {customer.name}
 - Telegram Chat ID: {customer.telegram_chat_id}
-- Message: [{first_name} at {message_time}]: {text}
+{message_details}
 
 Please analyze this message and determine the appropriate next action. Use memory to maintain context."""
 
-    # 4. Trigger memory-aware orchestrator with chat_id as user_id
+    # 5. Trigger memory-aware orchestrator with chat_id as user_id
     try:
-        result = await memory_orchestrator.process_message(
-            message=orchestrator_query,
-            chat_id=str(chat_id)  # Using chat_id for memory isolation
-        )
+        if settings.TELEGRAM_PROGRESSIVE_REPLIES:
+            result = await run_with_progressive_reply(orchestrator_query, str(chat_id), customer_text, customer.name)
+        else:
+            result = await memory_orchestrator.process_message(
+                message=orchestrator_query,
+                chat_id=str(chat_id),  # Using chat_id for memory isolation
+                customer_text=customer_text,
+                customer_name=customer.name,
+            )
         print(f"Orchestrator result: {result}")
     except Exception as e:
-        print(f"Error processing message {message.id} with orchestrator: {e}")
-        message.status = 'failed'
-        db.commit()
-        return
+        print(f"Error processing messages {[message.id for message in messages]} with orchestrator: {e}")
+        return False
 
-    print(f"Finished processing message id: {message.id}")
+    print(f"Finished processing message ids: {[message.id for message in messages]}")
+    return True
 
 
-async def main():
-    """The main worker loop."""
-    print("Starting worker...")
+async def run_with_progressive_reply(
+    orchestrator_query: str, chat_id: str, customer_text: str | None = None, customer_name: str | None = None
+) -> str:
+    """Run an orchestrator turn while the customer watches its reply being written.
+
+    The text of the orchestrator's send_message call is streamed into a placeholder
+    message (see services/progressive_reply.py). Returns the orchestrator's response.
+    """
+    result = ""
+    async with ProgressiveReply(chat_id) as reply:
+        async for event in memory_orchestrator.stream_message(
+            orchestrator_query, chat_id, include_tool_input=True, customer_text=customer_text, customer_name=customer_name
+        ):
+            if event["type"] == "tool_input" and event["name"] == "send_message" and reply.active:
+                target = partial_json_string_field(event["input"], "chat_id")
+                text = partial_json_string_field(event["input"], "message")
+                if text and (target is None or target == chat_id):
+                    reply.update(text)
+            elif event["type"] == "done":
+                result = event["response"]
+            elif event["type"] == "error":
+                result = event["message"]
+    return result
+
+
+def chat_partition_key(message) -> str:
+    """Return the ordering partition for a claimed queue row.
+
+    Telegram messages are partitioned by chat id. Rows without a chat (or that
+    cannot be parsed) get a partition of their own so they never block a real chat.
+    """
+    if message.chat_id:
+        return f"chat:{message.chat_id}"
+    try:
+        payload = json.loads(message.payload)
+        chat_id = payload["message"]["chat"]["id"]
+        return f"chat:{chat_id}"
+    except Exception:
+        return f"message:{message.id}"
+
+
+class ChatPartitionedPool:
+    """Runs queued messages on a fixed number of consumers while keeping each chat in order.
+
+    Every chat has its own FIFO lane and at most one consumer works on a lane at a
+    time, so a chat's messages are handled strictly in arrival order while different
+    chats run in parallel. Lanes with pending work are served round-robin within
+    priority bands (a lane's priority is that of its most important pending
+    message), so a single busy chat cannot starve the others.
+
+    With a coalesce window, a lane is only handed to a consumer once the chat has
+    been quiet for coalesce_window seconds (or coalesce_max_wait after its oldest
+    pending message), and the consumer receives every pending message of the lane
+    as one batch. Without it each turn handles a single message.
+
+    At most max_buffered messages are accepted at a time.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[None]],
+        concurrency: int,
+        coalesce_window: float = 0.0,
+        coalesce_max_wait: float = 0.0,
+        max_buffered: int = 200,
+    ):
+        self._handler = handler
+        self._concurrency = max(1, concurrency)
+        self._max_buffered = max(self._concurrency * 2, max_buffered)
+        self._coalesce_window = max(0.0, coalesce_window)
+        self._coalesce_max_wait = max(self._coalesce_window, coalesce_max_wait)
+        self._lanes: Dict[str, Deque[Tuple[Any, float, int]]] = {}  # (message id, arrival time, priority)
+        self._scheduled: Set[str] = set()  # lanes waiting on a timer, queued in _ready or being worked on
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._ready: asyncio.PriorityQueue = asyncio.PriorityQueue()  # (-priority, sequence, partition)
+        self._sequence = itertools.count()
+        self._capacity = asyncio.Event()
+        self._in_flight = 0
+        self._taken: Dict[str, int] = {}  # pending messages a running turn took over with take_pending
+        self._consumers: list[asyncio.Task] = []
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
+
+    @property
+    def in_flight(self) -> int:
+        """Messages accepted by the pool that have not finished yet."""
+        return self._in_flight
+
+    def free_slots(self) -> int:
+        """How many more messages the dispatcher should hand over right now.
+
+        Allows one lane of lookahead per consumer so a consumer finishing a turn can
+        start on the next chat without waiting for the dispatcher. Lanes are counted
+        rather than messages: a chat with a long backlog occupies a single lane, so
+        other chats can still be claimed for the idle consumers.
+        """
+        lanes = self._concurrency * 2 - len(self._lanes)
+        return max(0, min(lanes, self._max_buffered - self._in_flight))
+
+    def start(self):
+        for i in range(self._concurrency):
+            self._consumers.append(asyncio.create_task(self._consume(i)))
+
+    async def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers.clear()
+
+    def submit(self, partition: str, message_id: Any, arrived_at: float | None = None, priority: int = 0):
+        """Queue a message; arrived_at is its time.monotonic() arrival, defaulting to now."""
+        if arrived_at is None:
+            arrived_at = time.monotonic()
+        self._lanes.setdefault(partition, deque()).append((message_id, arrived_at, priority))
+        self._in_flight += 1
+        if partition in self._timers:
+            # Still debouncing: the new message pushes the release back
+            self._schedule(partition)
+        elif partition not in self._scheduled:
+            self._scheduled.add(partition)
+            self._schedule(partition)
+
+    def take_pending(self, partition: str) -> List[Any]:
+        """Hand the pending messages of a lane to the turn working on it, oldest first.
+
+        Only for the handler of that lane: the messages count as in flight until its
+        turn ends.
+        """
+        lane = self._lanes.get(partition)
+        if not lane:
+            return []
+        taken = [entry[0] for entry in lane]
+        lane.clear()
+        self._taken[partition] = self._taken.get(partition, 0) + len(taken)
+        return taken
+
+    async def wait_for_capacity(self):
+        while not self.free_slots():
+            self._capacity.clear()
+            await self._capacity.wait()
+
+    def _schedule(self, partition: str):
+        """Queue a lane for a consumer, after its debounce period if coalescing."""
+        timer = self._timers.pop(partition, None)
+        if timer:
+            timer.cancel()
+        lane = self._lanes[partition]
+        delay = 0.0
+        if self._coalesce_window:
+            quiet_at = lane[-1][1] + self._coalesce_window
+            deadline = lane[0][1] + self._coalesce_max_wait
+            delay = min(quiet_at, deadline) - time.monotonic()
+        if delay > 0:
+            self._timers[partition] = asyncio.get_running_loop().call_later(delay, self._release, partition)
+        else:
+            self._release(partition)
+
+    def _release(self, partition: str):
+        self._timers.pop(partition, None)
+        priority = max(entry[2] for entry in self._lanes[partition])
+        # The sequence number keeps equal priorities first-come first-served (round-robin)
+        self._ready.put_nowait((-priority, next(self._sequence), partition))
+
+    async def _consume(self, consumer_id: int):
+        while True:
+            _, _, partition = await self._ready.get()
+            lane = self._lanes[partition]
+            if self._coalesce_window:
+                batch = [entry[0] for entry in lane]
+                lane.clear()
+            else:
+                batch = [lane.popleft()[0]]
+            try:
+                await self._handler(batch)
+            except Exception as e:
+                print(f"Consumer {consumer_id} failed on messages {batch}: {e}")
+            finally:
+                self._in_flight -= len(batch) + self._taken.pop(partition, 0)
+                self._capacity.set()
+                if lane:
+                    # Back of the line: other chats get a turn before this one continues
+                    self._schedule(partition)
+                else:
+                    del self._lanes[partition]
+                    self._scheduled.discard(partition)
+
+
+# Identifies this worker process as the owner of the messages it claims
+CLAIMANT_ID = make_claimant_id()
+
+# Messages this worker holds a lease on (queued in the pool or being processed), by id
+_leased: Dict[Any, QueuedMessage] = {}
+
+# The pool of the running worker (see main)
+_pool: ChatPartitionedPool | None = None
+
+# Held while claiming and handing the claimed messages to the pool, so a turn that
+# merges its chat's backlog never races the dispatcher for newer messages of the chat
+_claim_lock = asyncio.Lock()
+
+# Queue backend calls block (SQLite busy_timeout, Redis round trips), so they run
+# in threads and never stall the consumers or, in-process, the API's event loop
+
+
+async def claim_batch(limit: int) -> List[QueuedMessage]:
+    """Lease up to `limit` new messages for this worker (caller holds _claim_lock)."""
+    try:
+        batch = await asyncio.to_thread(get_queue_backend().claim, CLAIMANT_ID, limit, settings.WORKER_LEASE_SECONDS)
+    except Exception as e:
+        print(f"Error claiming messages: {e}")
+        return []
+    for message in batch:
+        _leased[message.id] = message
+        if message.attempts > 1:
+            print(f"Message {message.id} reclaimed, attempt {message.attempts}.")
+    return batch
+
+
+async def heartbeat_loop():
+    """Periodically renew the leases of every message this worker still holds."""
     while True:
-        db: Session = next(get_db())
-        message_to_process = None
-        message_id_to_process = None
+        await asyncio.sleep(settings.WORKER_HEARTBEAT_SECONDS)
+        held = list(_leased)
+        if not held:
+            continue
         try:
-            # Find a new message and lock it in a single atomic transaction
-            message_to_process = db.query(IncomingMessage).filter(IncomingMessage.status == 'new').order_by(IncomingMessage.created_at).first()
-            if message_to_process:
-                message_id_to_process = message_to_process.id
-                message_to_process.status = 'processing'
-                message_to_process.updated_at = datetime.utcnow()
-                db.commit()
+            renewed = set(await asyncio.to_thread(
+                get_queue_backend().renew, CLAIMANT_ID, held, settings.WORKER_LEASE_SECONDS
+            ))
+            lost = [message_id for message_id in held if message_id not in renewed and message_id in _leased]
+            if lost:
+                print(f"Leases lost for messages {lost}; they may be processed by another worker.")
         except Exception as e:
-            print(f"Error fetching/locking message: {e}")
-            db.rollback()
-        finally:
-            db.close()
-
-        if message_id_to_process:
-            # Re-query the message within the new processing_db session
-            processing_db: Session = next(get_db())
+            print(f"Error renewing leases: {e}")
+
+
+async def reaper_loop():
+    """Periodically return messages with expired leases (crashed workers) to the queue
+    and drop processed messages past the deduplication retention."""
+    queue = get_queue_backend()
+    while True:
+        try:
+            result = await asyncio.to_thread(
+                queue.reclaim_expired, settings.WORKER_MAX_ATTEMPTS, settings.WORKER_LEASE_SECONDS
+            )
+            if result["requeued"] or result["failed"]:
+                print(f"Reaper requeued {result['requeued']} and failed {result['failed']} expired messages.")
+            await asyncio.to_thread(queue.purge, settings.QUEUE_DEDUP_RETENTION_HOURS * 3600)
+        except Exception as e:
+            print(f"Error reclaiming expired leases: {e}")
+        await asyncio.sleep(settings.WORKER_REAPER_INTERVAL_SECONDS)
+
+
+async def handle_messages(message_ids: List[Any]):
+    """Process claimed messages of one chat in their own session and acknowledge them."""
+    queue = get_queue_backend()
+    processing_db: Session = next(get_db())
+    try:
+        max_prompt_messages = None
+        health = await asyncio.to_thread(backlog_monitor.health)
+        if health.mode == MODE_SHED:
+            # Shedding load: answer the chat's whole backlog in this one turn. Messages of
+            # the chat already waiting in the pool are older than any still in the queue,
+            # so they join first; _claim_lock keeps the dispatcher from claiming in between.
+            first = _leased.get(message_ids[0])
+            async with _claim_lock:
+                if first is not None and _pool is not None:
+                    pending = _pool.take_pending(chat_partition_key(first))
+                    if pending:
+                        print(f"Backlog shedding: merging {len(pending)} queued messages of {chat_partition_key(first)}.")
+                        message_ids = list(message_ids) + pending
+                if first is not None and first.chat_id:
+                    extra = await asyncio.to_thread(
+                        queue.claim_chat_backlog, CLAIMANT_ID, first.chat_id, settings.WORKER_LEASE_SECONDS
+                    )
+                    if extra:
+                        print(f"Backlog shedding: merging {len(extra)} more messages of chat {first.chat_id}.")
+                        message_ids = list(message_ids) + [message.id for message in extra]
+                        _leased.update((message.id, message) for message in extra)
+            max_prompt_messages = settings.BACKLOG_MERGE_MAX_MESSAGES
+        messages = []
+        for message_id in message_ids:
+            message = _leased.get(message_id)
+            if message:
+                messages.append(message)
+            else:
+                print(f"Error: Message {message_id} is no longer leased by this worker.")
+        if messages:
+            succeeded = await process_messages(processing_db, messages, max_prompt_messages)
+            for message in messages:
+                settle = queue.ack if succeeded else queue.nack
+                settled = await asyncio.to_thread(settle, message.id, CLAIMANT_ID)
+                if not settled:
+                    print(f"Lost the claim on message {message.id} before it was acknowledged.")
+    except Exception as e:
+        print(f"Failed to process messages {message_ids}: {e}")
+        processing_db.rollback()
+        for message_id in message_ids:
             try:
-                # Re-attach the message to the new session
-                re_attached_message = processing_db.get(IncomingMessage, message_id_to_process)
-                if re_attached_message:
-                    await process_message(processing_db, re_attached_message)
-                    # If successful, delete the message using the same session
-                    processing_db.delete(re_attached_message)
-                    processing_db.commit()
-                else:
-                    print(f"Error: Message {message_id_to_process} not found in new session.")
-            except Exception as e:
-                print(f"Failed to process message {message_id_to_process}: {e}")
-                # Re-query the object in this session to update it
-                failed_message = processing_db.query(IncomingMessage).filter(IncomingMessage.id == message_id_to_process).first()
-                if failed_message:
-                    failed_message.status = 'failed'
-                    processing_db.commit()
-            finally:
-                processing_db.close()
-        else:
-            # No new messages, wait for a bit
-            await asyncio.sleep(5)
+                await asyncio.to_thread(queue.nack, message_id, CLAIMANT_ID)
+            except Exception as nack_error:
+                print(f"Failed to nack message {message_id}: {nack_error}")
+    finally:
+        for message_id in message_ids:
+            _leased.pop(message_id, None)
+        processing_db.close()
+
+
+def arrival_time(message) -> float:
+    """Convert a row's created_at (UTC) to the time.monotonic() clock used by the pool."""
+    if not message.created_at:
+        return time.monotonic()
+    age = (datetime.utcnow() - message.created_at).total_seconds()
+    return time.monotonic() - max(0.0, age)
+
+
+async def main():
+    """The main worker loop.
+
+    A single dispatcher claims batches of messages from the queue and hands them to
+    a pool of WORKER_CONCURRENCY consumers partitioned by chat, which merges bursts
+    from one chat within WORKER_COALESCE_WINDOW_SECONDS. When the queue is
+    empty it waits for a wake-up from the webhook. Background tasks renew the
+    leases of held messages and reclaim those of crashed workers.
+    """
+    global _pool
+    pool = _pool = ChatPartitionedPool(
+        handle_messages,
+        settings.WORKER_CONCURRENCY,
+        coalesce_window=settings.WORKER_COALESCE_WINDOW_SECONDS,
+        coalesce_max_wait=settings.WORKER_COALESCE_MAX_WAIT_SECONDS,
+        max_buffered=settings.WORKER_MAX_BUFFERED_MESSAGES,
+    )
+    pool.start()
+    background = [asyncio.create_task(heartbeat_loop()), asyncio.create_task(reaper_loop())]
+    print(f"Starting worker {CLAIMANT_ID} with {pool.concurrency} consumers...")
+    try:
+        async with queue_notifier.subscribe() as notifications:
+            while True:
+                await pool.wait_for_capacity()
+                async with _claim_lock:
+                    batch = await claim_batch(min(pool.free_slots(), settings.WORKER_CLAIM_BATCH_SIZE))
+                    for message in batch:
+                        pool.submit(chat_partition_key(message), message.id, arrival_time(message), message.priority)
+                if not batch:
+                    # Queue is empty: sleep until the API signals new messages, polling
+                    # only as a slow fallback in case a notification is lost
+                    await notifications.wait(settings.WORKER_IDLE_POLL_SECONDS)
+    finally:
+        for task in background:
+            task.cancel()
+        await pool.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    init_databases()
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("strands")
+
+from src.agent import agent_pool
+from src.agent.agent_pool import AgentPool
+
+
+class Metrics:
+    pass
+
+
+def make_agent():
+    return SimpleNamespace(messages=[], event_loop_metrics=Metrics())
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(agent_pool.settings, "AGENT_POOL_ACQUIRE_TIMEOUT_SECONDS", 5.0)
+    created = AgentPool("test", make_agent, 1)
+    yield created
+    agent_pool._pools.remove(created)
+
+
+def test_async_lease_waits_for_a_sync_lease(pool):
+    leased = threading.Event()
+
+    def hold():
+        with pool.lease() as agent:
+            agent.messages.append("busy")
+            leased.set()
+            time.sleep(0.1)
+
+    async def main():
+        holder = threading.Thread(target=hold)
+        holder.start()
+        leased.wait()
+        threads = threading.active_count()
+        waiter = asyncio.ensure_future(pool.lease_async().__aenter__())
+        await asyncio.sleep(0.02)
+        # Waiting does not park a thread on the pool's behalf
+        assert threading.active_count() == threads
+        assert not waiter.done()
+        agent = await waiter
+        holder.join()
+        return agent
+
+    agent = asyncio.run(main())
+    assert agent.messages == []
+
+
+def test_async_lease_times_out(pool, monkeypatch):
+    monkeypatch.setattr(agent_pool.settings, "AGENT_POOL_ACQUIRE_TIMEOUT_SECONDS", 0.05)
+
+    async def main():
+        async with pool.lease_async():
+            with pytest.raises(TimeoutError):
+                async with pool.lease_async():
+                    pass
+        # The slot is free again once the holder is done
+        async with pool.lease_async():
+            pass
+
+    asyncio.run(main())
+    assert pool.stats() == {"max_size": 1, "created": 1, "idle": 1}
+
+
+def test_cancelled_async_lease_frees_its_slot(pool):
+    async def main():
+        async with pool.lease_async():
+            waiter = asyncio.ensure_future(pool.lease_async().__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        async with pool.lease_async():
+            pass
+
+    asyncio.run(main())
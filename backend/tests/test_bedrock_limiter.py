@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+from src.services.bedrock_limiter import _AimdGate
+
+
+def gate(limit=1):
+    return _AimdGate(limit, 1, limit, 0.5, 0.0)
+
+
+def test_coroutine_gets_slot_released_by_thread():
+    limiter = gate()
+    assert limiter.try_acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(limiter.acquire_async(5.0))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        threading.Thread(target=limiter.release, args=("error",)).start()
+        return await waiter
+
+    assert asyncio.run(main())
+    assert limiter.in_flight == 1
+
+
+def test_waiters_are_served_in_order():
+    limiter = gate()
+    order = []
+
+    async def call(name):
+        assert await limiter.acquire_async(5.0)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        limiter.release("error")
+
+    async def main():
+        assert limiter.try_acquire()
+        tasks = [asyncio.ensure_future(call(name)) for name in "abc"]
+        await asyncio.sleep(0.01)
+        limiter.release("error")
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert limiter.in_flight == 0
+
+
+def test_timeout_gives_up_without_taking_a_slot():
+    limiter = gate()
+    assert limiter.try_acquire()
+    assert asyncio.run(limiter.acquire_async(0.05)) is False
+    limiter.release("error")
+    assert limiter.in_flight == 0
+    assert limiter.try_acquire()
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    limiter = gate()
+    assert limiter.try_acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(limiter.acquire_async(5.0))
+        await asyncio.sleep(0.01)
+        # The slot is handed over and the waiter cancelled before it runs again
+        limiter.release("error")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
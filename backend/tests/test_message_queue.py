@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import message_queue as queue
+from src.database.models import Base, IncomingMessage
+
+
+def update(update_id, chat_id, text="hi"):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": text}}
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'agent.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(sessions):
+    session = sessions()
+    yield session
+    session.close()
+
+
+def enqueue(db, *updates):
+    assert all(queue.enqueue_updates(db, list(updates)))
+    # Distinct, increasing arrival times regardless of the clock's resolution
+    start = datetime.utcnow() - timedelta(minutes=1)
+    for i, message in enumerate(db.query(IncomingMessage).order_by(IncomingMessage.id)):
+        message.created_at = start + timedelta(seconds=i)
+    db.commit()
+
+
+def chats(rows):
+    return [row.chat_id for row in rows]
+
+
+def test_claim_serves_chats_round_robin(db):
+    enqueue(db, update(1, 10), update(2, 10), update(3, 10), update(4, 20), update(5, 30), update(6, 20))
+
+    rows = queue.claim_messages(db, "a", limit=4, lease_seconds=60)
+
+    # Every chat gets its oldest message in before any chat gets a second one
+    assert [row.id for row in rows] == [1, 2, 4, 5]
+    assert sorted(chats(rows)) == ["10", "10", "20", "30"]
+
+
+def test_claim_serves_a_chat_at_its_highest_priority(db, monkeypatch):
+    monkeypatch.setattr(queue.settings, "QUEUE_PRIORITY_KEYWORDS", "urgent")
+    enqueue(db, update(1, 10), update(2, 20), update(3, 20, "urgent please"), update(4, 30))
+
+    rows = queue.claim_messages(db, "a", limit=3, lease_seconds=60)
+
+    # The urgent follow-up lifts its chat without overtaking the chat's first message
+    assert [row.id for row in rows] == [2, 3, 1]
+
+
+def test_claim_skips_chats_busy_at_another_claimant(db):
+    enqueue(db, update(1, 10), update(2, 10), update(3, 20))
+    assert [row.id for row in queue.claim_messages(db, "a", limit=1, lease_seconds=60)] == [1]
+
+    assert [row.id for row in queue.claim_messages(db, "b", limit=10, lease_seconds=60)] == [3]
+    # The claimant holding the chat still gets its next message
+    assert [row.id for row in queue.claim_messages(db, "a", limit=10, lease_seconds=60)] == [2]
+
+
+def test_expired_lease_does_not_keep_a_chat_busy(db):
+    enqueue(db, update(1, 10), update(2, 10))
+    queue.claim_messages(db, "a", limit=1, lease_seconds=-1)
+
+    assert [row.id for row in queue.claim_messages(db, "b", limit=10, lease_seconds=60)] == [2]
+
+
+def test_settling_needs_a_live_claim(db):
+    enqueue(db, update(1, 10), update(2, 20))
+    queue.claim_messages(db, "a", limit=2, lease_seconds=-1)
+    assert queue.reclaim_expired_leases(db, max_attempts=1, default_lease_seconds=60) == {"requeued": 0, "failed": 2}
+
+    # The reaper failed both; the claimant's late ack or nack must not revive them
+    assert not queue.ack_message(db, 1, "a")
+    assert not queue.nack_message(db, 2, "a")
+    assert not queue.fail_message(db, 2, "b")
+    assert {m.status for m in db.query(IncomingMessage)} == {"failed"}
+
+
+def test_ack_by_the_claimant(db):
+    enqueue(db, update(1, 10))
+    queue.claim_messages(db, "a", limit=1, lease_seconds=60)
+
+    assert not queue.ack_message(db, 1, "b")
+    assert queue.ack_message(db, 1, "a")
+    assert not queue.ack_message(db, 1, "a")
+    assert db.get(IncomingMessage, 1).status == "done"
+
+
+def test_concurrent_claimants_never_share_a_message_or_a_chat(sessions):
+    db = sessions()
+    enqueue(db, *(update(i, i % 5) for i in range(1, 101)))
+    db.close()
+
+    lock = threading.Lock()
+    claimed = []
+    holders = {}
+    overlaps = []
+    lost_acks = []
+
+    def work(claimant):
+        session = sessions()
+        try:
+            while True:
+                rows = queue.claim_messages(session, claimant, limit=3, lease_seconds=60)
+                if not rows:
+                    return
+                with lock:
+                    for row in rows:
+                        claimed.append(row.id)
+                        if holders.setdefault(row.chat_id, claimant) != claimant:
+                            overlaps.append((row.chat_id, claimant, holders[row.chat_id]))
+                for i, row in enumerate(rows):
+                    if row.chat_id not in chats(rows[i + 1:]):
+                        # Free the chat before its last ack makes it claimable again
+                        with lock:
+                            holders.pop(row.chat_id, None)
+                    if not queue.ack_message(session, row.id, claimant):
+                        lost_acks.append(row.id)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == list(range(1, 101))
+    assert overlaps == []
+    assert lost_acks == []
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import deque
+
+import pytest
+
+pytest.importorskip("strands")
+
+from src.agent import model_hedging
+from src.agent.model_hedging import HedgedModel, hedge_delay
+from src.agent.stub_model import StubModel
+
+MESSAGES = [{"role": "user", "content": [{"text": "hi"}]}]
+
+
+class TrackedStub(StubModel):
+    """StubModel that records whether its stream was closed before it finished."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.finished = 0
+        self.abandoned = 0
+
+    async def stream(self, *args, **kwargs):
+        completed = False
+        try:
+            async for event in super().stream(*args, **kwargs):
+                yield event
+            completed = True
+        finally:
+            if completed:
+                self.finished += 1
+            else:
+                self.abandoned += 1
+
+
+def reply(model):
+    async def collect():
+        return [event async for event in model.stream(MESSAGES)]
+
+    events = asyncio.run(collect())
+    return "".join(e["contentBlockDelta"]["delta"]["text"] for e in events if "contentBlockDelta" in e)
+
+
+@pytest.fixture(autouse=True)
+def hedging_settings(monkeypatch):
+    settings = model_hedging.settings
+    monkeypatch.setattr(model_hedging, "_first_event_seconds", {})
+    monkeypatch.setattr(model_hedging, "_counters", dict.fromkeys(model_hedging._counters, 0))
+    monkeypatch.setattr(settings, "MODEL_HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "MODEL_HEDGE_PERCENTILE", 95.0)
+    monkeypatch.setattr(settings, "MODEL_HEDGE_MIN_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "MODEL_HEDGE_MAX_DELAY_SECONDS", 5.0)
+    monkeypatch.setattr(settings, "MODEL_HEDGE_TARGET", "fallback")
+    monkeypatch.setattr(settings, "MODEL_FAILOVER_THROTTLES", 2)
+    monkeypatch.setattr(settings, "MODEL_FAILOVER_WINDOW_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "MODEL_FAILOVER_SECONDS", 60.0)
+
+
+def seed_first_event_times(model_id, seconds, count=20):
+    model_hedging._first_event_seconds[model_id] = deque([seconds] * count, maxlen=500)
+
+
+def test_hedge_delay_follows_the_percentile():
+    assert hedge_delay("stub") == 5.0  # not enough samples yet
+    seed_first_event_times("stub", 0.2)
+    assert hedge_delay("stub") == pytest.approx(0.2)
+    seed_first_event_times("stub", 0.01)
+    assert hedge_delay("stub") == 0.05  # clamped to the minimum
+
+
+def test_hedge_sent_after_percentile_delay_wins_and_cancels_the_loser():
+    primary = TrackedStub(first_token_delay=2.0, reply="slow")
+    fallback = TrackedStub(reply="fast")
+    seed_first_event_times("stub", 0.1)
+
+    started = time.monotonic()
+    assert reply(HedgedModel(primary, fallback)) == "fast"
+    assert time.monotonic() - started < 1.0
+    assert primary.abandoned == 1 and primary.finished == 0
+    assert fallback.finished == 1
+    assert model_hedging._counters["hedges"] == 1
+    assert model_hedging._counters["hedge_wins"] == 1
+
+
+def test_no_hedge_when_the_primary_answers_in_time():
+    primary = TrackedStub(reply="primary")
+    fallback = TrackedStub(reply="fallback")
+    seed_first_event_times("stub", 0.5)
+
+    assert reply(HedgedModel(primary, fallback)) == "primary"
+    assert fallback.calls == 0
+    assert model_hedging._counters["hedges"] == 0
+
+
+def test_throttled_call_is_retried_on_the_fallback():
+    primary = StubModel(throttle_every=1)
+    fallback = StubModel(reply="fallback")
+
+    assert reply(HedgedModel(primary, fallback)) == "fallback"
+    assert model_hedging._counters["throttle_fallbacks"] == 1
+
+
+def test_repeated_throttles_fail_over_to_the_fallback():
+    primary = StubModel(throttle_every=1)
+    fallback = StubModel(reply="fallback")
+    model = HedgedModel(primary, fallback)
+
+    reply(model)
+    assert not model.failed_over()
+    reply(model)
+    assert model.failed_over()
+
+    assert reply(model) == "fallback"
+    assert primary.calls == 2
+    assert model_hedging._counters["failed_over_calls"] == 1
+
+
+def test_stub_structured_output_returns_the_configured_object():
+    pydantic = pytest.importorskip("pydantic")
+
+    class Answer(pydantic.BaseModel):
+        label: str
+        score: float = 0.0
+
+    model = StubModel(structured_reply={"label": "refund"})
+
+    async def collect():
+        return [event async for event in model.structured_output(Answer, MESSAGES)]
+
+    assert asyncio.run(collect())[-1]["output"] == Answer(label="refund")
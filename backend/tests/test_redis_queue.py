@@ -0,0 +1,114 @@
+import time
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+
+from src.database import redis_queue
+from src.database.redis_queue import RedisQueueBackend
+
+
+def update(update_id, chat_id, text="hi"):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": text}}
+
+
+def texts(messages):
+    return [redis_queue.json.loads(m.payload)["message"]["text"] for m in messages]
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    # Priorities come from the tickets table; these tests only exercise Redis
+    monkeypatch.setattr(redis_queue, "get_db", lambda: iter([MagicMock()]))
+    monkeypatch.setattr(redis_queue, "update_priorities", lambda db, updates: [0] * len(updates))
+    client = fakeredis.FakeRedis(decode_responses=True)
+    return RedisQueueBackend(None, "test", client=client)
+
+
+def test_enqueue_rejects_redelivered_updates(queue):
+    assert queue.enqueue([update(1, 10), update(2, 10), update(1, 10)]) == [True, True, False]
+    assert queue.enqueue([update(2, 10), update(3, 10)]) == [False, True]
+    assert queue.depth() == 3
+
+
+def test_failed_append_leaves_no_dedup_key(queue):
+    # A key of the wrong type makes the append fail inside the script
+    queue._redis.set("test:lane:10", "not a stream")
+    with pytest.raises(Exception):
+        queue.enqueue([update(1, 10)])
+    queue._redis.delete("test:lane:10")
+    # Telegram's retry of the same update must still get in
+    assert queue.enqueue([update(1, 10)]) == [True]
+
+
+def test_chat_is_served_in_order_across_claimants(queue):
+    queue.enqueue([update(1, 10, "m1")])
+    first = queue.claim("A", 1, 60)
+    assert texts(first) == ["m1"]
+
+    queue.enqueue([update(2, 10, "m2"), update(3, 20, "other"), update(4, 10, "m3")])
+    # B never sees chat 10 while A owns it
+    assert texts(queue.claim("B", 10, 60)) == ["other"]
+    # A gets the chat's later messages, in order
+    assert texts(queue.claim("A", 10, 60)) == ["m2", "m3"]
+
+
+def test_chat_moves_to_another_claimant_once_settled(queue):
+    queue.enqueue([update(1, 10, "m1")])
+    (m1,) = queue.claim("A", 10, 60)
+    queue.enqueue([update(2, 10, "m2")])
+    assert queue.ack(m1.id, "A")
+    # m2 was never handed out to A, so the chat is free once m1 is settled
+    assert texts(queue.claim("B", 10, 60)) == ["m2"]
+    assert queue.claim("A", 10, 60) == []
+
+
+def test_burst_keeps_arrival_order(queue):
+    queue.enqueue([update(i, 10, f"m{i}") for i in range(1, 13)])
+    assert texts(queue.claim("A", 20, 60)) == [f"m{i}" for i in range(1, 13)]
+
+
+def test_claim_chat_backlog_only_for_the_owner(queue):
+    queue.enqueue([update(1, 10, "m1")])
+    queue.claim("A", 1, 60)
+    queue.enqueue([update(2, 10, "m2"), update(3, 10, "m3")])
+    assert queue.claim_chat_backlog("B", "10", 60) == []
+    assert texts(queue.claim_chat_backlog("A", "10", 60)) == ["m2", "m3"]
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue([update(1, 10, "m1"), update(2, 10, "m2")])
+    claimed = queue.claim("A", 10, 0.001)
+    assert queue.depth("processing") == 2
+    time.sleep(0.01)
+
+    assert queue.reclaim_expired(max_attempts=3, lease_seconds=0.001) == {"requeued": 2, "failed": 0}
+    assert queue.depth() == 2 and queue.depth("processing") == 0
+    # The old claimant lost the messages
+    assert not queue.ack(claimed[0].id, "A")
+    assert queue.renew("A", [m.id for m in claimed], 60) == []
+
+    again = queue.claim("B", 10, 60)
+    assert texts(again) == ["m1", "m2"]
+    assert [m.attempts for m in again] == [2, 2]
+    assert queue.renew("B", [m.id for m in again], 60) == [m.id for m in again]
+
+
+def test_messages_out_of_attempts_are_dead_lettered(queue):
+    queue.enqueue([update(1, 10)])
+    for _ in range(2):
+        queue.claim("A", 10, 0.001)
+        time.sleep(0.01)
+        result = queue.reclaim_expired(max_attempts=2, lease_seconds=0.001)
+    assert result == {"requeued": 0, "failed": 1}
+    assert queue.depth("failed") == 1
+    assert queue.depth() == 0 and queue.claim("B", 10, 60) == []
+
+
+def test_nack_requeue_serves_the_message_again_first(queue):
+    queue.enqueue([update(1, 10, "m1"), update(2, 10, "m2")])
+    m1, m2 = queue.claim("A", 10, 60)
+    assert queue.nack(m1.id, "A", requeue=True)
+    # m2 was handed out after m1, so it is returned as well
+    assert not queue.ack(m2.id, "A")
+    assert texts(queue.claim("B", 10, 60)) == ["m1", "m2"]